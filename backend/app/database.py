@@ -0,0 +1,94 @@
+import os
+from typing import Dict
+from sqlalchemy import create_engine
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./healthcare.db")
+# Read-only queries (history, charts, rollups) go here when set
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL") or DATABASE_URL
+
+# Per engine and per process. The sync pool serves the compute threads
+# (executors.COMPUTE_WORKERS), the async one the requests on the event loop.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Fail fast rather than queue requests behind an exhausted pool
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+# Below common server / load balancer idle timeouts
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# Async drivers of the dialects in use
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+def engine_options(url: str, pooled: bool = True, asynchronous: bool = False) -> Dict:
+    """create_engine arguments for ``url``; ``pooled=False`` opens a connection per checkout"""
+    options = {}
+    if url.startswith("sqlite"):
+        options["connect_args"] = {"check_same_thread": False}
+    if not pooled:
+        options["poolclass"] = NullPool
+        return options
+
+    # Set explicitly: SQLite file databases otherwise get no pool at all
+    options.update(
+        poolclass=AsyncAdaptedQueuePool if asynchronous else QueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True
+    )
+    return options
+
+
+def async_url(url: str) -> URL:
+    parsed = make_url(url)
+    return parsed.set(drivername=ASYNC_DRIVERS.get(parsed.get_backend_name(), parsed.drivername))
+
+
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+replica_engine = (
+    create_engine(DATABASE_REPLICA_URL, **engine_options(DATABASE_REPLICA_URL))
+    if DATABASE_REPLICA_URL != DATABASE_URL else engine
+)
+async_engine = create_async_engine(async_url(DATABASE_URL), **engine_options(DATABASE_URL, asynchronous=True))
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+AsyncSessionLocal = sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+
+def get_db():
+    """Provide a session per request and close it afterwards"""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_read_db():
+    """A session on the read replica, for blocking reads run off the event loop"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    """An AsyncSession on the primary per request, for queries awaited in the handler"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def dispose_engines():
+    await async_engine.dispose()
+    engine.dispose()
+    if replica_engine is not engine:
+        replica_engine.dispose()
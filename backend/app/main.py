@@ -1,6 +1,17 @@
+import asyncio
+import gc
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import users, health_data, recommendations
+from sqlalchemy.orm import configure_mappers
+from app.database import async_engine, dispose_engines, engine, replica_engine
+from app.metrics import (
+    PrometheusMiddleware, instrument_engine, instrument_pool, monitor_event_loop, register_stats
+)
+from app.routers import users, health_data, recommendations, metrics, live, location
+from app.services.executors import compute_executor, inference_executor
+from app.services.live_channel import live_broker
+from app.services.recent_metrics import recent_metrics_cache
+from app.services.recommendation_cache import recommendation_cache
 
 app = FastAPI(title="Personalized Healthcare API")
 
@@ -11,10 +22,80 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(PrometheusMiddleware)
+
+instrument_engine(engine)
+instrument_pool("primary", engine)
+instrument_engine(async_engine.sync_engine)
+instrument_pool("async_primary", async_engine.sync_engine)
+if replica_engine is not engine:
+    instrument_engine(replica_engine)
+    instrument_pool("replica", replica_engine)
+register_stats(
+    "recommendation_cache", "Recommendation cache", recommendation_cache.stats,
+    counters=["hits", "stale_hits", "misses", "invalidations", "redis_errors"]
+)
+register_stats(
+    "recent_metrics_cache", "Recent metric windows", recent_metrics_cache.stats,
+    counters=["hits", "misses", "evictions", "invalidations"]
+)
+register_stats(
+    "live_channel", "Live push channel", live_broker.stats,
+    counters=["published", "frames", "deliveries", "dropped"]
+)
+register_stats(
+    "inference_executor", "Inference process pool", inference_executor.stats, counters=["rejected", "restarts"]
+)
+register_stats("compute_executor", "Compute thread pool", compute_executor.stats, counters=["rejected", "restarts"])
+register_stats(
+    "recommendation_requests", "Recommendation requests",
+    lambda: {"coalesced": recommendations.recommendation_service.coalescer.coalesced},
+    counters=["coalesced"]
+)
 
 app.include_router(users.router)
 app.include_router(health_data.router)
 app.include_router(recommendations.router)
+app.include_router(metrics.router)
+app.include_router(live.router)
+app.include_router(location.router)
+
+def preload_shared_state():
+    """Build lazily created state once, before the server forks its workers.
+
+    Freezing the heap afterwards keeps the collector from touching those
+    objects, so their pages stay shared with the workers instead of being
+    copied on the first collection.
+    """
+    configure_mappers()
+    app.openapi()
+    gc.collect()
+    gc.freeze()
+
+@app.on_event("startup")
+async def start_event_loop_monitor():
+    app.state.event_loop_monitor = asyncio.create_task(monitor_event_loop())
+
+@app.on_event("shutdown")
+async def stop_event_loop_monitor():
+    app.state.event_loop_monitor.cancel()
+
+@app.on_event("startup")
+async def start_live_broker():
+    await live_broker.start()
+
+@app.on_event("shutdown")
+async def stop_live_broker():
+    await live_broker.stop()
+
+@app.on_event("shutdown")
+def shutdown_executors():
+    inference_executor.shutdown()
+    compute_executor.shutdown()
+
+@app.on_event("shutdown")
+async def close_database_pools():
+    await dispose_engines()
 
 @app.get("/")
 async def root():
@@ -0,0 +1,222 @@
+import asyncio
+import os
+import time
+from typing import Iterable, List
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY,
+    CONTENT_TYPE_LATEST, generate_latest
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+from starlette.responses import Response
+
+# Set when several processes (uvicorn workers, inference pool) share one
+# scrape target; each process then writes its samples there
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Sub-millisecond to multi-second, for request and query latencies
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+# Analysis passes take microseconds
+STAGE_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05
+)
+# Background job shards take seconds to tens of minutes
+JOB_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route template",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+HEALTHKIT_FETCH_LATENCY = Histogram(
+    "healthkit_fetch_duration_seconds", "HealthKit query latency per metric",
+    ["metric"], buckets=LATENCY_BUCKETS
+)
+HEALTHKIT_FETCH_FAILURES = Counter(
+    "healthkit_fetch_failures_total", "HealthKit queries left out of a sync",
+    ["metric", "reason"]
+)
+RECOMMENDATION_STAGE_LATENCY = Histogram(
+    "recommendation_stage_duration_seconds", "Time per RecommendationEngine analysis stage",
+    ["stage"], buckets=STAGE_BUCKETS
+)
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds", "Database statement latency by statement kind",
+    ["operation"], buckets=LATENCY_BUCKETS
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "Delay of a scheduled event-loop callback past its due time",
+    buckets=LATENCY_BUCKETS
+)
+EVENT_LOOP_LAG_LAST = Gauge(
+    "event_loop_lag_last_seconds", "Most recent event-loop lag sample", multiprocess_mode="max"
+)
+JOB_DURATION = Histogram(
+    "job_shard_duration_seconds", "Run time of one shard of a background job",
+    ["job"], buckets=JOB_BUCKETS
+)
+JOB_SHARDS = Counter(
+    "job_shards_total", "Background job shards finished, by outcome (succeeded, retried, failed)",
+    ["job", "outcome"]
+)
+JOB_USERS = Counter(
+    "job_users_processed_total", "Users processed by background job shards; its rate is job throughput",
+    ["job"]
+)
+
+RECOMMENDATION_STAGES = [
+    "genetic", "lifestyle", "medical_history", "environmental", "health_metrics", "risk_scores"
+]
+# Children bound once: labels() is a dict lookup plus a lock per call
+STAGE_TIMERS = {stage: RECOMMENDATION_STAGE_LATENCY.labels(stage) for stage in RECOMMENDATION_STAGES}
+
+# Statement kinds recorded as-is; anything else is counted as "other"
+DB_OPERATIONS = ["SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "CREATE"]
+DB_TIMERS = {operation: DB_QUERY_LATENCY.labels(operation.lower()) for operation in DB_OPERATIONS}
+DB_OTHER = DB_QUERY_LATENCY.labels("other")
+
+EVENT_LOOP_LAG_INTERVAL = 0.5
+
+# Collectors of in-process component stats, see register_stats
+_stats_collectors: List["StatsCollector"] = []
+
+
+class PrometheusMiddleware:
+    """ASGI middleware timing every HTTP request by its route template.
+
+    The template (``/health-data/{data_type}``) rather than the raw path
+    is used as label so per-user URLs do not create a series each.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                scope["method"], route.path if route is not None else "unmatched", status[0]
+            ).observe(time.perf_counter() - started)
+
+
+class StatsCollector:
+    """Exposes counters kept by a component as Prometheus metrics at scrape time.
+
+    ``stats`` returns a flat dict; keys listed in ``counters`` become
+    counters, the remaining numeric ones gauges. Nothing is recorded on the
+    component's hot path.
+    """
+
+    def __init__(self, prefix: str, description: str, stats, counters: Iterable[str] = ()):
+        self.prefix = prefix
+        self.description = description
+        self.stats = stats
+        self.counters = frozenset(counters)
+
+    def collect(self):
+        for key, value in self.stats().items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"{self.prefix}_{key}"
+            if key in self.counters:
+                yield CounterMetricFamily(name, f"{self.description}: {key}", value=value)
+            else:
+                yield GaugeMetricFamily(name, f"{self.description}: {key}", value=value)
+
+
+def register_stats(prefix: str, description: str, stats, counters: Iterable[str] = ()):
+    collector = StatsCollector(prefix, description, stats, counters)
+    REGISTRY.register(collector)
+    _stats_collectors.append(collector)
+
+
+def instrument_engine(engine: Engine):
+    """Record the latency of every statement executed through ``engine``"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _started(connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finished(connection, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - connection.info["query_started"].pop()
+        words = statement[:16].split(None, 1)
+        DB_TIMERS.get(words[0].upper() if words else "", DB_OTHER).observe(elapsed)
+
+
+def instrument_pool(name: str, engine: Engine):
+    """Expose the connection pool of ``engine`` as ``db_pool_<name>_*`` metrics.
+
+    ``utilization`` is checked-out connections over pool size plus
+    overflow; at 1 further checkouts wait up to the pool timeout. A
+    ``connects`` rate close to ``checkouts`` means connections are not
+    being reused.
+    """
+    pool = engine.pool
+    counts = {"connects": 0, "checkouts": 0}
+
+    @event.listens_for(pool, "connect")
+    def _connected(dbapi_connection, connection_record):
+        counts["connects"] += 1
+
+    @event.listens_for(pool, "checkout")
+    def _checked_out(dbapi_connection, connection_record, connection_proxy):
+        counts["checkouts"] += 1
+
+    def stats():
+        if not isinstance(pool, QueuePool):
+            return dict(counts)
+        capacity = pool.size() + max(pool._max_overflow, 0)
+        checked_out = pool.checkedout()
+        return dict(
+            counts,
+            size=pool.size(),
+            capacity=capacity,
+            checked_out=checked_out,
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            utilization=checked_out / capacity if capacity else 0.0
+        )
+
+    register_stats(f"db_pool_{name}", f"{name} connection pool", stats, counters=["connects", "checkouts"])
+
+
+async def monitor_event_loop(interval: float = EVENT_LOOP_LAG_INTERVAL):
+    """Sample how late the loop runs a callback scheduled ``interval`` ahead"""
+    loop = asyncio.get_running_loop()
+    while True:
+        due = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - due)
+        EVENT_LOOP_LAG.observe(lag)
+        EVENT_LOOP_LAG_LAST.set(lag)
+
+
+def metrics_response() -> Response:
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+        # Collectors reading in-process state are not written to the shared directory
+        for collector in _stats_collectors:
+            registry.register(collector)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,72 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, JSON, Index
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from .user import Base
+
+
+class HealthDataAnomaly(Base):
+    """A sample flagged by the streaming detector.
+
+    Linked to its health_data row by the natural sample key rather than
+    by id: bulk ingestion does not read ids back, and a foreign key into
+    the partitioned health_data table would need its timestamp as well.
+    """
+    __tablename__ = "health_data_anomalies"
+    __table_args__ = (
+        Index("ix_health_data_anomalies_user_type_time", "user_id", "data_type", "timestamp"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    data_type = Column(String, nullable=False)
+    timestamp = Column(DateTime, nullable=False)
+    device_id = Column(String)
+    value = Column(Float, nullable=False)
+
+    # Stream baseline when the sample arrived
+    expected = Column(Float)
+    z_score = Column(Float)
+    ewma_score = Column(Float)
+    mad_score = Column(Float)
+    detectors = Column(ARRAY(String).with_variant(JSON, "sqlite"))
+    detected_at = Column(DateTime, default=datetime.utcnow)
+
+    health_data = relationship(
+        "HealthData",
+        primaryjoin=(
+            "and_(HealthData.user_id == foreign(HealthDataAnomaly.user_id), "
+            "HealthData.data_type == foreign(HealthDataAnomaly.data_type), "
+            "HealthData.timestamp == foreign(HealthDataAnomaly.timestamp), "
+            "HealthData.device_id == foreign(HealthDataAnomaly.device_id))"
+        ),
+        back_populates="anomalies",
+        viewonly=True
+    )
+
+
+class HealthDataStreamState(Base):
+    """Detector state of one (user, metric) stream, updated per ingested batch.
+
+    A fixed handful of floats per stream, so restarts resume detection
+    without replaying history.
+    """
+    __tablename__ = "health_data_stream_state"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    data_type = Column(String, primary_key=True)
+
+    # Welford running mean / sum of squared deviations
+    count = Column(Integer, nullable=False)
+    mean = Column(Float, nullable=False)
+    m2 = Column(Float, nullable=False)
+
+    # Exponentially weighted mean / variance
+    ewma = Column(Float, nullable=False)
+    ewm_var = Column(Float, nullable=False)
+
+    # Streaming median / MAD estimates
+    median = Column(Float, nullable=False)
+    mad = Column(Float, nullable=False)
+
+    last_timestamp = Column(DateTime, nullable=False)
@@ -0,0 +1,39 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from datetime import datetime
+from .user import Base
+
+
+class HealthDataArchive(Base):
+    """One user-month of health_data samples moved to the cold tier.
+
+    ``path`` is the month's Parquet file, relative to the archive root
+    (see health_archive.HealthArchive); its samples are no longer in
+    health_data. Re-archiving a month writes a new file and repoints
+    ``path``, so readers see either version whole.
+    """
+    __tablename__ = "health_data_archives"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    month = Column(DateTime, primary_key=True)  # first instant of the month
+
+    path = Column(String, nullable=False)
+    rows = Column(Integer, nullable=False)
+    bytes = Column(Integer, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class HealthDataArchiveDeletion(Base):
+    """A sample deleted after its month was archived.
+
+    Archive files are not rewritten on deletion: reads of the cold tier
+    skip the samples recorded here, and the next archive run of the month
+    drops them from its file and removes their rows.
+    """
+    __tablename__ = "health_data_archive_deletions"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    data_type = Column(String, primary_key=True)
+    timestamp = Column(DateTime, primary_key=True)
+    device_id = Column(String, primary_key=True)
+
+    deleted_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -1,12 +1,14 @@
 from sqlalchemy import (
     Column, Integer, String, Float, DateTime, ForeignKey, JSON,
-    Boolean, Text
+    Boolean, Text, UniqueConstraint, Index
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import ARRAY
 from datetime import datetime
 from enum import Enum as PyEnum
 from .user import Base
+from .metric_validation import MetricValidator
+from .anomalies import HealthDataAnomaly  # noqa: F401  (target of HealthData.anomalies)
 
 
 class DataQuality(PyEnum):
@@ -25,24 +27,40 @@ class HealthMetricType(PyEnum):
     ENVIRONMENTAL = "environmental"
 
 
+DEFAULT_SAMPLE_METADATA = {
+    "device_info": {},
+    "location": {},
+    "environmental_factors": {},
+    "confidence_score": 1.0,
+    "data_quality": DataQuality.HIGH.value,
+    "collection_method": "automatic"
+}
+
+
 class HealthData(Base):
     __tablename__ = "health_data"
+    __table_args__ = (
+        # One row per sample; re-synced samples are dropped on conflict
+        UniqueConstraint(
+            "user_id", "data_type", "timestamp", "device_id",
+            name="uq_health_data_sample"
+        ),
+        # Per-user metric range scans (charts, rollup refreshes)
+        Index("ix_health_data_user_type_time", "user_id", "data_type", "timestamp"),
+        # Recently ingested samples, whatever their timestamps (rollup repair)
+        Index("ix_health_data_created_at", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     data_type = Column(String)
     value = Column(Float)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # When the sample was ingested, in UTC
+    created_at = Column(DateTime, default=datetime.utcnow)
     
-    # Enhanced metadata
-    metadata = Column(JSON, default={
-        "device_info": {},
-        "location": {},
-        "environmental_factors": {},
-        "confidence_score": 1.0,
-        "data_quality": DataQuality.HIGH.value,
-        "collection_method": "automatic"
-    })
+    # Enhanced metadata ("metadata" is reserved on declarative classes)
+    sample_metadata = Column("metadata", JSON, default=DEFAULT_SAMPLE_METADATA)
     
     # Source tracking
     source = Column(String)
@@ -52,15 +70,27 @@ class HealthData(Base):
     # Data quality and validation
     is_validated = Column(Boolean, default=False)
     quality_score = Column(Float, default=1.0)
-    confidence_interval = Column(ARRAY(Float), default=[0.0, 0.0])
+    confidence_interval = Column(
+        ARRAY(Float).with_variant(JSON, "sqlite"), default=[0.0, 0.0]
+    )
     
     # Contextual information
-    context_tags = Column(ARRAY(String), default=[])
+    context_tags = Column(ARRAY(String).with_variant(JSON, "sqlite"), default=[])
     notes = Column(Text)
     
     # Relationships
     user = relationship("User", back_populates="health_data")
-    anomalies = relationship("HealthDataAnomaly", back_populates="health_data")
+    anomalies = relationship(
+        "HealthDataAnomaly",
+        primaryjoin=(
+            "and_(HealthData.user_id == foreign(HealthDataAnomaly.user_id), "
+            "HealthData.data_type == foreign(HealthDataAnomaly.data_type), "
+            "HealthData.timestamp == foreign(HealthDataAnomaly.timestamp), "
+            "HealthData.device_id == foreign(HealthDataAnomaly.device_id))"
+        ),
+        back_populates="health_data",
+        viewonly=True
+    )
     
     class Config:
         supported_types = [
@@ -183,19 +213,14 @@ class HealthData(Base):
 
     def validate_data(self) -> bool:
         """Validate the health data point against defined thresholds."""
-        if self.data_type in self.Config.thresholds:
-            threshold = self.Config.thresholds[self.data_type]
-            if threshold["min"] <= self.value <= threshold["max"]:
-                self.is_validated = True
-                return True
+        if metric_validator.validate(self.data_type, self.value):
+            self.is_validated = True
+            return True
         return False
 
     def get_metric_type(self) -> str:
         """Get the category of the health metric."""
-        for metric_type, metrics in self.Config.metric_types.items():
-            if self.data_type in metrics:
-                return metric_type
-        return "other"
+        return metric_validator.metric_type(self.data_type)
 
     def to_dict(self) -> dict:
         """Convert the health data point to a dictionary with context."""
@@ -205,7 +230,7 @@ class HealthData(Base):
             "value": self.value,
             "timestamp": self.timestamp.isoformat(),
             "metric_type": self.get_metric_type(),
-            "metadata": self.metadata,
+            "metadata": self.sample_metadata,
             "quality": {
                 "score": self.quality_score,
                 "validated": self.is_validated,
@@ -215,4 +240,8 @@ class HealthData(Base):
                 "tags": self.context_tags,
                 "notes": self.notes
             }
-        }
\ No newline at end of file
+        }
+
+
+# Precomputed lookup tables shared by the per-row and batch validation paths
+metric_validator = MetricValidator(HealthData.Config)
@@ -0,0 +1,37 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Text, Index, UniqueConstraint
+from .user import Base
+
+
+class JobRun(Base):
+    """One shard of one scheduled run of a background job.
+
+    (job, scheduled_for, shard) is unique, so any number of schedulers may
+    enqueue the same run and only one row results. A scheduler owns a
+    running shard until ``lease_until``; a shard whose lease ran out (its
+    scheduler died) is claimed again by another one. Failed attempts go
+    back to pending with ``run_after`` pushed out until ``attempts``
+    reaches the job's limit.
+    """
+    __tablename__ = "job_runs"
+    __table_args__ = (
+        UniqueConstraint("job", "scheduled_for", "shard", name="uq_job_runs_job_slot_shard"),
+        Index("ix_job_runs_status_run_after", "status", "run_after"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    job = Column(String, nullable=False)
+    scheduled_for = Column(DateTime, nullable=False)
+    shard = Column(Integer, nullable=False)
+    # Users with user_start <= id < user_end; both NULL for unsharded jobs
+    user_start = Column(Integer)
+    user_end = Column(Integer)
+
+    status = Column(String, nullable=False)  # pending, running, succeeded, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    run_after = Column(DateTime, nullable=False)
+    owner = Column(String)
+    lease_until = Column(DateTime)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    error = Column(Text)
+    result = Column(JSON)
@@ -0,0 +1,61 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, LargeBinary, Index, UniqueConstraint
+from .user import Base
+
+
+class LocationTrack(Base):
+    """One uploaded batch of a device's location fixes.
+
+    ``fixes`` holds the whole batch delta-encoded (see
+    location_store.encode_track): a few bytes per fix instead of a row
+    each. Batches are keyed by their first fix, so a resent batch is
+    stored once.
+    """
+    __tablename__ = "location_tracks"
+    __table_args__ = (
+        UniqueConstraint("user_id", "device_id", "start", name="uq_location_tracks_batch"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    device_id = Column(String, nullable=False)
+    start = Column(DateTime, nullable=False)
+    end = Column(DateTime, nullable=False)
+    count = Column(Integer, nullable=False)
+    fixes = Column(LargeBinary, nullable=False)
+
+
+class LocationCell(Base):
+    """Spatial and temporal index of the tracks: fixes of a user per geohash cell and hour.
+
+    ``area`` is the cell's coarser geohash prefix, the unit environmental
+    readings are pooled over.
+    """
+    __tablename__ = "location_cells"
+    __table_args__ = (
+        Index("ix_location_cells_area_bucket", "area", "bucket"),
+    )
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    cell = Column(String, primary_key=True)
+    area = Column(String, nullable=False)
+    fixes = Column(Integer, nullable=False)
+
+
+class EnvironmentalReading(Base):
+    """One environmental metric of an area over an hour, from every user located there.
+
+    Rebuilt from the hour rollups of those users, so it stores sums like
+    the rollups do: mean = sum / count.
+    """
+    __tablename__ = "environmental_readings"
+
+    area = Column(String, primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    data_type = Column(String, primary_key=True)
+
+    count = Column(Integer, nullable=False)
+    sum = Column(Float, nullable=False)
+    min = Column(Float, nullable=False)
+    max = Column(Float, nullable=False)
+    users = Column(Integer, nullable=False)
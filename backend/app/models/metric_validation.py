@@ -0,0 +1,83 @@
+from typing import Dict, Iterable, List, Tuple
+import numpy as np
+
+OTHER_METRIC_TYPE = "other"
+
+
+class MetricValidator:
+    """Columnar validation of health samples against metric thresholds.
+
+    Data types are interned to small integer IDs once, and thresholds and
+    category membership are stored as lookup arrays indexed by those IDs,
+    so a whole batch is checked with a few NumPy gathers and comparisons.
+    The last ID is reserved for unknown types.
+    """
+
+    def __init__(self, config):
+        types = list(config.supported_types)
+        for metrics in config.metric_types.values():
+            types.extend(metric for metric in metrics if metric not in types)
+        types.extend(metric for metric in config.thresholds if metric not in types)
+
+        self.type_ids: Dict[str, int] = {data_type: i for i, data_type in enumerate(types)}
+        self.unknown_id = len(types)
+        size = len(types) + 1
+
+        self.lower = np.full(size, np.nan)
+        self.upper = np.full(size, np.nan)
+        self.has_threshold = np.zeros(size, dtype=bool)
+        self.is_supported = np.zeros(size, dtype=bool)
+        self.is_supported[[self.type_ids[t] for t in config.supported_types]] = True
+        for data_type, threshold in config.thresholds.items():
+            type_id = self.type_ids[data_type]
+            self.lower[type_id] = threshold["min"]
+            self.upper[type_id] = threshold["max"]
+            self.has_threshold[type_id] = True
+
+        self.categories: List[str] = list(config.metric_types) + [OTHER_METRIC_TYPE]
+        other = len(self.categories) - 1
+        self.category_codes = np.full(size, other, dtype=np.int8)
+        # First listed category wins, as in the original linear scan
+        for code in reversed(range(other)):
+            for data_type in config.metric_types[self.categories[code]]:
+                self.category_codes[self.type_ids[data_type]] = code
+
+        # Scalar views of the same tables for the per-row wrappers
+        self._bounds = {
+            data_type: (float(self.lower[i]), float(self.upper[i]))
+            for data_type, i in self.type_ids.items() if self.has_threshold[i]
+        }
+        self._category_names = {
+            data_type: self.categories[self.category_codes[i]]
+            for data_type, i in self.type_ids.items()
+        }
+
+    def encode_types(self, data_types: Iterable[str]) -> np.ndarray:
+        """Map data type names to interned IDs (unknown types share one ID)"""
+        if isinstance(data_types, np.ndarray) and data_types.dtype.kind in "iu":
+            return data_types
+        type_ids = self.type_ids
+        unknown = self.unknown_id
+        return np.fromiter(
+            (type_ids.get(data_type, unknown) for data_type in data_types),
+            dtype=np.int16
+        )
+
+    def validate_batch(self, type_ids, values) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the validity mask and category codes of a columnar batch.
+
+        A sample is valid when its type has thresholds and the value lies
+        within them; NaN values are never valid.
+        """
+        type_ids = self.encode_types(type_ids)
+        values = np.asarray(values, dtype=np.float64)
+        with np.errstate(invalid="ignore"):
+            valid = (values >= self.lower[type_ids]) & (values <= self.upper[type_ids])
+        return valid, self.category_codes[type_ids]
+
+    def validate(self, data_type: str, value: float) -> bool:
+        bounds = self._bounds.get(data_type)
+        return bounds is not None and bounds[0] <= value <= bounds[1]
+
+    def metric_type(self, data_type: str) -> str:
+        return self._category_names.get(data_type, OTHER_METRIC_TYPE)
@@ -0,0 +1,48 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy.ext.declarative import declared_attr
+from .user import Base
+
+
+class HealthDataRollupMixin:
+    """Pre-aggregated statistics of one metric over a fixed time bucket.
+
+    Sums rather than means are stored so buckets merge exactly into
+    coarser ones: mean = sum / count, variance = sum_sq / count - mean².
+    """
+
+    @declared_attr
+    def user_id(cls):
+        return Column(Integer, ForeignKey("users.id"), primary_key=True)
+
+    data_type = Column(String, primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+
+    count = Column(Integer, nullable=False)
+    sum = Column(Float, nullable=False)
+    sum_sq = Column(Float, nullable=False)
+    min = Column(Float, nullable=False)
+    max = Column(Float, nullable=False)
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count
+
+
+class HealthDataMinuteRollup(HealthDataRollupMixin, Base):
+    __tablename__ = "health_data_rollup_minute"
+
+
+class HealthDataHourRollup(HealthDataRollupMixin, Base):
+    __tablename__ = "health_data_rollup_hour"
+
+
+class HealthDataDayRollup(HealthDataRollupMixin, Base):
+    __tablename__ = "health_data_rollup_day"
+
+
+# Bucket width in seconds -> rollup model, finest first
+ROLLUP_MODELS = {
+    60: HealthDataMinuteRollup,
+    3600: HealthDataHourRollup,
+    86400: HealthDataDayRollup
+}
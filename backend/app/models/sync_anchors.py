@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from datetime import datetime
+from .user import Base
+
+
+class HealthKitSyncAnchor(Base):
+    """Where the last HealthKit sync of one (user, device, metric) stopped.
+
+    ``anchor`` is the opaque token of an anchored query, only meaningful
+    to the HealthKit store of that device; ``high_water_mark`` is the
+    newest sample timestamp synced so far, used by clients without anchor
+    support and to tell late-arriving backfill apart from new samples.
+    """
+    __tablename__ = "healthkit_sync_anchors"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    device_id = Column(String, primary_key=True)
+    data_type = Column(String, primary_key=True)
+
+    anchor = Column(String)
+    high_water_mark = Column(DateTime)
+    synced_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, JSON
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -14,5 +14,9 @@ class User(Base):
     date_of_birth = Column(DateTime)
     genetic_data = Column(String)
     
+    # Recommendation inputs kept with the profile
+    lifestyle_data = Column(JSON)
+    medical_history = Column(JSON)
+    
     # Add relationship to health data
     health_data = relationship("HealthData", back_populates="user")
\ No newline at end of file
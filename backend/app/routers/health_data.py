@@ -1,8 +1,32 @@
-from fastapi import APIRouter
-from typing import Dict, List
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional
+from app.database import get_db, get_read_db
+from app.models.health_data import HealthData
+from app.schemas.health_data import HealthKitSyncResult, HealthSeries, HealthSyncPayload, HealthSyncResult
+from app.services.executors import ExecutorSaturated, compute_executor
+from app.services.health_serializer import DEFAULT_SAMPLE_LIMIT, HealthDataSerializer
+from app.services.ingestion_service import IngestionService
+from app.services.recent_metrics import RECENT_WINDOW_DAYS, recent_metrics_cache
+from app.services.recommendation_cache import recommendation_cache
+from app.services.timeseries_store import TimeSeriesStore
+from app.utils import naive_utc
 
 router = APIRouter(prefix="/health-data", tags=["health"])
 
+ingestion_service = IngestionService()
+timeseries_store = TimeSeriesStore()
+serializer = HealthDataSerializer()
+# Built on first use: the HealthKit bridge module is only installed where devices sync through it
+_healthkit_sync_service = None
+
+DEFAULT_RANGE = timedelta(days=30)
+MAX_SAMPLE_LIMIT = 100000
+
+# "points" is the default row format; "columnar" sends parallel arrays for charts
+RESPONSE_FORMATS = "^(points|columnar)$"
+
 
 @router.get("/")
 async def get_health_data() -> List[Dict]:
@@ -18,4 +42,149 @@ async def get_health_data() -> List[Dict]:
             "value": 120,
             "timestamp": "2024-03-20T10:00:00"
         }
-    ]
\ No newline at end of file
+    ]
+
+
+@router.post("/sync", response_model=HealthSyncResult)
+async def sync_health_data(payload: HealthSyncPayload, db: Session = Depends(get_db)):
+    # Validation and the bulk write are blocking, so they run on the compute pool
+    try:
+        result = await compute_executor.run(ingestion_service.ingest, db, payload)
+    except ExecutorSaturated:
+        raise _busy()
+    if result["inserted"]:
+        # New samples change the metric inputs of the user's recommendations
+        await recommendation_cache.invalidate(payload.user_id)
+    return result
+
+
+@router.post("/healthkit/sync/{user_id}", response_model=HealthKitSyncResult)
+async def sync_healthkit_device(
+    user_id: int,
+    device_id: str,
+    full: bool = False,
+    db: Session = Depends(get_db)
+):
+    """Pull a device's HealthKit changes since its stored anchors; ``full`` refetches its whole history"""
+    try:
+        result = await _healthkit_sync().sync(db, user_id, device_id, full)
+    except ExecutorSaturated:
+        raise _busy()
+    if result["inserted"] or result["deleted"]:
+        await recommendation_cache.invalidate(user_id)
+    return result
+
+
+@router.get("/recent")
+async def get_recent_stats(
+    user_id: int,
+    hours: Optional[int] = Query(None, ge=1, le=RECENT_WINDOW_DAYS * 24),
+    types: Optional[List[str]] = Query(None),
+    db: Session = Depends(get_read_db)
+):
+    """Statistics of each metric over the last ``hours`` (the whole recent window by default)"""
+    seconds = hours * 3600 if hours else RECENT_WINDOW_DAYS * 86400
+
+    def build() -> Dict:
+        return recent_metrics_cache.window_stats(db.connection(), user_id, seconds, types)
+
+    try:
+        metrics = await compute_executor.run(build)
+    except ExecutorSaturated:
+        raise _busy()
+    for data_type, stats in metrics.items():
+        stats["unit"] = _unit(data_type)
+    return {"user_id": user_id, "window": seconds, "metrics": metrics}
+
+
+@router.get("/{data_type}", response_model=HealthSeries)
+async def get_health_series(
+    data_type: str,
+    user_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    max_points: int = Query(500, ge=2, le=5000),
+    format: str = Query("points", regex=RESPONSE_FORMATS),
+    db: Session = Depends(get_read_db)
+):
+    """Downsampled series of one metric, bounded by max_points whatever the range"""
+    start, end = _time_range(data_type, start, end)
+    series = {
+        "type": data_type,
+        "unit": _unit(data_type),
+        "start": start,
+        "end": end
+    }
+
+    def build() -> bytes:
+        resolution, buckets = timeseries_store.downsample_columns(
+            db.connection(), user_id, data_type, start, end, max_points
+        )
+        return serializer.series_json(dict(series, resolution=resolution), buckets, format == "columnar")
+
+    try:
+        content = await compute_executor.run(build)
+    except ExecutorSaturated:
+        raise _busy()
+    return Response(content=content, media_type="application/json")
+
+
+@router.get("/{data_type}/samples")
+async def get_health_samples(
+    data_type: str,
+    user_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = Query(DEFAULT_SAMPLE_LIMIT, ge=1, le=MAX_SAMPLE_LIMIT),
+    format: str = Query("points", regex=RESPONSE_FORMATS),
+    db: Session = Depends(get_read_db)
+):
+    """Raw samples of one metric, oldest first, as HealthData.to_dict rows or columnar arrays"""
+    start, end = _time_range(data_type, start, end)
+    table = serializer.table
+
+    def build() -> bytes:
+        if format == "columnar":
+            rows = serializer.read_samples(
+                db.connection(), user_id, data_type, start, end, limit,
+                columns=[table.c.timestamp, table.c.value]
+            )
+            return serializer.samples_columnar_json(data_type, _unit(data_type), rows)
+        rows = serializer.read_samples(db.connection(), user_id, data_type, start, end, limit)
+        return serializer.samples_json(rows)
+
+    try:
+        content = await compute_executor.run(build)
+    except ExecutorSaturated:
+        raise _busy()
+    return Response(content=content, media_type="application/json")
+
+
+def _time_range(data_type: str, start: Optional[datetime], end: Optional[datetime]):
+    if data_type not in HealthData.Config.supported_types:
+        raise HTTPException(status_code=404, detail=f"Unknown health data type: {data_type}")
+
+    end = naive_utc(end) if end else datetime.utcnow()
+    start = naive_utc(start) if start else end - DEFAULT_RANGE
+    if start >= end:
+        raise HTTPException(status_code=422, detail="start must be before end")
+    return start, end
+
+
+def _unit(data_type: str) -> Optional[str]:
+    return HealthData.Config.thresholds.get(data_type, {}).get("unit")
+
+
+def _healthkit_sync():
+    global _healthkit_sync_service
+    if _healthkit_sync_service is None:
+        try:
+            from app.services.healthkit_sync import HealthKitSyncService
+        except ImportError:
+            raise HTTPException(status_code=503, detail="HealthKit sync is not available on this server")
+        _healthkit_sync_service = HealthKitSyncService(ingestion=ingestion_service)
+    return _healthkit_sync_service
+
+
+def _busy() -> HTTPException:
+    return HTTPException(status_code=429, detail="Health data service is busy", headers={"Retry-After": "1"})
@@ -0,0 +1,51 @@
+import asyncio
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from app.services.live_channel import HEARTBEAT_INTERVAL, Subscription, live_broker
+
+router = APIRouter(prefix="/live", tags=["live"])
+
+# "Try again later": the client fell behind and should reconnect
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+@router.websocket("/{user_id}")
+async def live_socket(websocket: WebSocket, user_id: int):
+    """Newly ingested samples and anomalies of a user, as JSON text frames"""
+    await websocket.accept()
+    async with live_broker.subscribe(user_id) as subscription:
+        sender = asyncio.create_task(_send_frames(websocket, subscription))
+        try:
+            # Nothing is expected from the client; this only waits for the disconnect
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+        finally:
+            sender.cancel()
+
+
+@router.get("/{user_id}/events")
+async def live_events(user_id: int):
+    """The same frames as the WebSocket, as server-sent events"""
+    async def stream():
+        async with live_broker.subscribe(user_id) as subscription:
+            async for frame in subscription.frames(HEARTBEAT_INTERVAL):
+                yield b"data: " + frame + b"\n\n" if frame else b": keepalive\n\n"
+            if subscription.dropped:
+                yield b"event: dropped\ndata: {}\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def _send_frames(websocket: WebSocket, subscription: Subscription):
+    try:
+        async for frame in subscription.frames():
+            await websocket.send_text(frame.decode())
+        if subscription.dropped:
+            await websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+    except (WebSocketDisconnect, RuntimeError):
+        # The client went away mid-send
+        pass
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.orm import Session
+from typing import Dict, Optional
+from app.database import get_db, get_read_db
+from app.schemas.location import LocationBatch, LocationUpdateResult
+from app.services.environment_index import EnvironmentIndex, conditions
+from app.services.executors import ExecutorSaturated, compute_executor
+from app.services.location_store import LocationStore
+from app.utils import naive_utc
+
+router = APIRouter(prefix="/location", tags=["location"])
+
+environment_index = EnvironmentIndex()
+location_store = LocationStore(environment_index)
+
+DEFAULT_RANGE = timedelta(days=1)
+MAX_RANGE = timedelta(days=31)
+
+# "points" is the default row format; "columnar" sends parallel arrays for maps
+RESPONSE_FORMATS = "^(points|columnar)$"
+
+
+@router.post("/update", response_model=LocationUpdateResult)
+async def update_location(payload: LocationBatch, db: Session = Depends(get_db)):
+    """Store a batch of fixes; clients buffer fixes and upload them together"""
+    try:
+        return await compute_executor.run(location_store.ingest, db, payload)
+    except ExecutorSaturated:
+        raise _busy()
+
+
+@router.get("/history")
+async def get_location_history(
+    user_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    format: str = Query("points", regex=RESPONSE_FORMATS),
+    db: Session = Depends(get_read_db)
+):
+    """Fixes of a user between start and end (the last day by default), oldest first"""
+    end = naive_utc(end) if end else datetime.utcnow()
+    start = naive_utc(start) if start else end - DEFAULT_RANGE
+    if start >= end:
+        raise HTTPException(status_code=422, detail="start must be before end")
+    if end - start > MAX_RANGE:
+        raise HTTPException(status_code=422, detail=f"range is limited to {MAX_RANGE.days} days")
+
+    def build() -> bytes:
+        columns = location_store.history(db.connection(), user_id, start, end)
+        return location_store.history_json(user_id, columns, format == "columnar")
+
+    try:
+        content = await compute_executor.run(build)
+    except ExecutorSaturated:
+        raise _busy()
+    return Response(content=content, media_type="application/json")
+
+
+@router.get("/environment")
+async def get_environment(user_id: int, db: Session = Depends(get_read_db)) -> Dict:
+    """Current conditions in the user's latest area, pooled from nearby users' readings"""
+
+    def build() -> Dict:
+        rows = db.connection().execute(environment_index.conditions_query(user_id, datetime.utcnow()))
+        return conditions(rows)
+
+    try:
+        return {"user_id": user_id, "environmental_data": await compute_executor.run(build)}
+    except ExecutorSaturated:
+        raise _busy()
+
+
+def _busy() -> HTTPException:
+    return HTTPException(status_code=429, detail="Location service is busy", headers={"Retry-After": "1"})
@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from app.metrics import metrics_response
+
+router = APIRouter(tags=["monitoring"])
+
+
+@router.get("/metrics", include_in_schema=False)
+def get_metrics():
+    # Plain def: collecting walks every series, keep it off the event loop
+    return metrics_response()
@@ -1,7 +1,13 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
+from typing import Dict
+from app.services.executors import ExecutorSaturated, compute_executor, inference_executor
+from app.services.recommendation_cache import recommendation_cache
+from app.services.recommendation_service import RecommendationService
 
 router = APIRouter(prefix="/recommendations", tags=["recommendations"])
 
+recommendation_service = RecommendationService()
+
 
 @router.get("/")
 async def get_recommendations():
@@ -10,4 +16,34 @@ async def get_recommendations():
         "Increase daily water intake",
         "Add 30 minutes of cardio exercise",
         "Consider vitamin D supplementation"
-    ]
\ No newline at end of file
+    ]
+
+
+@router.get("/cache/stats")
+async def get_cache_stats() -> Dict:
+    """Hit, stale-hit and miss counts of the recommendation cache in this worker"""
+    return recommendation_cache.stats()
+
+
+@router.get("/executors/stats")
+async def get_executor_stats() -> Dict:
+    """Queue depth and rejections of the executors in this worker"""
+    return {
+        "inference": inference_executor.stats(),
+        "compute": compute_executor.stats(),
+        "coalesced": recommendation_service.coalescer.coalesced
+    }
+
+
+@router.get("/{user_id}")
+async def get_user_recommendations(user_id: int):
+    # The service opens its own session, shared by the requests it coalesces
+    try:
+        recommendations = await recommendation_service.get_recommendations(user_id)
+    except ExecutorSaturated:
+        raise HTTPException(
+            status_code=429, detail="Recommendation service is busy", headers={"Retry-After": "1"}
+        )
+    if recommendations is None:
+        raise HTTPException(status_code=404, detail=f"Unknown user: {user_id}")
+    return recommendations
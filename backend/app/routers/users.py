@@ -0,0 +1,56 @@
+import json
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
+from app.models.user import User
+from app.schemas.user import User as UserSchema, UserProfile
+
+router = APIRouter(prefix="/users", tags=["users"])
+
+users = User.__table__
+
+
+@router.post("/", response_model=UserSchema, status_code=201)
+async def create_user(profile: UserProfile, db: AsyncSession = Depends(get_async_db)):
+    """Create a user with the profile data recommendations are based on"""
+    if (await db.execute(select(users.c.id).where(users.c.email == profile.email))).first():
+        raise HTTPException(status_code=409, detail=f"Email already registered: {profile.email}")
+
+    user_id = (await db.execute(users.insert().values(**_columns(profile)))).inserted_primary_key[0]
+    await db.commit()
+    return {"id": user_id, **profile.dict()}
+
+
+@router.get("/{user_id}", response_model=UserSchema)
+async def get_user(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    # Read from the primary: a profile is often fetched right after it is written
+    row = (await db.execute(
+        select(
+            users.c.id, users.c.email, users.c.full_name, users.c.date_of_birth,
+            users.c.genetic_data, users.c.lifestyle_data, users.c.medical_history
+        ).where(users.c.id == user_id)
+    )).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"Unknown user: {user_id}")
+
+    user = dict(row._mapping)
+    user["genetic_data"] = json.loads(user["genetic_data"]) if user["genetic_data"] else None
+    return user
+
+
+@router.put("/{user_id}", response_model=UserSchema)
+async def update_user(user_id: int, profile: UserProfile, db: AsyncSession = Depends(get_async_db)):
+    # Cached recommendations need no invalidation: their key covers these inputs
+    updated = await db.execute(users.update().where(users.c.id == user_id).values(**_columns(profile)))
+    if not updated.rowcount:
+        raise HTTPException(status_code=404, detail=f"Unknown user: {user_id}")
+    await db.commit()
+    return {"id": user_id, **profile.dict()}
+
+
+def _columns(profile: UserProfile) -> dict:
+    columns = profile.dict()
+    # genetic_data predates the JSON columns and is stored as text
+    columns["genetic_data"] = json.dumps(profile.genetic_data) if profile.genetic_data is not None else None
+    return columns
@@ -0,0 +1,55 @@
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel
+
+
+class HealthSample(BaseModel):
+    type: str
+    value: float
+    timestamp: datetime
+    device_id: Optional[str] = None
+    metadata: Optional[dict] = None
+
+
+class HealthSyncPayload(BaseModel):
+    user_id: int
+    device_id: str
+    source: str = "healthkit"
+    source_version: Optional[str] = None
+    samples: List[HealthSample]
+
+
+class RejectedSample(BaseModel):
+    index: int
+    reason: str
+
+
+class HealthSyncResult(BaseModel):
+    received: int
+    inserted: int
+    duplicates: int
+    rejected: List[RejectedSample] = []
+    anomalies: int = 0
+
+
+class HealthKitSyncResult(HealthSyncResult):
+    metrics: int
+    backfilled: int = 0
+    deleted: int = 0
+
+
+class HealthSeriesPoint(BaseModel):
+    timestamp: datetime
+    value: float
+    min: float
+    max: float
+    count: int
+
+
+class HealthSeries(BaseModel):
+    type: str
+    unit: Optional[str] = None
+    start: datetime
+    end: datetime
+    resolution: int
+    points: List[HealthSeriesPoint]
@@ -0,0 +1,28 @@
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+# Fixes accepted per upload; a background session batches minutes to hours of them
+MAX_BATCH_FIXES = 10000
+
+
+class LocationFix(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    timestamp: datetime
+    # Horizontal accuracy in meters, as reported by the device
+    accuracy: Optional[float] = Field(None, ge=0)
+
+
+class LocationBatch(BaseModel):
+    user_id: int
+    device_id: str
+    fixes: List[LocationFix] = Field(..., min_items=1, max_items=MAX_BATCH_FIXES)
+
+
+class LocationUpdateResult(BaseModel):
+    received: int
+    stored: int
+    duplicate: bool = False
+    cells: int = 0
+    bytes: int = 0
@@ -0,0 +1,17 @@
+from datetime import datetime
+from typing import Dict, Optional
+from pydantic import BaseModel
+
+
+class UserProfile(BaseModel):
+    email: str
+    full_name: Optional[str] = None
+    date_of_birth: Optional[datetime] = None
+    # Recommendation engine inputs
+    genetic_data: Optional[Dict[str, dict]] = None
+    lifestyle_data: Optional[dict] = None
+    medical_history: Optional[dict] = None
+
+
+class User(UserProfile):
+    id: int
@@ -0,0 +1,213 @@
+import math
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from ..models.anomalies import HealthDataAnomaly, HealthDataStreamState
+
+# Samples a stream must have seen before its samples are scored
+WARMUP_SAMPLES = 30
+EWMA_ALPHA = 0.05
+# Step of the median/MAD sketch, as a fraction of the current spread
+SKETCH_RATE = 0.05
+# MAD -> standard deviation of a normal distribution
+MAD_SCALE = 1.4826
+
+Z_THRESHOLD = 4.0
+EWMA_THRESHOLD = 4.0
+MAD_THRESHOLD = 5.0
+# Detectors that must agree before a sample is flagged
+MIN_VOTES = 2
+
+STATE_FIELDS = ["count", "mean", "m2", "ewma", "ewm_var", "median", "mad", "last_timestamp"]
+
+
+class StreamState:
+    """O(1) detector state of one (user, metric) stream.
+
+    Three baselines are kept side by side: Welford's running mean and
+    variance (long-term), an exponentially weighted mean and variance
+    (recent), and a stochastic-approximation median and MAD (robust to
+    the outliers it is looking for). Each sample is scored against the
+    state before it, then folded in.
+    """
+
+    __slots__ = STATE_FIELDS
+
+    def __init__(
+        self,
+        count: int = 0,
+        mean: float = 0.0,
+        m2: float = 0.0,
+        ewma: float = 0.0,
+        ewm_var: float = 0.0,
+        median: float = 0.0,
+        mad: float = 0.0,
+        last_timestamp: datetime = datetime.min
+    ):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.ewma = ewma
+        self.ewm_var = ewm_var
+        self.median = median
+        self.mad = mad
+        self.last_timestamp = last_timestamp
+
+    def update(self, values: Iterable[float]) -> List[Tuple[int, float, float, float, float]]:
+        """Fold values in, in order; (index, expected, z, ewma, mad score) of flagged ones"""
+        count, mean, m2 = self.count, self.mean, self.m2
+        ewma, ewm_var = self.ewma, self.ewm_var
+        median, mad = self.median, self.mad
+        alpha, keep = EWMA_ALPHA, 1.0 - EWMA_ALPHA
+        sqrt = math.sqrt
+        flagged = []
+
+        for index, value in enumerate(values):
+            if count == 0:
+                count, mean, ewma, median = 1, value, value, value
+                continue
+
+            std = sqrt(m2 / (count - 1)) if count > 1 else 0.0
+            if count >= WARMUP_SAMPLES:
+                z = (value - mean) / std if std > 0 else 0.0
+                ewma_score = (value - ewma) / sqrt(ewm_var) if ewm_var > 0 else 0.0
+                mad_score = (value - median) / (MAD_SCALE * mad) if mad > 0 else 0.0
+                votes = (
+                    (abs(z) > Z_THRESHOLD)
+                    + (abs(ewma_score) > EWMA_THRESHOLD)
+                    + (abs(mad_score) > MAD_THRESHOLD)
+                )
+                if votes >= MIN_VOTES:
+                    flagged.append((index, ewma, z, ewma_score, mad_score))
+
+            # Welford
+            count += 1
+            delta = value - mean
+            mean += delta / count
+            m2 += delta * (value - mean)
+
+            # Exponentially weighted mean and variance
+            diff = value - ewma
+            increment = alpha * diff
+            ewma += increment
+            ewm_var = keep * (ewm_var + diff * increment)
+
+            # Median and MAD move a fixed fraction of the spread toward each sample
+            step = SKETCH_RATE * (mad if mad > 0 else std)
+            if value > median:
+                median += step
+            elif value < median:
+                median -= step
+            deviation = abs(value - median)
+            if deviation > mad:
+                mad += step
+            elif deviation < mad:
+                mad = max(mad - step, 0.0)
+
+        self.count, self.mean, self.m2 = count, mean, m2
+        self.ewma, self.ewm_var = ewma, ewm_var
+        self.median, self.mad = median, mad
+        return flagged
+
+    def to_row(self) -> Dict:
+        return {field: getattr(self, field) for field in STATE_FIELDS}
+
+
+class AnomalyDetector:
+    """Scores ingested samples per (user, metric) stream as they arrive.
+
+    Stream state lives in health_data_stream_state and is read and written
+    in the ingesting transaction, so detection resumes after a restart and
+    stays consistent with what was actually stored. Samples not newer than
+    a stream's last scored timestamp (re-syncs, backfills) are stored but
+    not scored.
+    """
+
+    def __init__(self):
+        self.anomalies = HealthDataAnomaly.__table__
+        self.states = HealthDataStreamState.__table__
+
+    def process(self, connection: Connection, user_id: int, rows: List[Dict]) -> List[Dict]:
+        """Update the streams of one user's ingested rows; returns the anomaly rows written"""
+        streams: Dict[str, List[Dict]] = defaultdict(list)
+        for row in rows:
+            streams[row["data_type"]].append(row)
+        states = self.load_states(connection, user_id, list(streams), for_update=True)
+
+        anomalies = []
+        for data_type, samples in streams.items():
+            state = states.setdefault(data_type, StreamState())
+            samples = sorted(
+                (sample for sample in samples if sample["timestamp"] > state.last_timestamp),
+                key=lambda sample: sample["timestamp"]
+            )
+            if not samples:
+                del states[data_type]
+                continue
+
+            flagged = state.update([sample["value"] for sample in samples])
+            state.last_timestamp = samples[-1]["timestamp"]
+            for index, expected, z, ewma_score, mad_score in flagged:
+                sample = samples[index]
+                anomalies.append({
+                    "user_id": user_id,
+                    "data_type": data_type,
+                    "timestamp": sample["timestamp"],
+                    "device_id": sample["device_id"],
+                    "value": sample["value"],
+                    "expected": expected,
+                    "z_score": z,
+                    "ewma_score": ewma_score,
+                    "mad_score": mad_score,
+                    "detectors": _fired(z, ewma_score, mad_score)
+                })
+
+        self._save_states(connection, user_id, states)
+        if anomalies:
+            connection.execute(self.anomalies.insert(), anomalies)
+        return anomalies
+
+    def load_states(
+        self,
+        connection: Connection,
+        user_id: int,
+        data_types: List[str],
+        for_update: bool = False
+    ) -> Dict[str, StreamState]:
+        table = self.states
+        query = select(table).where(table.c.user_id == user_id, table.c.data_type.in_(data_types))
+        if for_update:
+            # Serialises concurrent ingests of one user's streams (no-op on SQLite)
+            query = query.with_for_update()
+        return {
+            row.data_type: StreamState(**{field: row._mapping[field] for field in STATE_FIELDS})
+            for row in connection.execute(query)
+        }
+
+    def _save_states(self, connection: Connection, user_id: int, states: Dict[str, StreamState]):
+        if not states:
+            return
+        dialect = postgresql if connection.dialect.name == "postgresql" else sqlite
+        statement = dialect.insert(self.states)
+        statement = statement.on_conflict_do_update(
+            index_elements=["user_id", "data_type"],
+            set_={field: statement.excluded[field] for field in STATE_FIELDS}
+        )
+        connection.execute(statement, [
+            dict(state.to_row(), user_id=user_id, data_type=data_type)
+            for data_type, state in states.items()
+        ])
+
+
+def _fired(z: float, ewma_score: float, mad_score: float) -> List[str]:
+    detectors = []
+    if abs(z) > Z_THRESHOLD:
+        detectors.append("zscore")
+    if abs(ewma_score) > EWMA_THRESHOLD:
+        detectors.append("ewma")
+    if abs(mad_score) > MAD_THRESHOLD:
+        detectors.append("mad")
+    return detectors
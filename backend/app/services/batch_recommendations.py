@@ -0,0 +1,41 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+import pandas as pd
+from .recommendation_engine import RecommendationEngine
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHARD_SIZE = 5000
+
+# Engine of the current pool worker, built once by the initializer
+_engine: Optional[RecommendationEngine] = None
+
+
+def _init_worker():
+    global _engine
+    _engine = RecommendationEngine()
+
+
+def _run_shard(shard: pd.DataFrame) -> List[Tuple[int, Dict]]:
+    return list(zip(shard["user_id"].tolist(), _engine.generate_recommendations_batch(shard)))
+
+
+def run_nightly_batch(
+    users: pd.DataFrame,
+    shard_size: int = DEFAULT_SHARD_SIZE,
+    workers: Optional[int] = None
+) -> Iterator[Tuple[int, Dict]]:
+    """Recompute recommendations for every user, shard by shard across a process pool.
+
+    ``users`` needs a ``user_id`` column next to the generate_recommendations
+    inputs. Yields (user_id, recommendations) in input order.
+    """
+    workers = workers or os.cpu_count()
+    shards = [users.iloc[start:start + shard_size] for start in range(0, len(users), shard_size)]
+    logger.info("Recomputing recommendations for %d users in %d shards", len(users), len(shards))
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        for results in pool.map(_run_shard, shards):
+            yield from results
@@ -0,0 +1,161 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Set, Tuple
+from sqlalchemy import and_, delete, func, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.sql import Select
+from ..models.locations import EnvironmentalReading, LocationCell
+from ..models.rollups import HealthDataHourRollup
+
+logger = logging.getLogger(__name__)
+
+# Environmental metrics that describe the place rather than the person:
+# a reading of one applies to everyone in the same area at the same time
+AREA_METRICS = ["air_quality", "uv_exposure", "ambient_temperature", "humidity", "atmospheric_pressure"]
+# RecommendationEngine environmental_data keys of metrics named differently
+ENGINE_KEYS = {"air_quality": "air_quality_index", "uv_exposure": "uv_index"}
+
+# Readings older than this do not describe current conditions
+CONDITIONS_WINDOW = timedelta(hours=6)
+
+
+class EnvironmentIndex:
+    """Environmental readings per geohash area and hour, joined to users' location history.
+
+    A user's hourly environmental rollups are attributed to every area
+    the location index places them in during that hour, and pooled with
+    those of everyone else there. Readings are rebuilt from the rollups,
+    so a refresh is idempotent and may be repeated after either side
+    changes: new fixes or new environmental samples.
+    """
+
+    def __init__(self):
+        self.cells = LocationCell.__table__
+        self.readings = EnvironmentalReading.__table__
+        self.hour_rollup = HealthDataHourRollup.__table__
+
+    def refresh(self, bind: Engine, pairs: Iterable[Tuple[str, datetime]]):
+        """Rebuild the readings of each (area, hour), one area per transaction.
+
+        Readings pool the rollups of everyone in an area, so they are
+        written outside of any one user's transaction, once that user's
+        rollups are committed. On Postgres a per-area advisory lock queues
+        concurrent refreshes of an area, and each upserts what the
+        rollups committed before it add up to. A failed refresh is logged
+        rather than raised: the samples or fixes behind it are already
+        stored, and the next refresh of the area rebuilds its readings.
+        """
+        buckets: Dict[str, Set[datetime]] = defaultdict(set)
+        for area, bucket in pairs:
+            buckets[area].add(bucket)
+        # Areas in a fixed order, so two refreshes never wait on each other's locks
+        for area in sorted(buckets):
+            try:
+                with bind.begin() as connection:
+                    if connection.dialect.name == "postgresql":
+                        connection.execute(
+                            text("SELECT pg_advisory_xact_lock(hashtext(:key))"),
+                            {"key": "environmental_readings:" + area}
+                        )
+                    for bucket in sorted(buckets[area]):
+                        self._refresh_reading(connection, area, bucket)
+            except SQLAlchemyError:
+                logger.exception("Refreshing environmental readings of area %s failed", area)
+
+    def refresh_samples(self, bind: Engine, user_id: int, rows: List[Dict]):
+        """Rebuild the readings affected by a user's committed new or deleted samples"""
+        hours = {_hour(row["timestamp"]) for row in rows if row["data_type"] in AREA_METRICS}
+        if not hours:
+            return
+        cells = self.cells
+        with bind.connect() as connection:
+            pairs = connection.execute(
+                select(cells.c.area, cells.c.bucket).distinct()
+                .where(and_(cells.c.user_id == user_id, cells.c.bucket.in_(hours)))
+            ).all()
+        self.refresh(bind, [tuple(pair) for pair in pairs])
+
+    def refresh_locations(self, bind: Engine, user_id: int, pairs: Iterable[Tuple[str, datetime]]):
+        """Rebuild the readings of (area, hour) pairs a user was located in, if they recorded area metrics then"""
+        pairs = set(pairs)
+        if not pairs:
+            return
+        rollup = self.hour_rollup
+        with bind.connect() as connection:
+            recorded = set(connection.execute(
+                select(rollup.c.bucket).distinct().where(and_(
+                    rollup.c.user_id == user_id,
+                    rollup.c.bucket.in_({bucket for _, bucket in pairs}),
+                    rollup.c.data_type.in_(AREA_METRICS)
+                ))
+            ).scalars())
+        self.refresh(bind, [(area, bucket) for area, bucket in pairs if bucket in recorded])
+
+    def _refresh_reading(self, connection: Connection, area: str, bucket: datetime):
+        """Upsert the readings of one (area, hour) from the rollups of the users located there"""
+        cells, readings, rollup = self.cells, self.readings, self.hour_rollup
+        present = select(cells.c.user_id).where(and_(cells.c.area == area, cells.c.bucket == bucket))
+        rows = [
+            {
+                "area": area, "bucket": bucket, "data_type": data_type,
+                "count": count, "sum": total, "min": low, "max": high, "users": users
+            }
+            for data_type, count, total, low, high, users in connection.execute(
+                select(
+                    rollup.c.data_type, func.sum(rollup.c.count), func.sum(rollup.c.sum),
+                    func.min(rollup.c.min), func.max(rollup.c.max), func.count(rollup.c.user_id.distinct())
+                )
+                .where(and_(
+                    rollup.c.bucket == bucket,
+                    rollup.c.data_type.in_(AREA_METRICS),
+                    rollup.c.user_id.in_(present)
+                ))
+                .group_by(rollup.c.data_type)
+            )
+        ]
+        stale = and_(readings.c.area == area, readings.c.bucket == bucket)
+        if rows:
+            dialect = postgresql if connection.dialect.name == "postgresql" else sqlite
+            statement = dialect.insert(readings)
+            connection.execute(
+                statement.on_conflict_do_update(
+                    index_elements=["area", "bucket", "data_type"],
+                    set_={field: statement.excluded[field] for field in ("count", "sum", "min", "max", "users")}
+                ),
+                rows
+            )
+            stale = and_(stale, readings.c.data_type.notin_([row["data_type"] for row in rows]))
+        # Metrics nobody located there reports any more, e.g. after a deletion
+        connection.execute(delete(readings).where(stale))
+
+    def conditions_query(self, user_id: int, now: datetime, window: timedelta = CONDITIONS_WINDOW) -> Select:
+        """Readings of the user's latest area within ``window``, oldest first; see conditions()"""
+        cells, readings = self.cells, self.readings
+        since = _hour(now - window)
+        area = (
+            select(cells.c.area)
+            .where(and_(cells.c.user_id == user_id, cells.c.bucket >= since))
+            .order_by(cells.c.bucket.desc(), cells.c.fixes.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        return (
+            select(readings.c.data_type, readings.c.sum, readings.c.count)
+            .where(and_(readings.c.area == area, readings.c.bucket >= since))
+            .order_by(readings.c.data_type, readings.c.bucket)
+        )
+
+
+def conditions(rows: Iterable[Tuple[str, float, int]]) -> Dict[str, float]:
+    """environmental_data input of the engine from conditions_query rows: each metric's latest hourly mean"""
+    latest = {}
+    for data_type, total, count in rows:
+        latest[ENGINE_KEYS.get(data_type, data_type)] = total / count
+    return latest
+
+
+def _hour(timestamp: datetime) -> datetime:
+    return timestamp.replace(minute=0, second=0, microsecond=0)
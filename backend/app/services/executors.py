@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import BrokenExecutor, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", min(4, os.cpu_count() or 1)))
+INFERENCE_QUEUE_DEPTH = int(os.getenv("INFERENCE_QUEUE_DEPTH", 32))
+COMPUTE_WORKERS = int(os.getenv("COMPUTE_WORKERS", 8))
+COMPUTE_QUEUE_DEPTH = int(os.getenv("COMPUTE_QUEUE_DEPTH", 64))
+
+# Inference workers are forked from a server process that imported the ML
+# stack once: API workers never load it themselves, and every inference
+# worker starts warm and shares those pages copy-on-write
+INFERENCE_START_METHOD = os.getenv(
+    "INFERENCE_START_METHOD",
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+INFERENCE_PRELOAD = [
+    "app.services.recommendation_engine", "sklearn.ensemble", "sklearn.preprocessing"
+]
+
+# Engine of the current inference worker, built once by the initializer
+_engine = None
+
+
+class ExecutorSaturated(Exception):
+    """Raised instead of queueing work on an executor that is already full"""
+
+    def __init__(self, name: str):
+        super().__init__(f"{name} executor is saturated")
+        self.name = name
+
+
+class BoundedExecutor:
+    """Runs blocking work off the event loop with a cap on queued jobs.
+
+    At most ``max_workers`` jobs run at once and ``max_queue`` more may
+    wait; past that, run() raises ExecutorSaturated straight away so the
+    route can answer 429 instead of letting latency grow without bound.
+    A job counts as pending until it finishes in the pool, even when the
+    caller awaiting it was cancelled. The pool is created on first use,
+    so importing this module never spawns processes, and replaced when a
+    worker dies and breaks it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        factory: Callable[[int], Executor],
+        max_workers: int,
+        max_queue: int
+    ):
+        self.name = name
+        self.factory = factory
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor: Optional[Executor] = None
+        # Jobs finish on pool threads, which release them
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.rejected = 0
+        self.restarts = 0
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = self.factory(self.max_workers)
+        return self._executor
+
+    async def run(self, fn: Callable, *args):
+        with self._lock:
+            if self.pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise ExecutorSaturated(self.name)
+            self.pending += 1
+
+        try:
+            executor, future = self._submit(fn, args)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wrap_future(future)
+        except BrokenExecutor:
+            self._replace(executor)
+            raise
+
+    def _submit(self, fn: Callable, args: Tuple) -> Tuple[Executor, Future]:
+        executor = self.executor
+        try:
+            return executor, executor.submit(fn, *args)
+        except BrokenExecutor:
+            # Broken by an earlier job; this one never ran, so a fresh pool may take it
+            self._replace(executor)
+            executor = self.executor
+            return executor, executor.submit(fn, *args)
+
+    def _release(self, _: Optional[Future]):
+        with self._lock:
+            self.pending -= 1
+
+    def _replace(self, broken: Executor):
+        with self._lock:
+            if self._executor is not broken:
+                return  # already replaced by another caller
+            self._executor = None
+            self.restarts += 1
+        logger.error("%s executor broke (a worker died); starting a new pool", self.name)
+        broken.shutdown(wait=False)
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "pending": self.pending,
+            "queued": max(0, self.pending - self.max_workers),
+            "rejected": self.rejected,
+            "restarts": self.restarts
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+class Coalescer:
+    """Lets concurrent calls for the same key share one computation.
+
+    The first caller starts the computation; callers arriving while it is
+    in flight await the same future. A caller that is cancelled (e.g. the
+    client went away) does not cancel the computation for the others.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable]):
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(compute())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(future)
+
+
+def _init_inference_worker():
+    global _engine
+    from .recommendation_engine import RecommendationEngine
+    _engine = RecommendationEngine()
+
+
+def _inference_pool(workers: int) -> ProcessPoolExecutor:
+    context = multiprocessing.get_context(INFERENCE_START_METHOD)
+    if INFERENCE_START_METHOD == "forkserver":
+        # Modules that fail to import are skipped by the server
+        context.set_forkserver_preload(INFERENCE_PRELOAD)
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_inference_worker)
+
+
+def generate_recommendations(user_data: dict) -> Dict:
+    """RecommendationEngine.generate_recommendations in an inference worker"""
+    return _engine.generate_recommendations(user_data)
+
+
+# Model inference: sklearn/pandas work that holds the GIL, so separate processes
+inference_executor = BoundedExecutor(
+    "inference",
+    _inference_pool,
+    INFERENCE_WORKERS,
+    INFERENCE_QUEUE_DEPTH
+)
+
+# NumPy-heavy request steps, which release the GIL in their inner loops
+compute_executor = BoundedExecutor(
+    "compute",
+    lambda workers: ThreadPoolExecutor(max_workers=workers, thread_name_prefix="compute"),
+    COMPUTE_WORKERS,
+    COMPUTE_QUEUE_DEPTH
+)
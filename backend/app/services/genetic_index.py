@@ -0,0 +1,109 @@
+import json
+from types import MappingProxyType
+from typing import Callable, Dict, FrozenSet, List, Mapping, NamedTuple, Optional, Tuple
+
+# Variants reported for a gene that do not count as risk variants
+REFERENCE_VARIANTS = frozenset({None, "", "wild_type", "reference", "normal", "benign"})
+
+
+class GeneticRisk(NamedTuple):
+    gene: str
+    risk_level: str
+    conditions: Tuple[str, ...]
+    recommendations: Tuple[str, ...]
+
+    def to_dict(self) -> dict:
+        return {
+            "gene": self.gene,
+            "risk_level": self.risk_level,
+            "conditions": list(self.conditions),
+            "recommendations": list(self.recommendations)
+        }
+
+
+def load_marker_table(path: str) -> Dict[str, dict]:
+    """Read a gene -> marker info table from a JSON data file"""
+    with open(path) as f:
+        return json.load(f)
+
+
+def normalize_conditions(marker: Mapping) -> Tuple[str, ...]:
+    """Conditions of a marker, whichever of the table's spellings it uses"""
+    if "cancer_types" in marker:
+        return tuple(marker["cancer_types"])
+    if "conditions" in marker:
+        return tuple(marker["conditions"])
+    if "condition" in marker:
+        return (marker["condition"],)
+    if "medication_metabolism" in marker:
+        return (f"{marker['medication_metabolism']}_metabolism",)
+    return ()
+
+
+class GeneticMarkerIndex:
+    """Immutable, precompiled view of the genetic marker table.
+
+    Risk level, normalized conditions and deduplicated recommendations are
+    computed once per gene when the index is built, so analysing a user is
+    a membership test and a lookup per reported gene, whatever the size of
+    the table.
+    """
+
+    def __init__(
+        self,
+        markers: Mapping[str, Mapping],
+        risk_level: Callable[[float], str],
+        recommendations: Callable[[Mapping], List[str]]
+    ):
+        self.markers: Mapping[str, Mapping] = MappingProxyType({
+            gene: MappingProxyType(dict(marker)) for gene, marker in markers.items()
+        })
+        self.genes: FrozenSet[str] = frozenset(self.markers)
+        self.feature_columns: Mapping[str, int] = MappingProxyType(
+            {gene: i for i, gene in enumerate(self.markers)}
+        )
+
+        self._risks: Mapping[str, GeneticRisk] = MappingProxyType({
+            gene: GeneticRisk(
+                gene=gene,
+                risk_level=risk_level(marker["risk_factor"]),
+                conditions=normalize_conditions(marker),
+                recommendations=tuple(dict.fromkeys(recommendations(marker)))
+            )
+            for gene, marker in self.markers.items()
+        })
+        self._risk_variants: Mapping[str, FrozenSet] = MappingProxyType({
+            gene: frozenset(marker["risk_variants"])
+            for gene, marker in self.markers.items() if "risk_variants" in marker
+        })
+
+    def __len__(self) -> int:
+        return len(self.markers)
+
+    def is_risk_variant(self, gene: str, variant: Optional[str]) -> bool:
+        if gene not in self.genes:
+            return False
+        risk_variants = self._risk_variants.get(gene)
+        if risk_variants is not None:
+            return variant in risk_variants
+        return variant not in REFERENCE_VARIANTS
+
+    def risk(self, gene: str) -> Optional[GeneticRisk]:
+        """The precompiled risk of a marker gene, regardless of variant"""
+        return self._risks.get(gene)
+
+    def lookup(self, gene: str, variant: Optional[str]) -> Optional[GeneticRisk]:
+        """The precompiled risk of gene+variant, or None if it carries none"""
+        if self.is_risk_variant(gene, variant):
+            return self._risks[gene]
+        return None
+
+    def match(self, genetic_data: Mapping[str, dict]) -> List[GeneticRisk]:
+        """Risks of every known marker gene reported with a risk variant, in input order"""
+        risks = []
+        for gene in genetic_data:
+            if gene in self.genes:
+                risk = self.lookup(gene, (genetic_data[gene] or {}).get("variant"))
+                if risk is not None:
+                    risks.append(risk)
+        return risks
@@ -0,0 +1,489 @@
+"""Cold tier of health_data: old samples in compressed Parquet files.
+
+    python -m app.services.health_archive export [--user ID] [--dry-run]
+    python -m app.services.health_archive restore --user ID --month 2023-04
+"""
+import argparse
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+import numpy as np
+from sqlalchemy import and_, delete, func, select, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from ..database import engine
+from ..models.archives import HealthDataArchive, HealthDataArchiveDeletion
+from ..models.health_data import HealthData
+from ..models.user import User
+from ..utils import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+HEALTH_ARCHIVE_DIR = os.getenv("HEALTH_ARCHIVE_DIR", "./health_archive")
+# Whole months older than this are moved to the cold tier
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+ARCHIVE_COMPRESSION = "zstd"
+
+# health_data columns kept in the archive files, in file order; user_id is the partition
+ARCHIVE_COLUMNS = [
+    "id", "data_type", "value", "timestamp", "metadata", "source", "source_version",
+    "device_id", "is_validated", "quality_score", "confidence_interval", "context_tags", "notes"
+]
+
+# Columns identifying a sample (uq_health_data_sample without the user)
+SAMPLE_KEY = ("data_type", "timestamp", "device_id")
+
+# Sample keys per DELETE statement, below SQLite's bound parameter limit
+DELETE_CHUNK_SIZE = 900
+
+
+class HealthArchive:
+    """Moves old health_data samples into per-user, per-month Parquet files and reads them back.
+
+    Layout under ``root``::
+
+        <user_id>/<YYYY-MM>.<version>.parquet
+
+    A file holds one user-month sorted by (data_type, timestamp), with
+    one row group per data type, zstd-compressed. Reads pick the row
+    group of the metric from the footer statistics, so only that column
+    data is decompressed, and open files memory-mapped, so the page cache
+    is shared by every worker reading the same month. The
+    health_data_archives table is the catalog: a month is served from
+    its file exactly when it has a row there, and its samples are
+    removed from health_data in the same transaction.
+
+    Files are immutable until the month is archived again. A sample
+    deleted meanwhile is recorded in health_data_archive_deletions, and a
+    sample stored again lands in health_data; reads skip the archived
+    copy of either, so the hot copy wins and deletions stick.
+
+    Rollups are not archived, so charts at minute resolution and above
+    never touch the cold tier. pyarrow is imported on the first archive
+    read, so workers that only serve recent data never load it.
+    """
+
+    def __init__(self, root: str = HEALTH_ARCHIVE_DIR):
+        self.root = root
+        self.raw = HealthData.__table__
+        self.catalog = HealthDataArchive.__table__
+        self.deletions = HealthDataArchiveDeletion.__table__
+
+    def paths(self, connection: Connection, user_id: int, start: datetime, end: datetime) -> List[str]:
+        """Archive files of a user's months overlapping [start, end), oldest first"""
+        return [path for _, path in self._months(connection, user_id, start, end)]
+
+    def read(
+        self,
+        connection: Connection,
+        user_id: int,
+        data_type: str,
+        start: datetime,
+        end: datetime,
+        names: Sequence[str] = ARCHIVE_COLUMNS
+    ):
+        """Archived samples of one metric over [start, end) as a pyarrow Table, oldest first.
+
+        None when no archived month overlaps the range.
+        """
+        for attempt in range(2):
+            months = self._months(connection, user_id, start, end)
+            if not months:
+                return None
+            pa, _ = _arrow()
+            masked = self._masked(
+                connection, user_id, data_type, max(start, months[0][0]), min(end, _next_month(months[-1][0]))
+            )
+            read = list(dict.fromkeys([*names, "timestamp", "device_id"])) if masked else names
+            try:
+                tables = [self._read_file(path, data_type, start, end, read) for _, path in months]
+            except FileNotFoundError:
+                # Re-archived since the catalog was read: the new version replaced it
+                if attempt:
+                    raise
+                continue
+            table = pa.concat_tables(tables)
+            if masked:
+                table = _without(pa, table, ["timestamp", "device_id"], masked).select(list(names))
+            return table
+
+    def rows(
+        self,
+        connection: Connection,
+        user_id: int,
+        data_type: str,
+        start: datetime,
+        end: datetime,
+        limit: int,
+        names: Sequence[str]
+    ) -> List[tuple]:
+        """read() as result tuples of the ``names`` columns, like a health_data query returns"""
+        table = self.read(connection, user_id, data_type, start, end, names)
+        if table is None:
+            return []
+        columns = [_pylist(table.column(name).slice(0, limit), name) for name in names]
+        return list(zip(*columns))
+
+    def columns(
+        self,
+        connection: Connection,
+        user_id: int,
+        data_type: str,
+        start: datetime,
+        end: datetime
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Epoch seconds and values of archived samples over [start, end), or None"""
+        table = self.read(connection, user_id, data_type, start, end, ["timestamp", "value"])
+        if table is None:
+            return None
+        timestamps = table.column("timestamp").to_numpy().astype("datetime64[s]").astype(np.int64)
+        return timestamps, table.column("value").to_numpy().astype(np.float64)
+
+    def archive_user(
+        self,
+        connection: Connection,
+        user_id: int,
+        before: Optional[datetime] = None,
+        dry_run: bool = False
+    ) -> Dict:
+        """Move every whole month of a user's samples before ``before`` to the cold tier.
+
+        ``before`` defaults to ARCHIVE_AFTER_DAYS ago and is rounded down to
+        a month. A month archived before takes in samples that arrived
+        late: its file is rewritten with them, a sample stored again
+        replacing its archived copy, and without the samples deleted
+        since. Each month is one transaction.
+        """
+        cutoff = _month(before or datetime.utcnow() - timedelta(days=ARCHIVE_AFTER_DAYS))
+        raw = self.raw
+        months = rows = size = 0
+        cursor = None
+        while True:
+            condition = and_(raw.c.user_id == user_id, raw.c.timestamp < cutoff)
+            if cursor is not None:
+                condition = and_(condition, raw.c.timestamp >= cursor)
+            first = connection.execute(select(func.min(raw.c.timestamp)).where(condition)).scalar()
+            if first is None:
+                break
+            month = _month(first)
+            cursor = _next_month(month)
+            archived, written = self._archive_month(connection, user_id, month, dry_run)
+            months, rows, size = months + 1, rows + archived, size + written
+        return {"months": months, "rows": rows, "bytes": size}
+
+    def restore(self, connection: Connection, user_id: int, month: datetime) -> int:
+        """Move an archived month back into health_data; returns the samples restored"""
+        catalog = self.catalog
+        month = _month(month)
+        path = connection.execute(
+            select(catalog.c.path).where(and_(catalog.c.user_id == user_id, catalog.c.month == month))
+        ).scalar()
+        if path is None:
+            return 0
+        pa, pq = _arrow()
+        table = pq.read_table(os.path.join(self.root, path), memory_map=True)
+        deleted = self._deleted(connection, user_id, month)
+        if deleted:
+            table = _without(pa, table, SAMPLE_KEY, deleted)
+        # New ids: health_data may have reused archived ones meanwhile
+        names = [name for name in ARCHIVE_COLUMNS if name != "id"]
+        columns = [_pylist(table.column(name), name) for name in names]
+        samples = [dict(zip(names, values), user_id=user_id) for values in zip(*columns)]
+
+        dialect = postgresql if connection.dialect.name == "postgresql" else sqlite
+        with connection.begin():
+            if samples:
+                # A sample stored again meanwhile keeps its health_data copy
+                connection.execute(dialect.insert(self.raw).on_conflict_do_nothing(), samples)
+            connection.execute(self._month_deletions(user_id, month))
+            connection.execute(delete(catalog).where(and_(catalog.c.user_id == user_id, catalog.c.month == month)))
+        _remove(os.path.join(self.root, path))
+        logger.info("Restored %d samples of user %s for %s", len(samples), user_id, f"{month:%Y-%m}")
+        return len(samples)
+
+    def _archive_month(self, connection: Connection, user_id: int, month: datetime, dry_run: bool) -> Tuple[int, int]:
+        pa, pq = _arrow()
+        raw, catalog = self.raw, self.catalog
+        following = _next_month(month)
+        with connection.begin() as transaction:
+            # Locked until the catalog commits: a sync deleting one of these
+            # samples meanwhile waits, then finds the month archived and
+            # records the deletion (see record_deletions)
+            hot = connection.execute(
+                select(*(raw.c[name] for name in ARCHIVE_COLUMNS))
+                .where(and_(raw.c.user_id == user_id, raw.c.timestamp >= month, raw.c.timestamp < following))
+                .with_for_update()
+            ).all()
+            previous = connection.execute(
+                select(catalog.c.path).where(and_(catalog.c.user_id == user_id, catalog.c.month == month))
+            ).scalar()
+
+            table = _to_table(pa, hot)
+            if previous is not None:
+                archived = pq.read_table(os.path.join(self.root, previous), memory_map=True)
+                # Samples stored again replace their archived copies; deleted ones are dropped
+                masked = self._deleted(connection, user_id, month) | {
+                    (row.data_type, row.timestamp, row.device_id) for row in hot
+                }
+                table = pa.concat_tables([_without(pa, archived, SAMPLE_KEY, masked), table])
+            table = table.take(pa.compute.sort_indices(
+                table, sort_keys=[("data_type", "ascending"), ("timestamp", "ascending")]
+            ))
+
+            if dry_run:
+                sink = pa.BufferOutputStream()
+                _write(pa, pq, table, sink)
+                transaction.rollback()
+                return len(hot), sink.getvalue().size
+
+            path = os.path.join(str(user_id), f"{month:%Y-%m}.{datetime.utcnow():%Y%m%dT%H%M%S%f}.parquet")
+            target = os.path.join(self.root, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            staging = f"{target}.tmp"
+            try:
+                _write(pa, pq, table, staging)
+                os.replace(staging, target)
+                size = os.path.getsize(target)
+
+                dialect = postgresql if connection.dialect.name == "postgresql" else sqlite
+                statement = dialect.insert(catalog)
+                connection.execute(statement.on_conflict_do_update(
+                    index_elements=["user_id", "month"],
+                    set_={field: statement.excluded[field] for field in ("path", "rows", "bytes", "archived_at")}
+                ), {
+                    "user_id": user_id, "month": month, "path": path, "rows": table.num_rows,
+                    "bytes": size, "archived_at": datetime.utcnow()
+                })
+                connection.execute(self._month_deletions(user_id, month))
+                ids = [row.id for row in hot]
+                for offset in range(0, len(ids), DELETE_CHUNK_SIZE):
+                    # Bounded by the month, so Postgres only scans its partition
+                    connection.execute(delete(raw).where(and_(
+                        raw.c.user_id == user_id,
+                        raw.c.timestamp >= month,
+                        raw.c.timestamp < following,
+                        raw.c.id.in_(ids[offset:offset + DELETE_CHUNK_SIZE])
+                    )))
+                transaction.commit()
+            except BaseException:
+                _remove(staging)
+                _remove(target)
+                raise
+
+        if previous is not None:
+            _remove(os.path.join(self.root, previous))
+        logger.info(
+            "Archived %d samples of user %s for %s: %d bytes, %d samples in the month",
+            len(hot), user_id, f"{month:%Y-%m}", size, table.num_rows
+        )
+        return len(hot), size
+
+    def record_deletions(
+        self,
+        connection: Connection,
+        user_id: int,
+        data_type: str,
+        device_id: str,
+        timestamps: List[datetime]
+    ) -> int:
+        """Record deleted samples of a metric that fall in archived months; returns how many were new"""
+        end = max(timestamps) + timedelta(seconds=1)
+        months = {month for month, _ in self._months(connection, user_id, min(timestamps), end)}
+        now = datetime.utcnow()
+        rows = [
+            {
+                "user_id": user_id, "data_type": data_type, "timestamp": timestamp,
+                "device_id": device_id, "deleted_at": now
+            }
+            for timestamp in timestamps if _month(timestamp) in months
+        ]
+        if not rows:
+            return 0
+        dialect = postgresql if connection.dialect.name == "postgresql" else sqlite
+        return connection.execute(dialect.insert(self.deletions).on_conflict_do_nothing(), rows).rowcount
+
+    def _months(
+        self,
+        connection: Connection,
+        user_id: int,
+        start: datetime,
+        end: datetime
+    ) -> List[Tuple[datetime, str]]:
+        """Archived months overlapping [start, end) and their files, oldest first"""
+        catalog = self.catalog
+        return [tuple(row) for row in connection.execute(
+            select(catalog.c.month, catalog.c.path)
+            .where(and_(
+                catalog.c.user_id == user_id,
+                catalog.c.month >= _month(start),
+                catalog.c.month < end
+            ))
+            .order_by(catalog.c.month)
+        )]
+
+    def _masked(
+        self,
+        connection: Connection,
+        user_id: int,
+        data_type: str,
+        start: datetime,
+        end: datetime
+    ) -> Set[Tuple[datetime, Optional[str]]]:
+        """(timestamp, device_id) of a metric's samples over [start, end) whose archived copy is stale"""
+        raw, deletions = self.raw, self.deletions
+        return {tuple(row) for row in connection.execute(union_all(
+            select(raw.c.timestamp, raw.c.device_id).where(and_(
+                raw.c.user_id == user_id, raw.c.data_type == data_type,
+                raw.c.timestamp >= start, raw.c.timestamp < end
+            )),
+            select(deletions.c.timestamp, deletions.c.device_id).where(and_(
+                deletions.c.user_id == user_id, deletions.c.data_type == data_type,
+                deletions.c.timestamp >= start, deletions.c.timestamp < end
+            ))
+        ))}
+
+    def _deleted(self, connection: Connection, user_id: int, month: datetime) -> Set[Tuple[str, datetime, str]]:
+        """SAMPLE_KEY of the samples of an archived month deleted since"""
+        deletions = self.deletions
+        return {tuple(row) for row in connection.execute(
+            select(*(deletions.c[name] for name in SAMPLE_KEY)).where(and_(
+                deletions.c.user_id == user_id,
+                deletions.c.timestamp >= month,
+                deletions.c.timestamp < _next_month(month)
+            ))
+        )}
+
+    def _month_deletions(self, user_id: int, month: datetime):
+        deletions = self.deletions
+        return delete(deletions).where(and_(
+            deletions.c.user_id == user_id,
+            deletions.c.timestamp >= month,
+            deletions.c.timestamp < _next_month(month)
+        ))
+
+    def _read_file(self, path: str, data_type: str, start: datetime, end: datetime, names: Sequence[str]):
+        _, pq = _arrow()
+        parquet = pq.ParquetFile(os.path.join(self.root, path), memory_map=True)
+        metadata = parquet.metadata
+        type_column = ARCHIVE_COLUMNS.index("data_type")
+        # One row group per data type (see _write), recognized by its statistics
+        groups = [
+            index for index in range(metadata.num_row_groups)
+            if metadata.row_group(index).column(type_column).statistics.min == data_type
+        ]
+        read = list(names) if "timestamp" in names else [*names, "timestamp"]
+        table = parquet.read_row_groups(groups, columns=read)
+        timestamps = table.column("timestamp").to_numpy()
+        first, last = np.searchsorted(timestamps, [np.datetime64(start), np.datetime64(end)])
+        return table.slice(first, last - first).select(list(names))
+
+
+def _arrow():
+    # Imported on first use: see HealthArchive
+    import pyarrow
+    import pyarrow.compute  # noqa: F401
+    import pyarrow.parquet
+    return pyarrow, pyarrow.parquet
+
+
+def _schema(pa):
+    return pa.schema([
+        ("id", pa.int64()),
+        ("data_type", pa.string()),
+        ("value", pa.float64()),
+        ("timestamp", pa.timestamp("us")),
+        ("metadata", pa.string()),  # JSON text
+        ("source", pa.string()),
+        ("source_version", pa.string()),
+        ("device_id", pa.string()),
+        ("is_validated", pa.bool_()),
+        ("quality_score", pa.float64()),
+        ("confidence_interval", pa.list_(pa.float64())),
+        ("context_tags", pa.list_(pa.string())),
+        ("notes", pa.string())
+    ])
+
+
+def _to_table(pa, rows: Sequence[tuple]):
+    schema = _schema(pa)
+    columns = list(zip(*rows)) if rows else [()] * len(ARCHIVE_COLUMNS)
+    metadata = ARCHIVE_COLUMNS.index("metadata")
+    columns[metadata] = [None if value is None else dumps(value).decode() for value in columns[metadata]]
+    return pa.Table.from_arrays(
+        [pa.array(list(values), type=field.type) for values, field in zip(columns, schema)],
+        schema=schema
+    )
+
+
+def _write(pa, pq, table, sink):
+    """One row group per data type; ``table`` is sorted by data type"""
+    with pq.ParquetWriter(sink, table.schema, compression=ARCHIVE_COMPRESSION) as writer:
+        types = table.column("data_type").combine_chunks().to_numpy(zero_copy_only=False)
+        starts = np.flatnonzero(np.r_[True, types[1:] != types[:-1]]) if len(types) else []
+        for first, last in zip(starts, [*starts[1:], len(types)]):
+            writer.write_table(table.slice(first, last - first))
+
+
+def _without(pa, table, names: Sequence[str], keys: Set[tuple]):
+    """Rows of ``table`` whose values of the ``names`` columns are not in ``keys``"""
+    values = zip(*(table.column(name).to_pylist() for name in names))
+    return table.filter(pa.array([key not in keys for key in values], type=pa.bool_()))
+
+
+def _pylist(column, name: str) -> list:
+    values = column.to_pylist()
+    if name == "metadata":
+        return [None if value is None else loads(value) for value in values]
+    return values
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _month(timestamp: datetime) -> datetime:
+    return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(month: datetime) -> datetime:
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["export", "restore"])
+    parser.add_argument("--user", type=int, help="one user; export defaults to all")
+    parser.add_argument("--month", help="YYYY-MM, for restore")
+    parser.add_argument("--before", help="YYYY-MM; export months before it (default: ARCHIVE_AFTER_DAYS ago)")
+    parser.add_argument("--dry-run", action="store_true", help="report what export would write")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    archive = HealthArchive()
+    with engine.connect() as connection:
+        if args.command == "restore":
+            if args.user is None or args.month is None:
+                parser.error("restore needs --user and --month")
+            print(archive.restore(connection, args.user, datetime.strptime(args.month, "%Y-%m")))
+            return
+
+        before = datetime.strptime(args.before, "%Y-%m") if args.before else None
+        users = [args.user] if args.user is not None else connection.execute(
+            select(User.__table__.c.id).order_by(User.__table__.c.id)
+        ).scalars().all()
+        totals = {"users": 0, "months": 0, "rows": 0, "bytes": 0}
+        for user_id in users:
+            result = archive.archive_user(connection, user_id, before, args.dry_run)
+            totals["users"] += 1 if result["months"] else 0
+            for key in ("months", "rows", "bytes"):
+                totals[key] += result[key]
+        print(json.dumps(totals))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import heapq
+from datetime import datetime
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Sequence
+import numpy as np
+from sqlalchemy import and_, select
+from sqlalchemy.engine import Connection
+from ..models.health_data import HealthData, metric_validator
+from ..models.metric_validation import OTHER_METRIC_TYPE
+from ..utils import dumps
+from .health_archive import HealthArchive
+
+# Columns read for sample responses, in result-tuple order
+SAMPLE_COLUMNS = [
+    "id", "data_type", "value", "timestamp", "metadata", "is_validated",
+    "quality_score", "confidence_interval", "context_tags", "notes"
+]
+
+DEFAULT_SAMPLE_LIMIT = 10000
+
+
+class HealthDataSerializer:
+    """Bulk JSON encoding of health samples straight from query result tuples.
+
+    Rows are never hydrated into HealthData instances: the row format has
+    the same shape as HealthData.to_dict, built from plain tuples with the
+    metric type looked up in a precomputed dict, and encoded to bytes in
+    one orjson call so FastAPI neither re-validates nor re-encodes it.
+    The columnar format sends parallel arrays instead, for charts.
+    """
+
+    def __init__(self, archive: Optional[HealthArchive] = None):
+        self.table = HealthData.__table__
+        self.archive = archive or HealthArchive()
+        self.columns = [self.table.c[name] for name in SAMPLE_COLUMNS]
+        self.metric_types: Dict[str, str] = {
+            data_type: metric_validator.metric_type(data_type) for data_type in metric_validator.type_ids
+        }
+
+    def read_samples(
+        self,
+        connection: Connection,
+        user_id: int,
+        data_type: str,
+        start: datetime,
+        end: datetime,
+        limit: int = DEFAULT_SAMPLE_LIMIT,
+        columns: Optional[Sequence] = None
+    ) -> List[tuple]:
+        """Result tuples of one metric over [start, end), oldest first, from both tiers.
+
+        Archived samples (see HealthArchive) are merged in by timestamp, so
+        the cold tier is transparent to callers. The archive skips its copy
+        of a sample stored again in health_data or deleted since, so each
+        sample comes back once.
+        """
+        table = self.table
+        columns = columns or self.columns
+        rows = connection.execute(
+            select(*columns)
+            .where(and_(
+                table.c.user_id == user_id,
+                table.c.data_type == data_type,
+                table.c.timestamp >= start,
+                table.c.timestamp < end
+            ))
+            .order_by(table.c.timestamp)
+            .limit(limit)
+        ).all()
+        names = [column.name for column in columns]
+        archived = self.archive.rows(connection, user_id, data_type, start, end, limit, names)
+        if not archived:
+            return rows
+        position = names.index("timestamp")
+        return list(islice(heapq.merge(archived, rows, key=lambda row: row[position]), limit))
+
+    def samples_json(self, rows: Iterable[tuple]) -> bytes:
+        """Rows of SAMPLE_COLUMNS as a JSON list shaped like HealthData.to_dict"""
+        metric_types = self.metric_types
+        return dumps([
+            {
+                "id": sample_id,
+                "type": data_type,
+                "value": value,
+                "timestamp": timestamp,
+                "metric_type": metric_types.get(data_type, OTHER_METRIC_TYPE),
+                "metadata": metadata,
+                "quality": {
+                    "score": quality_score,
+                    "validated": is_validated,
+                    "confidence_interval": confidence_interval
+                },
+                "context": {
+                    "tags": context_tags,
+                    "notes": notes
+                }
+            }
+            for (
+                sample_id, data_type, value, timestamp, metadata, is_validated,
+                quality_score, confidence_interval, context_tags, notes
+            ) in rows
+        ])
+
+    def samples_columnar_json(self, data_type: str, unit: Optional[str], rows: Sequence[tuple]) -> bytes:
+        """(timestamp, value) rows as parallel arrays; timestamps in epoch milliseconds"""
+        if rows:
+            timestamps, values = zip(*rows)
+        else:
+            timestamps, values = (), ()
+        return dumps({
+            "type": data_type,
+            "unit": unit,
+            "timestamps": np.array(timestamps, dtype="datetime64[ms]").astype(np.int64),
+            "values": np.array(values, dtype=np.float64)
+        })
+
+    def series_json(self, series: Dict, buckets: Optional[Dict[str, np.ndarray]], columnar: bool) -> bytes:
+        """A HealthSeries response from downsample_columns buckets.
+
+        ``series`` carries the type, unit, start, end and resolution fields.
+        """
+        if buckets is None:
+            empty = np.empty(0)
+            buckets = {"bucket": empty.astype(np.int64), "sum": empty, "min": empty, "max": empty,
+                       "count": empty.astype(np.int64)}
+
+        values = buckets["sum"] / buckets["count"]
+        if columnar:
+            return dumps(dict(
+                series,
+                timestamps=buckets["bucket"] * 1000,
+                values=values,
+                min=buckets["min"],
+                max=buckets["max"],
+                count=buckets["count"].astype(np.int64)
+            ))
+
+        return dumps(dict(series, points=[
+            {"timestamp": timestamp, "value": value, "min": lo, "max": hi, "count": count}
+            for timestamp, value, lo, hi, count in zip(
+                buckets["bucket"].astype("datetime64[s]").tolist(), values.tolist(),
+                buckets["min"].tolist(), buckets["max"].tolist(), buckets["count"].astype(np.int64).tolist()
+            )
+        ]))
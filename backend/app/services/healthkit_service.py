@@ -1,54 +1,215 @@
+import asyncio
 import logging
-from typing import List, Dict
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import List, Dict, NamedTuple, Optional
 import healthkit
+from ..metrics import HEALTHKIT_FETCH_FAILURES, HEALTHKIT_FETCH_LATENCY
 from ..models.health_data import HealthData
 
 logger = logging.getLogger(__name__)
 
+# Fan-out limits for HealthKit queries
+DEFAULT_GLOBAL_CONCURRENCY = 64
+DEFAULT_USER_CONCURRENCY = 8
+DEFAULT_METRIC_TIMEOUT = 10.0
+
+# Clients without anchored queries re-read this far behind the high-water
+# mark, so samples written late by the device are still picked up
+BACKFILL_LOOKBACK = timedelta(days=2)
+
+
+class SyncAnchor(NamedTuple):
+    """Stored position of one metric's previous sync"""
+    anchor: Optional[str]
+    high_water_mark: Optional[datetime]
+
+
+class MetricChanges(NamedTuple):
+    """Samples added and deleted since a metric's anchor, and the new anchor"""
+    samples: List[Dict]
+    deleted: List[Dict]
+    anchor: Optional[str]
+
 
 class HealthKitService:
-    def __init__(self):
+    def __init__(
+        self,
+        global_concurrency: int = DEFAULT_GLOBAL_CONCURRENCY,
+        user_concurrency: int = DEFAULT_USER_CONCURRENCY,
+        metric_timeout: float = DEFAULT_METRIC_TIMEOUT
+    ):
         self.healthkit = healthkit.HealthKit()
         self.supported_types = HealthData.Config.supported_types
-        
+        self.global_concurrency = global_concurrency
+        self.user_concurrency = user_concurrency
+        self.metric_timeout = metric_timeout
+        self._global_semaphore: Optional[asyncio.Semaphore] = None
+        self._user_semaphores: Dict[int, List] = {}
+
     async def sync_health_data(self, user_id: int) -> List[Dict]:
-        """Sync comprehensive health data from HealthKit"""
+        """Every sample of every metric, ignoring anchors.
+
+        Incremental syncs go through HealthKitSyncService
+        (POST /health-data/healthkit/sync/{user_id}).
+        """
         synced_data = []
-        
-        # Core metrics
-        basic_metrics = await self._fetch_basic_metrics(user_id)
-        synced_data.extend(basic_metrics)
-        
-        # Advanced metrics
-        advanced_metrics = await self._fetch_advanced_metrics(user_id)
-        synced_data.extend(advanced_metrics)
-        
-        # Environmental data
-        environmental_data = await self._fetch_environmental_data(user_id)
-        synced_data.extend(environmental_data)
-        
+        for changes in (await self.fetch_changes(user_id)).values():
+            synced_data.extend(changes.samples)
         return synced_data
 
-    async def _fetch_basic_metrics(self, user_id: int) -> List[Dict]:
+    async def fetch_changes(
+        self,
+        user_id: int,
+        anchors: Optional[Dict[str, SyncAnchor]] = None
+    ) -> Dict[str, MetricChanges]:
+        """Changes per metric since its anchor; the full history where there is none.
+
+        Clients exposing ``anchored_query(metric, user_id=, anchor=)`` are
+        read like HealthKit's anchored object queries: it returns
+        ``{"samples", "deleted", "anchor"}``, ordered by when samples were
+        written, so backfilled samples come through however old their
+        timestamps. Deleted entries carry the sample key (``timestamp``,
+        optionally ``device_id``). Other clients are asked for samples
+        since the high-water mark minus BACKFILL_LOOKBACK and report no
+        deletions. Metrics that failed are missing from the result, so
+        their anchors are not advanced.
+        """
+        anchors = anchors or {}
+        # Core, advanced and environmental groups are fetched concurrently
+        groups = await asyncio.gather(
+            self._fetch_basic_metrics(user_id, anchors),
+            self._fetch_advanced_metrics(user_id, anchors),
+            self._fetch_environmental_data(user_id, anchors)
+        )
+
+        changes = {}
+        for group in groups:
+            changes.update(group)
+        return changes
+
+    async def _fetch_basic_metrics(self, user_id: int, anchors: Dict[str, SyncAnchor]) -> Dict[str, MetricChanges]:
         """Fetch vital signs and basic health metrics"""
         metrics = [
             "heart_rate", "blood_pressure", "respiratory_rate",
             "blood_oxygen", "body_temperature", "blood_glucose"
         ]
-        return await self._batch_fetch_data(metrics, user_id)
+        return await self._batch_fetch_data(metrics, user_id, anchors)
 
-    async def _fetch_advanced_metrics(self, user_id: int) -> List[Dict]:
+    async def _fetch_advanced_metrics(self, user_id: int, anchors: Dict[str, SyncAnchor]) -> Dict[str, MetricChanges]:
         """Fetch advanced health metrics"""
         metrics = [
             "heart_rate_variability", "vo2_max", "electrocardiogram",
             "galvanic_skin_response", "blood_alcohol_content"
         ]
-        return await self._batch_fetch_data(metrics, user_id)
+        return await self._batch_fetch_data(metrics, user_id, anchors)
 
-    async def _fetch_environmental_data(self, user_id: int) -> List[Dict]:
+    async def _fetch_environmental_data(self, user_id: int, anchors: Dict[str, SyncAnchor]) -> Dict[str, MetricChanges]:
         """Fetch environmental context data"""
         metrics = [
             "ambient_temperature", "humidity", "air_quality",
             "noise_level", "uv_exposure", "atmospheric_pressure"
         ]
-        return await self._batch_fetch_data(metrics, user_id)
\ No newline at end of file
+        return await self._batch_fetch_data(metrics, user_id, anchors)
+
+    async def _batch_fetch_data(
+        self,
+        metrics: List[str],
+        user_id: int,
+        anchors: Dict[str, SyncAnchor]
+    ) -> Dict[str, MetricChanges]:
+        """Fetch several metrics concurrently, keeping whatever completes in time.
+
+        A metric that fails or exceeds ``metric_timeout`` is logged and left
+        out of the result instead of failing the whole batch.
+        """
+        results = await asyncio.gather(
+            *(self._fetch_metric(metric, user_id, anchors.get(metric)) for metric in metrics),
+            return_exceptions=True
+        )
+
+        changes = {}
+        for metric, result in zip(metrics, results):
+            if isinstance(result, asyncio.TimeoutError):
+                HEALTHKIT_FETCH_FAILURES.labels(metric, "timeout").inc()
+                logger.warning(
+                    "HealthKit fetch for %s timed out after %.1fs (user %s)",
+                    metric, self.metric_timeout, user_id
+                )
+            elif isinstance(result, BaseException):
+                HEALTHKIT_FETCH_FAILURES.labels(metric, "error").inc()
+                logger.warning(
+                    "HealthKit fetch for %s failed (user %s): %s",
+                    metric, user_id, result
+                )
+            else:
+                changes[metric] = result
+
+        return changes
+
+    async def _fetch_metric(self, metric: str, user_id: int, anchor: Optional[SyncAnchor] = None) -> MetricChanges:
+        """Fetch the changes of a single metric within the concurrency limits"""
+        async with self._user_slot(user_id), self._global_slot():
+            # Timed once a slot is held, so queueing behind the limits is excluded
+            started = time.perf_counter()
+            try:
+                return await asyncio.wait_for(
+                    self._query(metric, user_id, anchor), timeout=self.metric_timeout
+                )
+            finally:
+                HEALTHKIT_FETCH_LATENCY.labels(metric).observe(time.perf_counter() - started)
+
+    async def _query(self, metric: str, user_id: int, anchor: Optional[SyncAnchor] = None) -> MetricChanges:
+        anchored_query = getattr(self.healthkit, "anchored_query", None)
+        if anchored_query is not None:
+            result = await _call(
+                anchored_query, metric, user_id=user_id, anchor=anchor.anchor if anchor else None
+            )
+            samples = result.get("samples")
+            deleted = result.get("deleted") or []
+            new_anchor = result.get("anchor")
+        else:
+            if anchor is not None and anchor.high_water_mark is not None:
+                samples = await _call(
+                    self.healthkit.query, metric, user_id=user_id,
+                    start_date=anchor.high_water_mark - BACKFILL_LOOKBACK
+                )
+            else:
+                samples = await _call(self.healthkit.query, metric, user_id=user_id)
+            deleted, new_anchor = [], None
+
+        return MetricChanges(
+            samples=[{"type": metric, **sample} for sample in samples or []],
+            deleted=deleted,
+            anchor=new_anchor
+        )
+
+    def _global_slot(self) -> asyncio.Semaphore:
+        # Created lazily so the semaphore binds to the running loop
+        if self._global_semaphore is None:
+            self._global_semaphore = asyncio.Semaphore(self.global_concurrency)
+        return self._global_semaphore
+
+    @asynccontextmanager
+    async def _user_slot(self, user_id: int):
+        # [semaphore, holders]; dropped once the user has no fetch in flight
+        entry = self._user_semaphores.get(user_id)
+        if entry is None:
+            entry = [asyncio.Semaphore(self.user_concurrency), 0]
+            self._user_semaphores[user_id] = entry
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._user_semaphores[user_id]
+
+
+async def _call(function, *args, **kwargs):
+    if asyncio.iscoroutinefunction(function):
+        return await function(*args, **kwargs)
+    # Blocking client calls must not stall the event loop
+    return await asyncio.to_thread(function, *args, **kwargs)
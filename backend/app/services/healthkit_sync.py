@@ -0,0 +1,241 @@
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from pydantic import ValidationError
+from pydantic.datetime_parse import parse_datetime
+from sqlalchemy import and_, delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from ..models.anomalies import HealthDataAnomaly
+from ..models.health_data import HealthData
+from ..models.sync_anchors import HealthKitSyncAnchor
+from ..schemas.health_data import HealthSample, HealthSyncPayload
+from ..utils import naive_utc
+from .environment_index import EnvironmentIndex
+from .executors import BoundedExecutor, compute_executor
+from .healthkit_service import HealthKitService, MetricChanges, SyncAnchor
+from .ingestion_service import IngestionService
+
+logger = logging.getLogger(__name__)
+
+# Sample keys per DELETE statement
+DELETE_CHUNK_SIZE = 500
+
+
+class HealthKitSyncService:
+    """Incremental HealthKit sync of one device, resumed from stored anchors.
+
+    Each sync fetches only what changed since the previous one per metric,
+    ingests added samples, removes deleted ones (with their anomalies and
+    rollup buckets) and then advances the anchors, all in one transaction:
+    a sync that fails midway leaves the anchors where they were and is
+    simply repeated by the next one.
+    """
+
+    def __init__(
+        self,
+        healthkit: Optional[HealthKitService] = None,
+        ingestion: Optional[IngestionService] = None,
+        executor: BoundedExecutor = compute_executor,
+        environment: Optional[EnvironmentIndex] = None
+    ):
+        self.healthkit = healthkit or HealthKitService()
+        self.ingestion = ingestion or IngestionService()
+        self.executor = executor
+        self.environment = environment or EnvironmentIndex()
+        self.raw = HealthData.__table__
+        self.anomalies = HealthDataAnomaly.__table__
+        self.anchors = HealthKitSyncAnchor.__table__
+
+    async def sync(self, db: Session, user_id: int, device_id: str, full: bool = False) -> Dict:
+        """Fetch and apply one device's changes; ``full`` ignores the stored anchors.
+
+        Raises ExecutorSaturated when the compute pool cannot take more work.
+        """
+        anchors = {} if full else await self.executor.run(self.load_anchors, db, user_id, device_id)
+        changes = await self.healthkit.fetch_changes(user_id, anchors)
+        return await self.executor.run(self.apply, db, user_id, device_id, changes, anchors)
+
+    def load_anchors(self, db: Session, user_id: int, device_id: str) -> Dict[str, SyncAnchor]:
+        table = self.anchors
+        rows = db.connection().execute(
+            select(table.c.data_type, table.c.anchor, table.c.high_water_mark)
+            .where(and_(table.c.user_id == user_id, table.c.device_id == device_id))
+        )
+        return {
+            data_type: SyncAnchor(anchor, high_water_mark)
+            for data_type, anchor, high_water_mark in rows
+        }
+
+    def apply(
+        self,
+        db: Session,
+        user_id: int,
+        device_id: str,
+        changes: Dict[str, MetricChanges],
+        anchors: Dict[str, SyncAnchor]
+    ) -> Dict:
+        """Write changes fetched from ``anchors``, then advance the anchors of the metrics fetched.
+
+        Samples read through an anchor yet older than the metric's
+        high-water mark were written late by the device and are counted as
+        backfilled; they are stored like any other but not scored by the
+        anomaly detector, whose streams only move forward. Malformed
+        samples are rejected one by one, like out-of-range ones, instead
+        of failing the sync.
+        """
+        samples, invalid = _parse_samples(
+            sample for metric in changes.values() for sample in metric.samples
+        )
+        payload = HealthSyncPayload(
+            user_id=user_id, device_id=device_id, samples=[sample for _, sample in samples]
+        )
+        batch = self.ingestion.write(db, payload) if samples else None
+
+        # Newest timestamp per metric, and how many anchored reads arrived behind the previous one
+        marks = {
+            data_type: anchor.high_water_mark for data_type, anchor in anchors.items()
+            if anchor.anchor is not None and anchor.high_water_mark is not None
+            and data_type in changes and changes[data_type].anchor is not None
+        }
+        newest: Dict[str, datetime] = {}
+        backfilled = 0
+        for sample in payload.samples:
+            timestamp = naive_utc(sample.timestamp)
+            if sample.type in marks and timestamp <= marks[sample.type]:
+                backfilled += 1
+            if sample.type not in newest or timestamp > newest[sample.type]:
+                newest[sample.type] = timestamp
+
+        connection = db.connection()
+        deleted, removed = self._delete_samples(connection, user_id, device_id, changes)
+
+        now = datetime.utcnow()
+        rows = []
+        for data_type, metric in changes.items():
+            previous = anchors.get(data_type, SyncAnchor(None, None))
+            high_water_mark = max(
+                (mark for mark in (previous.high_water_mark, newest.get(data_type)) if mark is not None),
+                default=None
+            )
+            rows.append({
+                "user_id": user_id,
+                "device_id": device_id,
+                "data_type": data_type,
+                "anchor": metric.anchor,
+                "high_water_mark": high_water_mark,
+                "synced_at": now
+            })
+        self._save_anchors(connection, rows)
+        # Samples, deletions and anchors commit together: a sync either
+        # happened as a whole or is repeated from the same anchors
+        db.commit()
+        written = batch.rows if batch is not None and batch.inserted else []
+        self.environment.refresh_samples(db.get_bind(), user_id, written + removed)
+        if batch is not None:
+            result = self.ingestion.published(batch)
+            # Indexes into every fetched sample, not just the well-formed ones
+            positions = [index for index, _ in samples]
+            rejected = [dict(reject, index=positions[reject["index"]]) for reject in result["rejected"]]
+        else:
+            result = {"received": 0, "inserted": 0, "duplicates": 0, "anomalies": 0}
+            rejected = []
+        result = dict(
+            result, received=len(samples) + len(invalid),
+            rejected=sorted(rejected + invalid, key=lambda reject: reject["index"])
+        )
+        if deleted:
+            self.ingestion.recent.invalidate(user_id)
+
+        logger.info(
+            "HealthKit sync of user %s device %s: %d metrics, %d received, %d inserted, "
+            "%d backfilled, %d deleted",
+            user_id, device_id, len(changes), result["received"], result["inserted"], backfilled, deleted
+        )
+        return dict(result, metrics=len(changes), backfilled=backfilled, deleted=deleted)
+
+    def _delete_samples(
+        self,
+        connection: Connection,
+        user_id: int,
+        device_id: str,
+        changes: Dict[str, MetricChanges]
+    ) -> Tuple[int, List[Dict]]:
+        """Remove deleted samples and their anomalies from both tiers, then rebuild the rollups they fed.
+
+        Returns the number of samples deleted, and the data type and
+        timestamp of each deleted sample for EnvironmentIndex.refresh_samples.
+        """
+        keys: Dict[Tuple[str, str], List[datetime]] = defaultdict(list)
+        for data_type, metric in changes.items():
+            for sample in metric.deleted:
+                timestamp = naive_utc(parse_datetime(sample["timestamp"]))
+                keys[(data_type, sample.get("device_id") or device_id)].append(timestamp)
+
+        deleted = 0
+        spans: Dict[str, Tuple[datetime, datetime]] = {}
+        for (data_type, sample_device), timestamps in keys.items():
+            for start in range(0, len(timestamps), DELETE_CHUNK_SIZE):
+                chunk = timestamps[start:start + DELETE_CHUNK_SIZE]
+                deleted += connection.execute(
+                    delete(self.raw).where(_sample_keys(self.raw, user_id, data_type, sample_device, chunk))
+                ).rowcount
+                connection.execute(
+                    delete(self.anomalies).where(
+                        _sample_keys(self.anomalies, user_id, data_type, sample_device, chunk)
+                    )
+                )
+                # Archived copies are masked rather than rewritten (see HealthArchive)
+                deleted += self.ingestion.store.archive.record_deletions(
+                    connection, user_id, data_type, sample_device, chunk
+                )
+
+            first, last = min(timestamps), max(timestamps)
+            if data_type in spans:
+                first, last = min(first, spans[data_type][0]), max(last, spans[data_type][1])
+            spans[data_type] = (first, last)
+
+        if not deleted:
+            return 0, []
+        self.ingestion.store.refresh_rollups(connection, user_id, spans)
+        return deleted, [
+            {"data_type": data_type, "timestamp": timestamp}
+            for (data_type, _), timestamps in keys.items() for timestamp in timestamps
+        ]
+
+    def _save_anchors(self, connection: Connection, rows: List[Dict]):
+        if not rows:
+            return
+        dialect = postgresql if connection.dialect.name == "postgresql" else sqlite
+        statement = dialect.insert(self.anchors)
+        statement = statement.on_conflict_do_update(
+            index_elements=["user_id", "device_id", "data_type"],
+            set_={
+                field: statement.excluded[field]
+                for field in ("anchor", "high_water_mark", "synced_at")
+            }
+        )
+        connection.execute(statement, rows)
+
+
+def _parse_samples(samples: Iterable[Dict]) -> Tuple[List[Tuple[int, HealthSample]], List[Dict]]:
+    """Well-formed samples with their positions, and rejects for the others"""
+    parsed, invalid = [], []
+    for index, sample in enumerate(samples):
+        try:
+            parsed.append((index, HealthSample.parse_obj(sample)))
+        except ValidationError as error:
+            fields = sorted({str(detail["loc"][0]) for detail in error.errors()})
+            invalid.append({"index": index, "reason": "invalid " + ", ".join(fields)})
+    return parsed, invalid
+
+
+def _sample_keys(table, user_id: int, data_type: str, device_id: str, timestamps: List[datetime]):
+    return and_(
+        table.c.user_id == user_id,
+        table.c.data_type == data_type,
+        table.c.device_id == device_id,
+        table.c.timestamp.in_(timestamps)
+    )
@@ -0,0 +1,234 @@
+import csv
+import io
+import json
+import logging
+from datetime import datetime, timezone
+from typing import List, Dict, NamedTuple, Optional, Tuple
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from ..models.health_data import HealthData, DEFAULT_SAMPLE_METADATA, metric_validator
+from ..schemas.health_data import HealthSyncPayload
+from .anomaly_detector import AnomalyDetector
+from .environment_index import EnvironmentIndex
+from .live_channel import LiveBroker, ingest_events, live_broker
+from .recent_metrics import RecentMetricsCache, recent_metrics_cache
+from .timeseries_store import TimeSeriesStore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+
+# Columns written for every ingested sample, in COPY order
+INSERT_COLUMNS = [
+    "user_id", "data_type", "value", "timestamp", "metadata", "source",
+    "source_version", "device_id", "is_validated", "quality_score",
+    "confidence_interval", "context_tags"
+]
+
+
+class IngestedBatch(NamedTuple):
+    """Samples written by IngestionService.write, not yet announced"""
+    user_id: int
+    received: int
+    rows: List[Dict]
+    rejected: List[Dict]
+    inserted: int
+    anomalies: List[Dict]
+
+
+class IngestionService:
+    def __init__(
+        self,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        recent: Optional[RecentMetricsCache] = None,
+        live: Optional[LiveBroker] = None
+    ):
+        self.chunk_size = chunk_size
+        self.recent = recent or recent_metrics_cache
+        self.live = live or live_broker
+        self.table = HealthData.__table__
+        self.store = TimeSeriesStore()
+        self.environment = EnvironmentIndex()
+        self.detector = AnomalyDetector()
+
+    def ingest(self, db: Session, payload: HealthSyncPayload) -> Dict:
+        """Validate a sync payload and bulk-write the accepted samples"""
+        batch = self.write(db, payload)
+        db.commit()
+        if batch.inserted:
+            self.environment.refresh_samples(db.get_bind(), payload.user_id, batch.rows)
+        return self.published(batch)
+
+    def write(self, db: Session, payload: HealthSyncPayload) -> "IngestedBatch":
+        """ingest() within the session's transaction, left for the caller to commit.
+
+        Once it is committed, refresh the environmental readings of its
+        rows (see EnvironmentIndex.refresh) and pass it to published().
+        """
+        rows, rejected = self.validate_batch(payload)
+
+        connection = db.connection()
+        if connection.dialect.name == "postgresql":
+            inserted = self._copy_rows(connection, rows)
+        else:
+            inserted = self._insert_rows(connection, rows)
+        anomalies = []
+        if inserted:
+            self.store.refresh_rollups(connection, payload.user_id, _spans(rows))
+            anomalies = self.detector.process(connection, payload.user_id, rows)
+        return IngestedBatch(payload.user_id, len(payload.samples), rows, rejected, inserted, anomalies)
+
+    def published(self, batch: "IngestedBatch") -> Dict:
+        """Announce a committed batch to the recent metrics cache and live channel; returns the sync result"""
+        if batch.inserted == len(batch.rows):
+            self.recent.record(batch.user_id, batch.rows)
+        elif batch.inserted:
+            # Some rows were duplicates, and which ones is not known here
+            self.recent.invalidate(batch.user_id)
+        if batch.inserted:
+            self.live.publish(
+                batch.user_id, ingest_events(batch.rows, batch.anomalies, batch.inserted == len(batch.rows))
+            )
+
+        logger.info(
+            "Ingested %d of %d samples for user %s (%d rejected, %d anomalies)",
+            batch.inserted, batch.received, batch.user_id, len(batch.rejected), len(batch.anomalies)
+        )
+        return {
+            "received": batch.received,
+            "inserted": batch.inserted,
+            "duplicates": len(batch.rows) - batch.inserted,
+            "rejected": batch.rejected,
+            "anomalies": len(batch.anomalies)
+        }
+
+    def validate_batch(self, payload: HealthSyncPayload) -> Tuple[List[Dict], List[Dict]]:
+        """Check every sample of a payload against the metric thresholds.
+
+        Samples of unknown types or outside their threshold range are
+        rejected; types without thresholds are stored unvalidated. Repeats
+        of the same (data_type, timestamp, device_id) key are collapsed.
+        """
+        samples = payload.samples
+        type_ids = metric_validator.encode_types([sample.type for sample in samples])
+        valid, _ = metric_validator.validate_batch(
+            type_ids, [sample.value for sample in samples]
+        )
+        checked = metric_validator.has_threshold[type_ids]
+        # Plain lists: per-element indexing of NumPy arrays is slow in the loop below
+        supported = metric_validator.is_supported[type_ids].tolist()
+        out_of_range = (checked & ~valid).tolist()
+        checked = checked.tolist()
+
+        rows = []
+        rejected = []
+        seen = set()
+
+        for index, sample in enumerate(samples):
+            if not supported[index]:
+                rejected.append({"index": index, "reason": "unsupported type"})
+                continue
+
+            if out_of_range[index]:
+                rejected.append({"index": index, "reason": "out of range"})
+                continue
+
+            timestamp = sample.timestamp
+            if timestamp.tzinfo is not None:
+                timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+            device_id = sample.device_id or payload.device_id
+
+            key = (sample.type, timestamp, device_id)
+            if key in seen:
+                continue
+            seen.add(key)
+
+            rows.append({
+                "user_id": payload.user_id,
+                "data_type": sample.type,
+                "value": sample.value,
+                "timestamp": timestamp,
+                "metadata": sample.metadata or DEFAULT_SAMPLE_METADATA,
+                "source": payload.source,
+                "source_version": payload.source_version,
+                "device_id": device_id,
+                "is_validated": checked[index],
+                "quality_score": 1.0,
+                "confidence_interval": [0.0, 0.0],
+                "context_tags": []
+            })
+
+        return rows, rejected
+
+    def _insert_rows(self, connection: Connection, rows: List[Dict]) -> int:
+        """Chunked executemany of INSERT ... ON CONFLICT DO NOTHING"""
+        dialect = postgresql if connection.dialect.name == "postgresql" else sqlite
+        statement = dialect.insert(self.table).on_conflict_do_nothing(
+            index_elements=["user_id", "data_type", "timestamp", "device_id"]
+        )
+        inserted = 0
+        for start in range(0, len(rows), self.chunk_size):
+            chunk = rows[start:start + self.chunk_size]
+            inserted += connection.execute(statement, chunk).rowcount
+        return inserted
+
+    def _copy_rows(self, connection: Connection, rows: List[Dict]) -> int:
+        """COPY into a staging table, then merge it without duplicates"""
+        if not rows:
+            return 0
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([
+                row["user_id"], row["data_type"], row["value"],
+                row["timestamp"].isoformat(), json.dumps(row["metadata"]),
+                row["source"], row["source_version"], row["device_id"],
+                row["is_validated"], row["quality_score"],
+                _pg_array(row["confidence_interval"]),
+                _pg_array(row["context_tags"])
+            ])
+        buffer.seek(0)
+
+        columns = ", ".join(f'"{column}"' for column in INSERT_COLUMNS)
+        cursor = connection.connection.cursor()
+        try:
+            cursor.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS health_data_staging "
+                f"ON COMMIT DELETE ROWS AS SELECT {columns} FROM health_data "
+                "WITH NO DATA"
+            )
+            cursor.copy_expert(
+                f"COPY health_data_staging ({columns}) FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+            cursor.execute(
+                f"INSERT INTO health_data ({columns}) "
+                f"SELECT {columns} FROM health_data_staging "
+                "ON CONFLICT ON CONSTRAINT uq_health_data_sample DO NOTHING"
+            )
+            inserted = cursor.rowcount
+        finally:
+            cursor.close()
+
+        return inserted
+
+
+def _spans(rows: List[Dict]) -> Dict[str, Tuple[datetime, datetime]]:
+    """First and last timestamp written per data type"""
+    spans = {}
+    for row in rows:
+        timestamp = row["timestamp"]
+        span = spans.get(row["data_type"])
+        if span is None:
+            spans[row["data_type"]] = (timestamp, timestamp)
+        elif timestamp < span[0]:
+            spans[row["data_type"]] = (timestamp, span[1])
+        elif timestamp > span[1]:
+            spans[row["data_type"]] = (span[0], timestamp)
+    return spans
+
+
+def _pg_array(values: List) -> str:
+    return "{" + ",".join(json.dumps(value) for value in values) + "}"
@@ -0,0 +1,447 @@
+"""Scheduler of the background jobs in app.services.jobs.
+
+    python -m app.services.job_scheduler            # run until SIGTERM
+    python -m app.services.job_scheduler --once     # run what is due, then exit
+    python -m app.services.job_scheduler --dry-run  # time every job once, writing nothing
+
+Runs as a sidecar next to the API (see docker-compose.yml), never in an
+API worker: jobs execute in this process's pool, away from any request
+event loop. Run state lives in the job_runs table, so any number of
+schedulers can share the work: each run is split into shards of user id
+ranges and every shard is claimed by exactly one scheduler.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import and_, func, or_, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from ..database import engine as default_engine
+from ..metrics import JOB_DURATION, JOB_SHARDS, JOB_USERS
+from ..models.jobs import JobRun
+from ..models.user import User
+from .jobs import JOBS, JobSpec, UserRange
+from .timeseries_store import EPOCH
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", os.cpu_count() or 1))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "5"))
+# A running shard whose scheduler stopped renewing its lease this long is taken over
+JOB_LEASE = int(os.getenv("JOB_LEASE", "60"))
+# First retry delay, doubled for every further attempt
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", "30"))
+JOB_HISTORY = timedelta(days=30)
+JOB_METRICS_PORT = os.getenv("JOB_METRICS_PORT")
+
+# As for the inference pool: workers fork from a server that imported the job stack once
+JOB_START_METHOD = os.getenv(
+    "JOB_START_METHOD",
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+JOB_PRELOAD = ["app.services.jobs", "app.services.recommendation_engine", "pandas", "sklearn.ensemble"]
+
+# Candidate shards read per job and claim attempt
+CLAIM_BATCH = 8
+MAX_ERROR_LENGTH = 2000
+
+
+class Claim(NamedTuple):
+    id: int
+    job: str
+    shard: int
+    user_range: UserRange
+    attempts: int
+
+
+def _job_pool(workers: int) -> ProcessPoolExecutor:
+    context = multiprocessing.get_context(JOB_START_METHOD)
+    if JOB_START_METHOD == "forkserver":
+        context.set_forkserver_preload(JOB_PRELOAD)
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+
+def _timed(run: Callable[[UserRange, bool], Dict], user_range: UserRange, dry_run: bool) -> Tuple[float, Dict]:
+    """Run a job shard in a pool worker; the duration excludes time queued"""
+    started = time.perf_counter()
+    result = run(user_range, dry_run)
+    return time.perf_counter() - started, result
+
+
+class JobScheduler:
+    """Schedules, claims and runs background job shards.
+
+    Every tick, each job's current slot (``interval``-aligned) is enqueued
+    as one job_runs row per shard; the unique (job, slot, shard) key makes
+    that idempotent across schedulers and restarts. Shards are claimed
+    with a conditional UPDATE that also checks the job's running shards
+    against ``max_concurrency``, run in a process pool, and completed as
+    succeeded, pending again after a backoff, or failed after
+    ``max_attempts``. Claims hold a lease renewed while the shard runs.
+    """
+
+    def __init__(
+        self,
+        jobs: Optional[Dict[str, JobSpec]] = None,
+        engine: Engine = default_engine,
+        workers: int = JOB_WORKERS,
+        poll_interval: float = JOB_POLL_INTERVAL,
+        lease: int = JOB_LEASE,
+        retry_delay: float = JOB_RETRY_DELAY,
+        pool_factory: Callable[[int], ProcessPoolExecutor] = _job_pool,
+        owner: Optional[str] = None
+    ):
+        self.jobs = JOBS if jobs is None else jobs
+        self.engine = engine
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease = timedelta(seconds=lease)
+        self.retry_delay = retry_delay
+        self.pool_factory = pool_factory
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.runs = JobRun.__table__
+        self.users = User.__table__
+        self._scheduled: Dict[str, datetime] = {}
+        self._running: Dict[str, int] = {}
+        self._next_job = 0
+        self._renewed = time.monotonic()
+
+    def run(self, stop: Optional[threading.Event] = None, once: bool = False):
+        """Schedule and run shards until ``stop`` is set, or with ``once`` until nothing is due"""
+        stop = stop or threading.Event()
+        pool = self.pool_factory(self.workers)
+        inflight: Dict[Future, Claim] = {}
+        self._renewed = time.monotonic()
+        try:
+            while not stop.is_set():
+                try:
+                    now = datetime.utcnow()
+                    self.schedule(now)
+                    while len(inflight) < self.workers:
+                        claim = self.claim(now)
+                        if claim is None:
+                            break
+                        inflight[pool.submit(_timed, self.jobs[claim.job].run, claim.user_range, False)] = claim
+                    self._renew_due(inflight)
+                except SQLAlchemyError:
+                    logger.exception("Job scheduler tick failed")
+                if not inflight:
+                    if once:
+                        break
+                    stop.wait(self.poll_interval)
+                    continue
+
+                done, _ = wait(inflight, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    broken |= self._finish(inflight.pop(future), future)
+                if broken:
+                    # A worker died (e.g. out of memory): every shard in flight failed with it
+                    self._drain(inflight)
+                    pool.shutdown(wait=False)
+                    pool = self.pool_factory(self.workers)
+            # Shards already running finish and are recorded before exiting
+            self._drain(inflight)
+        finally:
+            pool.shutdown(wait=True)
+
+    def schedule(self, now: datetime) -> int:
+        """Enqueue the shards of every job's current slot not enqueued yet; returns how many"""
+        due = {}
+        for spec in self.jobs.values():
+            slot = _slot(now, spec.interval)
+            if self._scheduled.get(spec.name) != slot:
+                due[spec.name] = slot
+        if not due:
+            return 0
+
+        enqueued = 0
+        with self.engine.begin() as connection:
+            max_user = connection.execute(select(func.max(self.users.c.id))).scalar() or 0
+            for name, slot in due.items():
+                rows = [
+                    {
+                        "job": name, "scheduled_for": slot, "shard": shard,
+                        "user_start": user_range[0] if user_range else None,
+                        "user_end": user_range[1] if user_range else None,
+                        "status": "pending", "attempts": 0, "run_after": slot
+                    }
+                    for shard, user_range in enumerate(_shards(self.jobs[name], max_user))
+                ]
+                if not rows:
+                    continue
+                dialect = postgresql if connection.dialect.name == "postgresql" else sqlite
+                enqueued += connection.execute(
+                    dialect.insert(self.runs).on_conflict_do_nothing(
+                        index_elements=["job", "scheduled_for", "shard"]
+                    ),
+                    rows
+                ).rowcount
+                connection.execute(self.runs.delete().where(
+                    self.runs.c.job == name, self.runs.c.finished_at < now - JOB_HISTORY
+                ))
+        self._scheduled.update(due)
+        if enqueued > 0:
+            logger.info("Scheduled %d job shards", enqueued)
+        return enqueued
+
+    def claim(self, now: datetime) -> Optional[Claim]:
+        """Take the next runnable shard of any job below its concurrency limit, or None"""
+        names = list(self.jobs)
+        for offset in range(len(names)):
+            # Round robin, so one job's backlog does not starve the others
+            spec = self.jobs[names[(self._next_job + offset) % len(names)]]
+            if self._running.get(spec.name, 0) >= spec.max_concurrency:
+                continue
+            claim = self._claim(spec, now)
+            if claim is not None:
+                self._next_job = (self._next_job + offset + 1) % len(names)
+                self._running[spec.name] = self._running.get(spec.name, 0) + 1
+                return claim
+        return None
+
+    def complete(
+        self, claim: Claim, result: Optional[Dict], error: Optional[BaseException], seconds: Optional[float]
+    ):
+        """Record a finished shard: succeeded, pending again after a backoff, or failed.
+
+        ``seconds`` is the shard's run time, None when it failed before
+        reporting one; only measured runs enter JOB_DURATION.
+        """
+        runs = self.runs
+        spec = self.jobs[claim.job]
+        now = datetime.utcnow()
+        values = {"finished_at": now, "lease_until": None}
+        if error is None:
+            outcome = "succeeded"
+            values.update(status=outcome, result=result, error=None)
+            JOB_USERS.labels(claim.job).inc(result.get("users", 0) if result else 0)
+        else:
+            message = "".join(traceback.format_exception_only(type(error), error)).strip()[:MAX_ERROR_LENGTH]
+            values["error"] = message
+            if claim.attempts < spec.max_attempts:
+                outcome = "retried"
+                delay = self.retry_delay * 2 ** (claim.attempts - 1)
+                values.update(status="pending", run_after=now + timedelta(seconds=delay))
+            else:
+                outcome = "failed"
+                values["status"] = outcome
+            logger.warning(
+                "Job %s shard %d attempt %d/%d failed (%s): %s",
+                claim.job, claim.shard, claim.attempts, spec.max_attempts, outcome, message
+            )
+        JOB_SHARDS.labels(claim.job, outcome).inc()
+        if seconds is not None:
+            JOB_DURATION.labels(claim.job).observe(seconds)
+        self._running[claim.job] -= 1
+
+        try:
+            with self.engine.begin() as connection:
+                updated = connection.execute(
+                    update(runs)
+                    .where(runs.c.id == claim.id, runs.c.owner == self.owner, runs.c.status == "running")
+                    .values(**values)
+                ).rowcount
+        except SQLAlchemyError:
+            # The shard stays running under its lease; once that expires it is run again
+            logger.exception("Recording job %s shard %d failed", claim.job, claim.shard)
+            return
+        if not updated:
+            logger.warning("Job %s shard %d lost its lease before finishing", claim.job, claim.shard)
+
+    def renew(self, claims: Iterable[Claim], now: datetime):
+        with self.engine.begin() as connection:
+            connection.execute(
+                update(self.runs)
+                .where(self.runs.c.id.in_([claim.id for claim in claims]), self.runs.c.owner == self.owner)
+                .values(lease_until=now + self.lease)
+            )
+
+    def benchmark(self, names: Optional[List[str]] = None, dry_run: bool = True) -> List[Dict]:
+        """Run every shard of each job once, now, and report durations and throughput.
+
+        job_runs is not read or written, so this never disturbs the
+        schedule; with ``dry_run`` the jobs write nothing either.
+        Shards of a job run ``max_concurrency`` at a time, as scheduled.
+        """
+        with self.engine.connect() as connection:
+            max_user = connection.execute(select(func.max(self.users.c.id))).scalar() or 0
+        reports = []
+        with self.pool_factory(self.workers) as pool:
+            # Start the workers first, so the first job is not charged for it
+            list(pool.map(abs, range(self.workers)))
+            for name in names or list(self.jobs):
+                spec = self.jobs[name]
+                shards = list(_shards(spec, max_user))
+                limit = min(spec.max_concurrency, self.workers)
+                pending, inflight = list(shards), set()
+                durations, users, errors = [], 0, 0
+                started = time.perf_counter()
+                while pending or inflight:
+                    while pending and len(inflight) < limit:
+                        inflight.add(pool.submit(_timed, spec.run, pending.pop(0), dry_run))
+                    done, inflight = wait(inflight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        try:
+                            seconds, result = future.result()
+                        except Exception:
+                            logger.exception("Job %s shard failed", name)
+                            errors += 1
+                            continue
+                        durations.append(seconds)
+                        users += result.get("users", 0)
+                elapsed = time.perf_counter() - started
+                reports.append({
+                    "job": name,
+                    "shards": len(shards),
+                    "errors": errors,
+                    "users": users,
+                    "seconds": elapsed,
+                    "users_per_second": users / elapsed if elapsed else 0.0,
+                    "shard_seconds_max": max(durations, default=0.0)
+                })
+        return reports
+
+    def _claim(self, spec: JobSpec, now: datetime) -> Optional[Claim]:
+        runs = self.runs
+        runnable = or_(
+            and_(runs.c.status == "pending", runs.c.run_after <= now),
+            # Its scheduler stopped renewing the lease: presumed dead
+            and_(runs.c.status == "running", runs.c.lease_until < now)
+        )
+        with self.engine.begin() as connection:
+            candidates = connection.execute(
+                select(runs.c.id, runs.c.shard, runs.c.user_start, runs.c.user_end, runs.c.attempts)
+                .where(runs.c.job == spec.name, runnable)
+                .order_by(runs.c.scheduled_for, runs.c.shard)
+                .limit(CLAIM_BATCH)
+            ).all()
+            if not candidates:
+                return None
+            if connection.dialect.name == "postgresql":
+                # Serializes claims of one job, so the running count below cannot race
+                connection.execute(text("SELECT pg_advisory_xact_lock(hashtext(:job))"), {"job": spec.name})
+
+            others = runs.alias("others")
+            running = (
+                select(func.count()).select_from(others)
+                .where(others.c.job == spec.name, others.c.status == "running", others.c.lease_until >= now)
+                .scalar_subquery()
+            )
+            for candidate in candidates:
+                if candidate.attempts >= spec.max_attempts:
+                    # Only shards whose lease expired on their last attempt get here
+                    connection.execute(
+                        update(runs).where(runs.c.id == candidate.id, runnable)
+                        .values(status="failed", finished_at=now, lease_until=None,
+                                error="Lease expired on the last attempt")
+                    )
+                    JOB_SHARDS.labels(spec.name, "failed").inc()
+                    continue
+                claimed = connection.execute(
+                    update(runs)
+                    .where(runs.c.id == candidate.id, runnable, running < spec.max_concurrency)
+                    .values(
+                        status="running", owner=self.owner, attempts=runs.c.attempts + 1,
+                        lease_until=now + self.lease, started_at=now, finished_at=None
+                    )
+                ).rowcount
+                if claimed:
+                    user_range = (
+                        (candidate.user_start, candidate.user_end) if candidate.user_start is not None else None
+                    )
+                    return Claim(candidate.id, spec.name, candidate.shard, user_range, candidate.attempts + 1)
+        return None
+
+    def _renew_due(self, inflight: Dict[Future, Claim]):
+        """Renew the leases of the shards in flight once a third of the lease has passed"""
+        if inflight and time.monotonic() - self._renewed > self.lease.total_seconds() / 3:
+            self.renew(inflight.values(), datetime.utcnow())
+            self._renewed = time.monotonic()
+
+    def _drain(self, inflight: Dict[Future, Claim]):
+        """Wait for every shard in flight and record it, renewing leases meanwhile.
+
+        Without the renewals a shard outlasting its lease while the
+        scheduler shuts down would be taken over and run a second time.
+        """
+        while inflight:
+            done, _ = wait(inflight, timeout=self.lease.total_seconds() / 3)
+            for future in done:
+                self._finish(inflight.pop(future), future)
+            try:
+                self._renew_due(inflight)
+            except SQLAlchemyError:
+                logger.exception("Renewing job leases failed")
+
+    def _finish(self, claim: Claim, future: Future) -> bool:
+        """Complete ``claim`` from its future; True when the pool broke"""
+        try:
+            seconds, result = future.result()
+        except Exception as error:
+            self.complete(claim, None, error, None)
+            return isinstance(error, BrokenProcessPool)
+        self.complete(claim, json.loads(json.dumps(result, default=str)), None, seconds)
+        return False
+
+
+def _slot(now: datetime, interval: int) -> datetime:
+    seconds = int((now - EPOCH).total_seconds())
+    return EPOCH + timedelta(seconds=seconds - seconds % interval)
+
+
+def _shards(spec: JobSpec, max_user: int) -> Iterable[UserRange]:
+    if spec.shard_size is None:
+        yield None
+        return
+    for start in range(1, max_user + 1, spec.shard_size):
+        yield (start, start + spec.shard_size)
+
+
+def _report(reports: List[Dict]):
+    for report in reports:
+        print(
+            f"{report['job']:<22} {report['shards']:5d} shards {report['errors']:3d} errors "
+            f"{report['users']:8d} users {report['seconds']:8.2f} s "
+            f"{report['users_per_second']:9.1f} users/s  slowest shard {report['shard_seconds_max']:.2f} s"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--once", action="store_true", help="run the shards that are due, then exit")
+    parser.add_argument("--dry-run", action="store_true", help="time one run of every job without writing")
+    parser.add_argument("--jobs", nargs="+", choices=list(JOBS), help="only these jobs")
+    parser.add_argument("--workers", type=int, default=JOB_WORKERS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    jobs = {name: JOBS[name] for name in args.jobs} if args.jobs else JOBS
+    scheduler = JobScheduler(jobs, workers=args.workers)
+    if args.dry_run:
+        _report(scheduler.benchmark(dry_run=True))
+        return
+
+    if JOB_METRICS_PORT:
+        from prometheus_client import start_http_server
+        start_http_server(int(JOB_METRICS_PORT))
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    scheduler.run(stop, once=args.once)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""Background jobs run by the job scheduler.
+
+Each job is a top-level function ``run(user_range, dry_run) -> Dict``
+executed in a scheduler pool process. ``user_range`` is the shard's
+(start, end) half-open range of user ids, or None for unsharded jobs. A
+shard may run more than once (retries, a scheduler dying mid-shard), so
+every job is idempotent: it recomputes its output from the current data
+and replaces what is there. With ``dry_run`` a job does all of its reads
+and computation but writes nothing. The returned dict is stored with the
+run; its ``users`` entry counts towards job throughput.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+from sqlalchemy import and_, func, select
+from ..database import AsyncSessionLocal, async_engine, engine
+from ..models.health_data import HealthData
+from ..models.user import User
+from .health_archive import HealthArchive
+from .recommendation_cache import REDIS_URL, RecommendationCache
+from .recommendation_service import RecommendationService
+from .timeseries_store import TimeSeriesStore
+
+logger = logging.getLogger(__name__)
+
+# Samples ingested this far back have their rollups rebuilt; overlaps the hourly interval
+ROLLUP_LOOKBACK = timedelta(hours=2)
+# Training CSV of the nightly retraining (see model_training); unset skips it
+MODEL_TRAINING_DATA = os.getenv("MODEL_TRAINING_DATA")
+
+UserRange = Optional[Tuple[int, int]]
+
+
+class JobSpec(NamedTuple):
+    name: str
+    run: Callable[[UserRange, bool], Dict]
+    interval: int                 # seconds between scheduled runs
+    shard_size: Optional[int]     # users per shard; None runs once over all users
+    max_concurrency: int = 1      # shards of the job running at once, over all schedulers
+    max_attempts: int = 3
+
+
+# Engine of the current pool worker, built on first use
+_engine = None
+
+
+def refresh_rollups(user_range: UserRange, dry_run: bool = False) -> Dict:
+    """Rebuild the rollups of every sample ingested in the last ROLLUP_LOOKBACK.
+
+    Ingestion keeps rollups current as it writes; this repairs buckets
+    left behind by writes that bypassed it or failed half way. Samples
+    are picked by ingestion time, so backfilled history is repaired too.
+    """
+    table = HealthData.__table__
+    store = TimeSeriesStore()
+    since = datetime.utcnow() - ROLLUP_LOOKBACK
+    with engine.connect() as connection:
+        spans = connection.execute(
+            select(table.c.user_id, table.c.data_type, func.min(table.c.timestamp), func.max(table.c.timestamp))
+            .where(table.c.created_at >= since, _in_range(table.c.user_id, user_range))
+            .group_by(table.c.user_id, table.c.data_type)
+        ).all()
+        by_user: Dict[int, Dict[str, Tuple[datetime, datetime]]] = {}
+        for user_id, data_type, first, last in spans:
+            by_user.setdefault(user_id, {})[data_type] = (first, last)
+
+        for user_id, user_spans in by_user.items():
+            with connection.begin() as transaction:
+                store.refresh_rollups(connection, user_id, user_spans)
+                if dry_run:
+                    transaction.rollback()
+    return {"users": len(by_user), "series": len(spans)}
+
+
+def maintain_partitions(user_range: UserRange, dry_run: bool = False) -> Dict:
+    """Create the monthly health_data partitions of the next PARTITION_MONTHS_AHEAD months.
+
+    Samples of a month without a partition land in health_data_default,
+    after which that month can no longer get one; running daily keeps
+    partitions months ahead of the samples that need them.
+    """
+    with engine.connect() as connection:
+        with connection.begin() as transaction:
+            created = TimeSeriesStore().ensure_partitions(connection)
+            if dry_run:
+                transaction.rollback()
+    if created:
+        logger.info("Created health_data partitions %s", ", ".join(created))
+    return {"partitions": created}
+
+
+def warm_recommendations(user_range: UserRange, dry_run: bool = False) -> Dict:
+    """Recompute the cached recommendations of every user in the shard.
+
+    API workers then answer from the shared cache instead of running the
+    engine on the request path. Without Redis there is no cache the API
+    workers would see, so the job is skipped.
+    """
+    if not REDIS_URL and not dry_run:
+        return {"users": 0, "skipped": "REDIS_URL is not set"}
+    return asyncio.run(_warm_recommendations(user_range, dry_run))
+
+
+def retrain_models(user_range: UserRange, dry_run: bool = False) -> Dict:
+    """Train the engine models on MODEL_TRAINING_DATA and publish them as a new version"""
+    if not MODEL_TRAINING_DATA:
+        return {"skipped": "MODEL_TRAINING_DATA is not set"}
+    from .model_training import load_training_csv, publish_models, train_models
+
+    genetic_features = _recommendation_engine().genetic_features
+    matrices = load_training_csv(MODEL_TRAINING_DATA, genetic_features)
+    models = train_models(*matrices)
+    samples = len(matrices[0])
+    if dry_run:
+        return {"samples": samples, "version": None}
+    return {
+        "samples": samples,
+        "version": publish_models(models, samples, genetic_features, MODEL_TRAINING_DATA)
+    }
+
+
+def archive_health_data(user_range: UserRange, dry_run: bool = False) -> Dict:
+    """Move every user's samples older than ARCHIVE_AFTER_DAYS to the cold tier"""
+    users = User.__table__
+    archive = HealthArchive()
+    totals = {"users": 0, "months": 0, "rows": 0, "bytes": 0}
+    with engine.connect() as connection:
+        user_ids = connection.execute(
+            select(users.c.id).where(_in_range(users.c.id, user_range)).order_by(users.c.id)
+        ).scalars().all()
+        for user_id in user_ids:
+            result = archive.archive_user(connection, user_id, dry_run=dry_run)
+            for key in ("months", "rows", "bytes"):
+                totals[key] += result[key]
+        totals["users"] = len(user_ids)
+    return totals
+
+
+async def _warm_recommendations(user_range: UserRange, dry_run: bool) -> Dict:
+    import pandas as pd
+
+    users = User.__table__
+    # A client of this event loop; the module-level cache's belongs to none
+    cache = None if dry_run else RecommendationCache(max_entries=0)
+    service = RecommendationService(cache=cache)
+    now = datetime.utcnow()
+    try:
+        async with AsyncSessionLocal() as db:
+            user_ids = (await db.execute(
+                select(users.c.id).where(_in_range(users.c.id, user_range)).order_by(users.c.id)
+            )).scalars().all()
+            inputs = {}
+            for user_id in user_ids:
+                user_data = await service.load_inputs(db, user_id, now)
+                if user_data is not None:  # deleted since
+                    inputs[user_id] = user_data
+
+        if inputs:
+            frame = pd.DataFrame(list(inputs.values()))
+            results = _recommendation_engine().generate_recommendations_batch(frame)
+            if cache is not None:
+                for (user_id, user_data), value in zip(inputs.items(), results):
+                    await cache.put(user_id, user_data, value)
+    finally:
+        if cache is not None and cache.redis is not None:
+            await cache.redis.close()
+        # Its connections belong to this loop, which asyncio.run closes
+        await async_engine.dispose()
+    return {"users": len(inputs)}
+
+
+def _recommendation_engine():
+    global _engine
+    if _engine is None:
+        from .recommendation_engine import RecommendationEngine
+        _engine = RecommendationEngine()
+    return _engine
+
+
+def _in_range(column, user_range: UserRange):
+    if user_range is None:
+        return column.isnot(None)
+    return and_(column >= user_range[0], column < user_range[1])
+
+
+JOBS: Dict[str, JobSpec] = {
+    spec.name: spec for spec in [
+        JobSpec("maintain_partitions", maintain_partitions, interval=24 * 3600, shard_size=None),
+        JobSpec("refresh_rollups", refresh_rollups, interval=3600, shard_size=1000, max_concurrency=2),
+        JobSpec("warm_recommendations", warm_recommendations, interval=6 * 3600, shard_size=500,
+                max_concurrency=2),
+        JobSpec("retrain_models", retrain_models, interval=24 * 3600, shard_size=None, max_attempts=2),
+        JobSpec("archive_health_data", archive_health_data, interval=24 * 3600, shard_size=1000),
+    ]
+}
@@ -0,0 +1,316 @@
+import asyncio
+import logging
+import os
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set
+from ..utils import dumps
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Redis pub/sub is optional
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL")
+CHANNEL_PREFIX = "live:"
+
+# Events of one user arriving within this many seconds go out as one frame
+COALESCE_WINDOW = float(os.getenv("LIVE_COALESCE_WINDOW", "0.1"))
+# Frames a connection may have waiting; a consumer falling further behind is dropped
+MAX_QUEUED_FRAMES = int(os.getenv("LIVE_MAX_QUEUED_FRAMES", "32"))
+# Idle SSE streams send a comment this often so proxies keep them open
+HEARTBEAT_INTERVAL = 15.0
+# Larger syncs (backfills, first syncs) are announced as a refresh, not sample by sample
+MAX_SAMPLE_EVENTS = 500
+
+
+class LocalPubSub:
+    """In-process stand-in for Redis pub/sub, for a single worker"""
+
+    def __init__(self):
+        self.handler: Optional[Callable[[int, bytes], None]] = None
+
+    async def start(self, handler: Callable[[int, bytes], None]):
+        self.handler = handler
+
+    def publish(self, user_id: int, payload: bytes):
+        self.handler(user_id, payload)
+
+    async def sync(self, user_ids: Set[int]):
+        pass
+
+    async def close(self):
+        pass
+
+
+class RedisPubSub:
+    """Events of every worker through one Redis channel per user.
+
+    The worker subscribes only to the users it has live connections for;
+    sync() brings the subscribed channels in line with that set.
+    """
+
+    def __init__(self, client, prefix: str = CHANNEL_PREFIX):
+        self.client = client
+        self.prefix = prefix
+        self.pubsub = client.pubsub()
+        self.handler: Optional[Callable[[int, bytes], None]] = None
+        self._subscribed: Set[int] = set()
+        self._lock = asyncio.Lock()
+        self._reader: Optional[asyncio.Task] = None
+        self._pending: Set[asyncio.Task] = set()
+
+    async def start(self, handler: Callable[[int, bytes], None]):
+        self.handler = handler
+
+    def publish(self, user_id: int, payload: bytes):
+        task = asyncio.ensure_future(self.client.publish(f"{self.prefix}{user_id}", payload))
+        self._pending.add(task)
+        task.add_done_callback(self._published)
+
+    async def sync(self, user_ids: Set[int]):
+        async with self._lock:
+            wanted = set(user_ids)
+            added = wanted - self._subscribed
+            removed = self._subscribed - wanted
+            if added:
+                await self.pubsub.subscribe(*(f"{self.prefix}{user_id}" for user_id in added))
+            if removed:
+                await self.pubsub.unsubscribe(*(f"{self.prefix}{user_id}" for user_id in removed))
+            self._subscribed = wanted
+            if self._reader is None and wanted:
+                self._reader = asyncio.create_task(self._read())
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+        await self.pubsub.reset()
+
+    async def _read(self):
+        while True:
+            try:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Reading live events from Redis failed")
+                await asyncio.sleep(1.0)
+                continue
+            if message is not None and message["type"] == "message":
+                channel = message["channel"].decode()
+                self.handler(int(channel[len(self.prefix):]), message["data"])
+
+    def _published(self, task: asyncio.Task):
+        self._pending.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Publishing live events failed: %s", task.exception())
+
+
+class Subscription:
+    """One live connection's queue of encoded frames.
+
+    The broker offers frames without waiting; a connection that already
+    has ``max_frames`` unsent frames is a slow consumer and is dropped
+    rather than letting the backlog (and the broker's memory) grow.
+    """
+
+    __slots__ = ("user_id", "max_frames", "dropped", "closed", "_frames", "_ready")
+
+    def __init__(self, user_id: int, max_frames: int = MAX_QUEUED_FRAMES):
+        self.user_id = user_id
+        self.max_frames = max_frames
+        self.dropped = False
+        self.closed = False
+        self._frames: deque = deque()
+        self._ready = asyncio.Event()
+
+    def offer(self, frame: bytes) -> bool:
+        if self.dropped or self.closed:
+            return False
+        if len(self._frames) >= self.max_frames:
+            self.dropped = True
+            self._frames.clear()
+        else:
+            self._frames.append(frame)
+        self._ready.set()
+        return not self.dropped
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+
+    async def frames(self, heartbeat: Optional[float] = None) -> AsyncIterator[bytes]:
+        """Frames as they arrive, and b"" after ``heartbeat`` idle seconds; ends when dropped or closed"""
+        while True:
+            while self._frames:
+                yield self._frames.popleft()
+            if self.dropped or self.closed:
+                return
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), heartbeat)
+            except asyncio.TimeoutError:
+                yield b""
+
+
+class LiveBroker:
+    """Fan-out of newly ingested samples and anomalies to live connections.
+
+    publish() may be called from any thread (ingestion runs on the compute
+    pool); it encodes the events once and hands them to the event loop,
+    which forwards them through the pub/sub transport. Events received for
+    a user are held for ``window`` seconds and then sent to every one of
+    the user's connections as a single frame, encoded once.
+    """
+
+    def __init__(
+        self,
+        window: float = COALESCE_WINDOW,
+        max_frames: int = MAX_QUEUED_FRAMES,
+        redis_url: Optional[str] = REDIS_URL,
+        pubsub=None
+    ):
+        self.window = window
+        self.max_frames = max_frames
+        self.redis_url = redis_url
+        self.pubsub = pubsub
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._pending: Dict[int, List[bytes]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+        self.published = 0
+        self.frames = 0
+        self.deliveries = 0
+        self.dropped = 0
+
+    async def start(self):
+        if self.pubsub is None:
+            if self.redis_url and aioredis is not None:
+                self.pubsub = RedisPubSub(aioredis.from_url(self.redis_url))
+            else:
+                self.pubsub = LocalPubSub()
+        await self.pubsub.start(self._receive)
+        self._loop = asyncio.get_running_loop()
+
+    async def stop(self):
+        self._loop = None
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        for subscriptions in self._subscribers.values():
+            for subscription in subscriptions:
+                subscription.close()
+        if self.pubsub is not None:
+            await self.pubsub.close()
+
+    def publish(self, user_id: int, events: List[Dict]):
+        """Send ``events`` to the user's live connections on every worker; safe from any thread"""
+        loop = self._loop
+        if loop is None or not events:
+            return
+        if isinstance(self.pubsub, LocalPubSub) and user_id not in self._subscribers:
+            return
+        payload = dumps(events)
+        self.published += len(events)
+        try:
+            loop.call_soon_threadsafe(self.pubsub.publish, user_id, payload)
+        except RuntimeError:  # loop closed during shutdown
+            pass
+
+    @asynccontextmanager
+    async def subscribe(self, user_id: int) -> AsyncIterator[Subscription]:
+        subscription = Subscription(user_id, self.max_frames)
+        first = user_id not in self._subscribers
+        self._subscribers.setdefault(user_id, set()).add(subscription)
+        try:
+            if first:
+                await self.pubsub.sync(self._subscribers.keys())
+            yield subscription
+        finally:
+            subscription.close()
+            subscriptions = self._subscribers.get(user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscribers[user_id]
+                    # Not awaited: this also runs when the connection's task is cancelled
+                    asyncio.ensure_future(self.pubsub.sync(self._subscribers.keys()))
+
+    def stats(self) -> Dict:
+        return {
+            "connections": sum(len(subscriptions) for subscriptions in self._subscribers.values()),
+            "users": len(self._subscribers),
+            "published": self.published,
+            "frames": self.frames,
+            "deliveries": self.deliveries,
+            "dropped": self.dropped
+        }
+
+    def _receive(self, user_id: int, payload: bytes):
+        if user_id not in self._subscribers:
+            return
+        self._pending.setdefault(user_id, []).append(payload)
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.window, self._flush)
+
+    def _flush(self):
+        self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        for user_id, payloads in pending.items():
+            subscriptions = self._subscribers.get(user_id)
+            if not subscriptions:
+                continue
+            # Payloads are JSON arrays: splice their items instead of decoding them
+            frame = b'{"user_id":%d,"events":[%s]}' % (
+                user_id, b",".join(payload[1:-1] for payload in payloads)
+            )
+            self.frames += 1
+            for subscription in list(subscriptions):
+                if subscription.offer(frame):
+                    self.deliveries += 1
+                elif subscription.dropped:
+                    self.dropped += 1
+                    subscriptions.discard(subscription)
+                    logger.info("Dropped a slow live consumer of user %s", user_id)
+
+
+def ingest_events(rows: List[Dict], anomalies: List[Dict], complete: bool) -> List[Dict]:
+    """Live events of one ingested batch.
+
+    ``complete`` says every row was newly written; otherwise which rows
+    were duplicates is not known and clients are told to refresh instead,
+    as they are for batches too large to stream.
+    """
+    events = []
+    if complete and len(rows) <= MAX_SAMPLE_EVENTS:
+        events.extend(
+            {
+                "type": "sample",
+                "data_type": row["data_type"],
+                "value": row["value"],
+                "timestamp": row["timestamp"],
+                "device_id": row["device_id"]
+            }
+            for row in rows
+        )
+    elif rows:
+        events.append({"type": "refresh"})
+    events.extend(
+        {
+            "type": "anomaly",
+            "data_type": anomaly["data_type"],
+            "value": anomaly["value"],
+            "expected": anomaly["expected"],
+            "z_score": anomaly["z_score"],
+            "detectors": anomaly["detectors"],
+            "timestamp": anomaly["timestamp"]
+        }
+        for anomaly in anomalies
+    )
+    return events
+
+
+live_broker = LiveBroker()
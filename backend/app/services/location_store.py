@@ -0,0 +1,262 @@
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import and_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from ..models.locations import LocationCell, LocationTrack
+from ..schemas.location import LocationBatch
+from ..utils import dumps, naive_utc
+from .environment_index import EnvironmentIndex
+
+logger = logging.getLogger(__name__)
+
+# Coordinates are kept as integer multiples of 1e-5 degree (about 1.1 m),
+# the precision of Google's encoded polylines
+COORDINATE_SCALE = 100000
+# Geohash length of the location index (about 1.2 x 0.6 km) and of the
+# areas environmental readings are pooled over (about 4.9 x 4.9 km)
+CELL_PRECISION = 6
+AREA_PRECISION = 5
+
+GEOHASH_ALPHABET = np.frombuffer(b"0123456789bcdefghjkmnpqrstuvwxyz", dtype=np.uint8)
+# 7-bit groups of a 64-bit varint
+MAX_VARINT_BYTES = 10
+
+
+def encode_track(times: np.ndarray, latitudes: np.ndarray, longitudes: np.ndarray, accuracies: np.ndarray) -> bytes:
+    """Delta-encode a track as zigzag varints.
+
+    Epoch seconds, latitudes and longitudes (in COORDINATE_SCALE units)
+    are stored as the first value followed by successive differences, so
+    consecutive fixes of a moving device take one or two bytes per
+    column; accuracies are rounded meters plus one, zero meaning unknown.
+    """
+    columns = [
+        np.diff(times.astype(np.int64), prepend=0),
+        np.diff(np.round(latitudes * COORDINATE_SCALE).astype(np.int64), prepend=0),
+        np.diff(np.round(longitudes * COORDINATE_SCALE).astype(np.int64), prepend=0),
+        np.where(np.isnan(accuracies), 0, np.round(np.nan_to_num(accuracies)) + 1).astype(np.int64)
+    ]
+    values = np.concatenate(columns)
+    return _encode_varints(((values << 1) ^ (values >> 63)).astype(np.uint64))
+
+
+def decode_track(data: bytes) -> Dict[str, np.ndarray]:
+    """Columns of an encode_track blob: epoch seconds, latitude, longitude, accuracy (NaN if unknown)"""
+    values = _decode_varints(data)
+    values = (values >> np.uint64(1)).astype(np.int64) ^ -(values & np.uint64(1)).astype(np.int64)
+    times, latitudes, longitudes, accuracies = values.reshape(4, -1)
+    return {
+        "timestamp": np.cumsum(times),
+        "latitude": np.cumsum(latitudes) / COORDINATE_SCALE,
+        "longitude": np.cumsum(longitudes) / COORDINATE_SCALE,
+        "accuracy": np.where(accuracies == 0, np.nan, accuracies - 1.0)
+    }
+
+
+def geohash(latitudes: np.ndarray, longitudes: np.ndarray, precision: int) -> List[str]:
+    """Geohash of every coordinate pair, ``precision`` characters long"""
+    bits = precision * 5
+    lon_bits, lat_bits = (bits + 1) // 2, bits // 2
+    # Quantizing to 2**n steps yields the bits of n successive interval halvings
+    lat = np.clip(((latitudes + 90) / 180 * (1 << lat_bits)).astype(np.int64), 0, (1 << lat_bits) - 1)
+    lon = np.clip(((longitudes + 180) / 360 * (1 << lon_bits)).astype(np.int64), 0, (1 << lon_bits) - 1)
+    code = np.zeros(len(lat), dtype=np.int64)
+    for index in range(bits):
+        # Bits alternate, longitude first
+        source, width = (lon, lon_bits) if index % 2 == 0 else (lat, lat_bits)
+        code = (code << 1) | ((source >> (width - 1 - index // 2)) & 1)
+    characters = np.stack(
+        [GEOHASH_ALPHABET[(code >> (5 * (precision - 1 - position))) & 31] for position in range(precision)],
+        axis=1
+    )
+    return characters.view(f"S{precision}").ravel().astype(str).tolist()
+
+
+class LocationStore:
+    """Batched location tracks plus the cell/hour index used to join them with environmental data.
+
+    An upload is stored as one delta-encoded row, counted into the
+    location_cells index per geohash cell and hour, and the environmental
+    readings of the areas and hours it places the user in are rebuilt.
+    """
+
+    def __init__(self, environment: Optional[EnvironmentIndex] = None):
+        self.environment = environment or EnvironmentIndex()
+        self.tracks = LocationTrack.__table__
+        self.cells = LocationCell.__table__
+
+    def ingest(self, db: Session, payload: LocationBatch) -> Dict:
+        """Store an upload of fixes.
+
+        An upload is keyed by its device and first fix. The app resends a
+        batch whose upload failed together with the fixes recorded since,
+        so a batch with a stored key is merged into the stored row: its
+        fixes at timestamps not stored yet are added and indexed, and an
+        upload without any is reported as a duplicate.
+        """
+        fixes = sorted(payload.fixes, key=lambda fix: naive_utc(fix.timestamp))
+        times = np.array([naive_utc(fix.timestamp) for fix in fixes], dtype="datetime64[s]").astype(np.int64)
+        # Indexed at the stored precision, so a rebuild from the tracks gives the same cells
+        latitudes = np.round(np.array([fix.latitude for fix in fixes]) * COORDINATE_SCALE) / COORDINATE_SCALE
+        longitudes = np.round(np.array([fix.longitude for fix in fixes]) * COORDINATE_SCALE) / COORDINATE_SCALE
+        accuracies = np.array([np.nan if fix.accuracy is None else fix.accuracy for fix in fixes])
+        data = encode_track(times, latitudes, longitudes, accuracies)
+
+        connection = db.connection()
+        dialect = postgresql if connection.dialect.name == "postgresql" else sqlite
+        start, end = times[[0, -1]].astype("datetime64[s]").tolist()
+        inserted = connection.execute(
+            dialect.insert(self.tracks).on_conflict_do_nothing(index_elements=["user_id", "device_id", "start"]),
+            {
+                "user_id": payload.user_id, "device_id": payload.device_id,
+                "start": start, "end": end, "count": len(fixes), "fixes": data
+            }
+        ).rowcount
+        new = np.ones(len(fixes), dtype=bool)
+        if not inserted:
+            new, data = self._merge(connection, payload, times, latitudes, longitudes, accuracies)
+            if not new.any():
+                db.rollback()
+                return {"received": len(fixes), "stored": 0, "duplicate": True}
+
+        times, latitudes, longitudes = times[new], latitudes[new], longitudes[new]
+        hours = (times - times % 3600).astype("datetime64[s]").tolist()
+        counts = Counter(zip(hours, geohash(latitudes, longitudes, CELL_PRECISION)))
+        statement = dialect.insert(self.cells)
+        connection.execute(
+            statement.on_conflict_do_update(
+                index_elements=["user_id", "bucket", "cell"],
+                set_={"fixes": self.cells.c.fixes + statement.excluded.fixes}
+            ),
+            [
+                {
+                    "user_id": payload.user_id, "bucket": bucket, "cell": cell,
+                    "area": cell[:AREA_PRECISION], "fixes": count
+                }
+                for (bucket, cell), count in counts.items()
+            ]
+        )
+        db.commit()
+        self.environment.refresh_locations(
+            db.get_bind(), payload.user_id, {(cell[:AREA_PRECISION], bucket) for bucket, cell in counts}
+        )
+
+        stored = int(new.sum())
+        logger.info(
+            "Stored %d of %d location fixes of user %s in %d bytes over %d cells",
+            stored, len(fixes), payload.user_id, len(data), len(counts)
+        )
+        return {
+            "received": len(fixes), "stored": stored, "duplicate": False,
+            "cells": len(counts), "bytes": len(data)
+        }
+
+    def _merge(
+        self,
+        connection: Connection,
+        payload: LocationBatch,
+        times: np.ndarray,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        accuracies: np.ndarray
+    ) -> Tuple[np.ndarray, bytes]:
+        """Add an upload's unseen fixes to the stored batch with its key; returns the mask of those and the new blob"""
+        tracks = self.tracks
+        key = and_(
+            tracks.c.user_id == payload.user_id,
+            tracks.c.device_id == payload.device_id,
+            tracks.c.start == times[0].astype("datetime64[s]").tolist()
+        )
+        # Locked until commit, so concurrent resends of a batch merge one after the other
+        stored = decode_track(connection.execute(select(tracks.c.fixes).where(key).with_for_update()).scalar_one())
+        new = ~np.isin(times, stored["timestamp"])
+        # A device records at most one fix per second
+        new[1:] &= times[1:] != times[:-1]
+        if not new.any():
+            return new, b""
+
+        columns = {
+            "timestamp": np.concatenate([stored["timestamp"], times[new]]),
+            "latitude": np.concatenate([stored["latitude"], latitudes[new]]),
+            "longitude": np.concatenate([stored["longitude"], longitudes[new]]),
+            "accuracy": np.concatenate([stored["accuracy"], accuracies[new]])
+        }
+        order = np.argsort(columns["timestamp"], kind="stable")
+        columns = {name: values[order] for name, values in columns.items()}
+        data = encode_track(columns["timestamp"], columns["latitude"], columns["longitude"], columns["accuracy"])
+        connection.execute(
+            tracks.update().where(key).values(
+                end=columns["timestamp"][-1].astype("datetime64[s]").tolist(),
+                count=len(order),
+                fixes=data
+            )
+        )
+        return new, data
+
+    def history(self, connection: Connection, user_id: int, start: datetime, end: datetime) -> Dict[str, np.ndarray]:
+        """Fixes of a user between start and end, oldest first, as decode_track columns"""
+        tracks = self.tracks
+        rows = connection.execute(
+            select(tracks.c.fixes)
+            .where(and_(tracks.c.user_id == user_id, tracks.c.start <= end, tracks.c.end >= start))
+            .order_by(tracks.c.start)
+        ).scalars().all()
+        decoded = [decode_track(data) for data in rows]
+        if not decoded:
+            return {name: np.empty(0) for name in ("timestamp", "latitude", "longitude", "accuracy")}
+        columns = {name: np.concatenate([track[name] for track in decoded]) for name in decoded[0]}
+        window = _epoch(start), _epoch(end)
+        keep = (columns["timestamp"] >= window[0]) & (columns["timestamp"] <= window[1])
+        # Uploads of several devices may interleave
+        order = np.argsort(columns["timestamp"][keep], kind="stable")
+        return {name: values[keep][order] for name, values in columns.items()}
+
+    def history_json(self, user_id: int, columns: Dict[str, np.ndarray], columnar: bool) -> bytes:
+        """history() columns as points, or as parallel arrays with epoch-millisecond timestamps"""
+        accuracy = [None if np.isnan(value) else value for value in columns["accuracy"].tolist()]
+        if columnar:
+            return dumps({
+                "user_id": user_id,
+                "timestamps": (columns["timestamp"] * 1000).tolist(),
+                "latitudes": columns["latitude"].tolist(),
+                "longitudes": columns["longitude"].tolist(),
+                "accuracies": accuracy
+            })
+        return dumps({"user_id": user_id, "fixes": [
+            {"timestamp": timestamp, "latitude": latitude, "longitude": longitude, "accuracy": meters}
+            for timestamp, latitude, longitude, meters in zip(
+                columns["timestamp"].astype("datetime64[s]").tolist(),
+                columns["latitude"].tolist(), columns["longitude"].tolist(), accuracy
+            )
+        ]})
+
+
+def _encode_varints(values: np.ndarray) -> bytes:
+    # One row of 7-bit groups per value, least significant first
+    shifts = np.arange(MAX_VARINT_BYTES, dtype=np.uint64) * np.uint64(7)
+    groups = ((values[:, None] >> shifts) & np.uint64(0x7F)).astype(np.uint8)
+    lengths = np.maximum(1, MAX_VARINT_BYTES - np.argmax(groups[:, ::-1] != 0, axis=1))
+    lengths[~groups.any(axis=1)] = 1
+    positions = np.arange(MAX_VARINT_BYTES)
+    groups[positions < (lengths - 1)[:, None]] |= 0x80
+    return groups[positions < lengths[:, None]].tobytes()
+
+
+def _decode_varints(data: bytes) -> np.ndarray:
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if not raw.size:
+        return np.empty(0, dtype=np.uint64)
+    last = (raw & 0x80) == 0
+    starts = np.flatnonzero(np.concatenate([[True], last[:-1]]))
+    value_index = np.cumsum(np.concatenate([[0], last[:-1]]))
+    shifts = (np.arange(raw.size) - starts[value_index]).astype(np.uint64) * np.uint64(7)
+    return np.add.reduceat((raw & 0x7F).astype(np.uint64) << shifts, starts)
+
+
+def _epoch(timestamp: datetime) -> int:
+    return int(np.datetime64(naive_utc(timestamp), "s").astype(np.int64))
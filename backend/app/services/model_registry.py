@@ -0,0 +1,117 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, NamedTuple, Optional
+import joblib
+
+logger = logging.getLogger(__name__)
+
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", "./model_artifacts")
+
+# Seconds between checks of the CURRENT pointer for a newly published version
+DEFAULT_REFRESH_INTERVAL = 30.0
+
+ARTIFACTS = ("genetic_risk_model", "lifestyle_model", "scaler")
+
+
+class ModelBundle(NamedTuple):
+    version: str
+    genetic_risk_model: Any
+    lifestyle_model: Any
+    scaler: Any
+    metadata: Dict
+
+
+class ModelRegistry:
+    """Versioned, memory-mapped RecommendationEngine models.
+
+    Layout under ``root``::
+
+        versions/<version>/<artifact>.joblib   uncompressed joblib pickles
+        versions/<version>/metadata.json
+        CURRENT                                name of the live version
+
+    Artifacts are loaded with ``mmap_mode="r"``, so their NumPy arrays stay
+    in the page cache and are shared by every worker process instead of
+    being copied into each one. A published version is swapped in by
+    replacing the bundle reference, so readers always see a complete set.
+    """
+
+    def __init__(self, root: str = MODEL_REGISTRY_DIR, refresh_interval: float = DEFAULT_REFRESH_INTERVAL):
+        self.root = root
+        self.refresh_interval = refresh_interval
+        self._bundle: Optional[ModelBundle] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def publish(self, models: Dict[str, Any], metadata: Optional[Dict] = None) -> str:
+        """Persist a trained model set as a new version and make it current"""
+        version = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        versions = os.path.join(self.root, "versions")
+        staging = os.path.join(versions, f".{version}.tmp")
+        os.makedirs(staging)
+
+        for name in ARTIFACTS:
+            # Uncompressed so the arrays can be memory-mapped on load
+            joblib.dump(models[name], os.path.join(staging, f"{name}.joblib"))
+        with open(os.path.join(staging, "metadata.json"), "w") as f:
+            json.dump(dict(metadata or {}, version=version), f)
+
+        os.rename(staging, os.path.join(versions, version))
+        pointer = os.path.join(self.root, "CURRENT.tmp")
+        with open(pointer, "w") as f:
+            f.write(version)
+        os.replace(pointer, os.path.join(self.root, "CURRENT"))
+
+        logger.info("Published recommendation models %s", version)
+        return version
+
+    def current(self) -> Optional[ModelBundle]:
+        """The live model bundle, reloaded when a new version is published"""
+        now = time.monotonic()
+        if self._bundle is not None and now - self._checked_at < self.refresh_interval:
+            return self._bundle
+
+        with self._lock:
+            if self._bundle is None or now - self._checked_at >= self.refresh_interval:
+                self._checked_at = now
+                version = self.current_version()
+                if version is not None and (self._bundle is None or self._bundle.version != version):
+                    self._bundle = self.load(version)
+        return self._bundle
+
+    def current_version(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, "CURRENT")) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def load(self, version: str) -> ModelBundle:
+        directory = os.path.join(self.root, "versions", version)
+        models = {
+            name: joblib.load(os.path.join(directory, f"{name}.joblib"), mmap_mode="r")
+            for name in ARTIFACTS
+        }
+        with open(os.path.join(directory, "metadata.json")) as f:
+            metadata = json.load(f)
+
+        logger.info("Loaded recommendation models %s", version)
+        return ModelBundle(version=version, metadata=metadata, **models)
+
+    def prune(self, keep: int = 3):
+        """Delete all but the newest ``keep`` versions, never the current one"""
+        versions = os.path.join(self.root, "versions")
+        current = self.current_version()
+        names = sorted(name for name in os.listdir(versions) if not name.startswith("."))
+        for name in names[:-keep]:
+            if name != current:
+                shutil.rmtree(os.path.join(versions, name))
+
+
+# One registry per worker process; models are loaded on first use
+model_registry = ModelRegistry()
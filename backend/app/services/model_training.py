@@ -0,0 +1,119 @@
+"""Offline training of the RecommendationEngine models.
+
+    python -m app.services.model_training --data training.csv
+    python -m app.services.model_training --synthetic 20000
+
+The CSV holds one column per genetic marker flag and per lifestyle feature,
+plus ``genetic_risk`` and ``lifestyle_risk`` 0/1 labels. The trained models
+are published to the model registry as a new version.
+"""
+import argparse
+import logging
+from typing import Dict, List, Tuple
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+from sklearn.preprocessing import StandardScaler
+from .model_registry import model_registry
+from .recommendation_engine import RecommendationEngine, LIFESTYLE_FEATURES
+
+logger = logging.getLogger(__name__)
+
+
+def train_models(
+    genetic: np.ndarray,
+    lifestyle: np.ndarray,
+    genetic_labels: np.ndarray,
+    lifestyle_labels: np.ndarray
+) -> Dict:
+    """Fit the scaler and both classifiers on feature matrices"""
+    lifestyle = np.where(np.isnan(lifestyle), np.nanmean(lifestyle, axis=0), lifestyle)
+    scaler = StandardScaler().fit(lifestyle)
+
+    genetic_risk_model = RandomForestClassifier(n_estimators=100, random_state=0)
+    genetic_risk_model.fit(genetic, genetic_labels)
+
+    lifestyle_model = GradientBoostingClassifier(random_state=0)
+    lifestyle_model.fit(scaler.transform(lifestyle), lifestyle_labels)
+
+    return {
+        "genetic_risk_model": genetic_risk_model,
+        "lifestyle_model": lifestyle_model,
+        "scaler": scaler
+    }
+
+
+def synthetic_training_set(
+    n: int, genetic_features: int, seed: int = 0
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Random but learnable feature matrices, for bootstrapping and benchmarks"""
+    rng = np.random.default_rng(seed)
+    genetic = (rng.random((n, genetic_features)) < 0.08).astype(float)
+    lifestyle = np.column_stack([
+        rng.uniform(18, 90, n),                  # age
+        rng.normal(26, 5, n),                    # bmi
+        rng.gamma(4, 2000, n),                   # daily_steps
+        rng.gamma(2, 60, n),                     # exercise_minutes_per_week
+        rng.normal(7, 1.2, n),                   # sleep_hours
+        rng.normal(68, 10, n),                   # resting_heart_rate
+        rng.normal(125, 15, n),                  # systolic_bp
+        rng.integers(1, 11, n).astype(float),    # stress_level
+        rng.gamma(1.5, 4, n),                    # alcohol_units_per_week
+        (rng.random(n) < 0.15).astype(float),    # smoker
+    ])
+
+    weights = rng.uniform(0.5, 2.0, genetic_features)
+    genetic_labels = (genetic @ weights + rng.normal(0, 0.5, n) > 1.0).astype(int)
+    score = (
+        0.04 * (lifestyle[:, 0] - 50) + 0.1 * (lifestyle[:, 1] - 26)
+        - 0.0002 * (lifestyle[:, 2] - 8000) + 0.03 * (lifestyle[:, 6] - 125)
+        + 0.2 * (lifestyle[:, 7] - 5) + 1.5 * lifestyle[:, 9]
+    )
+    lifestyle_labels = (score + rng.normal(0, 1, n) > 0).astype(int)
+    return genetic, lifestyle, genetic_labels, lifestyle_labels
+
+
+def load_training_csv(
+    path: str, genetic_features: List[str]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Feature matrices and labels of a training CSV, in train_models order"""
+    frame = pd.read_csv(path)
+    return (
+        frame[genetic_features].to_numpy(dtype=float),
+        frame[LIFESTYLE_FEATURES].to_numpy(dtype=float),
+        frame["genetic_risk"].to_numpy(),
+        frame["lifestyle_risk"].to_numpy()
+    )
+
+
+def publish_models(models: Dict, samples: int, genetic_features: List[str], source: str) -> str:
+    return model_registry.publish(models, {
+        "samples": samples,
+        "genetic_features": genetic_features,
+        "lifestyle_features": LIFESTYLE_FEATURES,
+        "source": source
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--data", help="CSV of features and labels")
+    source.add_argument("--synthetic", type=int, help="train on N synthetic users")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    genetic_features = RecommendationEngine().genetic_features
+    if args.data:
+        genetic, lifestyle, genetic_labels, lifestyle_labels = load_training_csv(args.data, genetic_features)
+    else:
+        genetic, lifestyle, genetic_labels, lifestyle_labels = synthetic_training_set(
+            args.synthetic, len(genetic_features)
+        )
+
+    models = train_models(genetic, lifestyle, genetic_labels, lifestyle_labels)
+    print(publish_models(models, len(genetic), genetic_features, args.data or "synthetic"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import and_, select
+from sqlalchemy.engine import Connection
+from ..models.health_data import HealthData
+from .timeseries_store import EPOCH, _to_datetimes, _to_epochs
+
+RECENT_WINDOW_DAYS = int(os.getenv("RECENT_WINDOW_DAYS", "7"))
+RECENT_CACHE_MAX_MB = float(os.getenv("RECENT_CACHE_MAX_MB", "64"))
+# Entries are reloaded after this long: other workers' writes reach the database only
+RECENT_CACHE_TTL = float(os.getenv("RECENT_CACHE_TTL", "60"))
+# Per user and metric: two weeks of one sample a minute
+MAX_SAMPLES_PER_METRIC = int(os.getenv("RECENT_MAX_SAMPLES_PER_METRIC", "20160"))
+MIN_CAPACITY = 64
+
+
+class MetricRing:
+    """Time-ordered (epoch seconds, float32 value) samples of one metric in a ring buffer.
+
+    The buffer grows by doubling up to ``max_capacity``; past that the
+    oldest samples are overwritten.
+    """
+
+    __slots__ = ("times", "values", "start", "size", "max_capacity")
+
+    def __init__(self, capacity: int = MIN_CAPACITY, max_capacity: int = MAX_SAMPLES_PER_METRIC):
+        self.max_capacity = max_capacity
+        capacity = min(max(capacity, MIN_CAPACITY), max_capacity)
+        self.times = np.empty(capacity, dtype=np.int64)
+        self.values = np.empty(capacity, dtype=np.float32)
+        self.start = 0
+        self.size = 0
+
+    @classmethod
+    def from_arrays(cls, times: np.ndarray, values: np.ndarray, max_capacity: int = MAX_SAMPLES_PER_METRIC):
+        ring = cls(len(times), max_capacity)
+        ring.extend(times, values)
+        return ring
+
+    @property
+    def capacity(self) -> int:
+        return self.times.size
+
+    @property
+    def nbytes(self) -> int:
+        return self.times.nbytes + self.values.nbytes
+
+    @property
+    def last_time(self) -> Optional[int]:
+        if not self.size:
+            return None
+        return int(self.times[(self.start + self.size - 1) % self.capacity])
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Samples in time order: views, unless the buffer has wrapped"""
+        end = self.start + self.size
+        if end <= self.capacity:
+            return self.times[self.start:end], self.values[self.start:end]
+        end -= self.capacity
+        return (
+            np.concatenate((self.times[self.start:], self.times[:end])),
+            np.concatenate((self.values[self.start:], self.values[:end]))
+        )
+
+    def extend(self, times: np.ndarray, values: np.ndarray):
+        """Append samples sorted by time, none older than the last one held"""
+        count = len(times)
+        if not count:
+            return
+        if self.size + count > self.capacity and self.capacity < self.max_capacity:
+            self._resize(min(self.max_capacity, max(self.size + count, 2 * self.capacity)))
+        if count >= self.capacity:
+            times, values = times[-self.capacity:], values[-self.capacity:]
+            count, self.start, self.size = self.capacity, 0, 0
+
+        positions = (self.start + self.size + np.arange(count)) % self.capacity
+        self.times[positions] = times
+        self.values[positions] = values
+        overwritten = max(0, self.size + count - self.capacity)
+        self.start = (self.start + overwritten) % self.capacity
+        self.size = min(self.capacity, self.size + count)
+
+    def merge(self, times: np.ndarray, values: np.ndarray):
+        """Add samples sorted by time, possibly older than the ones held"""
+        if not len(times):
+            return
+        if not self.size or times[0] >= self.last_time:
+            self.extend(times, values)
+            return
+        held_times, held_values = self.arrays()
+        merged_times = np.concatenate((held_times, times))
+        order = np.argsort(merged_times, kind="stable")
+        merged_values = np.concatenate((held_values, values))[order]
+        self.start = self.size = 0
+        self.extend(merged_times[order], merged_values)
+
+    def drop_before(self, cutoff: int):
+        if not self.size or self.times[self.start] >= cutoff:
+            return
+        times, _ = self.arrays()
+        dropped = int(np.searchsorted(times, cutoff))
+        if dropped:
+            self.start = (self.start + dropped) % self.capacity
+            self.size -= dropped
+
+    def _resize(self, capacity: int):
+        times, values = self.arrays()
+        self.times = np.empty(capacity, dtype=np.int64)
+        self.values = np.empty(capacity, dtype=np.float32)
+        self.times[:self.size] = times
+        self.values[:self.size] = values
+        self.start = 0
+
+
+class UserWindow:
+    """Recent samples of one user, a MetricRing per metric"""
+
+    __slots__ = ("metrics", "loaded_at")
+
+    def __init__(self, metrics: Dict[str, MetricRing], loaded_at: float):
+        self.metrics = metrics
+        self.loaded_at = loaded_at
+
+    @property
+    def nbytes(self) -> int:
+        return sum(ring.nbytes for ring in self.metrics.values())
+
+
+class RecentMetricsCache:
+    """Per-process cache of the last ``window`` of every metric of recently read users.
+
+    A user's window is loaded from health_data on first read (only the
+    timestamp and value columns, straight into NumPy arrays) and then kept
+    current by ingestion in this process. Entries are reloaded after
+    ``ttl`` seconds, which bounds how stale writes made by other workers
+    can be, and users are evicted least recently used first once the
+    buffers exceed ``max_bytes``.
+
+    Methods are called from compute threads; a lock guards the entries.
+    Reads that miss query the database outside the lock.
+    """
+
+    def __init__(
+        self,
+        window_days: int = RECENT_WINDOW_DAYS,
+        max_bytes: int = int(RECENT_CACHE_MAX_MB * 1024 * 1024),
+        ttl: float = RECENT_CACHE_TTL,
+        max_samples: int = MAX_SAMPLES_PER_METRIC
+    ):
+        self.window = window_days * 86400
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_samples = max_samples
+        self.table = HealthData.__table__
+        self._users: "OrderedDict[int, UserWindow]" = OrderedDict()
+        # Loads in flight; a write meanwhile clears the token so the load is not stored
+        self._loading: Dict[int, Optional[object]] = {}
+        self._lock = threading.Lock()
+        self.nbytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def lookup(self, connection: Connection, user_id: int) -> UserWindow:
+        """The user's window, loaded from the database when not cached or expired"""
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and time.monotonic() - entry.loaded_at < self.ttl:
+                self._users.move_to_end(user_id)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            token = object()
+            self._loading[user_id] = token
+
+        entry = self._load(connection, user_id)
+        with self._lock:
+            current = self._loading.get(user_id)
+            if current is token:
+                del self._loading[user_id]
+                self._store(user_id, entry)
+            elif current is None:
+                # Written to while loading; the next read loads again
+                self._loading.pop(user_id, None)
+        return entry
+
+    def record(self, user_id: int, rows: Iterable[Dict]):
+        """Add newly written health_data rows to the user's window, if cached"""
+        with self._lock:
+            if user_id in self._loading:
+                self._loading[user_id] = None
+            entry = self._users.get(user_id)
+            if entry is None:
+                return
+
+            columns: Dict[str, Tuple[List, List]] = {}
+            for row in rows:
+                timestamps, values = columns.setdefault(row["data_type"], ([], []))
+                timestamps.append(row["timestamp"])
+                values.append(row["value"])
+
+            cutoff = self._cutoff()
+            before = entry.nbytes
+            for data_type, (timestamps, values) in columns.items():
+                times = _to_epochs(timestamps)
+                order = np.argsort(times, kind="stable")
+                times = times[order]
+                keep = times >= cutoff
+                ring = entry.metrics.get(data_type)
+                if ring is None:
+                    ring = entry.metrics[data_type] = MetricRing(int(keep.sum()), self.max_samples)
+                ring.merge(times[keep], np.asarray(values, dtype=np.float32)[order][keep])
+                ring.drop_before(cutoff)
+            self.nbytes += entry.nbytes - before
+            self._evict()
+
+    def invalidate(self, user_id: int):
+        """Drop the user's window, e.g. after samples were deleted or rewritten"""
+        with self._lock:
+            if user_id in self._loading:
+                self._loading[user_id] = None
+            entry = self._users.pop(user_id, None)
+            if entry is not None:
+                self.nbytes -= entry.nbytes
+                self.invalidations += 1
+
+    def window_stats(
+        self,
+        connection: Connection,
+        user_id: int,
+        seconds: Optional[int] = None,
+        data_types: Optional[List[str]] = None,
+        now: Optional[float] = None
+    ) -> Dict[str, Dict]:
+        """count/mean/min/max/stddev/last of each metric over the last ``seconds`` (the whole window by default).
+
+        The samples of every metric are concatenated and reduced in one
+        pass with reduceat; metrics without samples in the range are left out.
+        """
+        entry = self.lookup(connection, user_id)
+        cutoff = (now if now is not None else time.time()) - min(seconds or self.window, self.window)
+        names, last_epochs, values = [], [], []
+        with self._lock:
+            for data_type, ring in entry.metrics.items():
+                if data_types is not None and data_type not in data_types:
+                    continue
+                ring_times, ring_values = ring.arrays()
+                first = int(np.searchsorted(ring_times, cutoff))
+                if first < ring.size:
+                    names.append(data_type)
+                    # Copies: the arrays are reduced outside the lock
+                    last_epochs.append(ring_times[-1])
+                    values.append(np.array(ring_values[first:], dtype=np.float64))
+
+        if not names:
+            return {}
+        counts = np.array([len(chunk) for chunk in values])
+        starts = np.r_[0, np.cumsum(counts)[:-1]]
+        merged = np.concatenate(values)
+        mean = np.add.reduceat(merged, starts) / counts
+        variance = np.maximum(np.add.reduceat(merged * merged, starts) / counts - mean * mean, 0.0)
+        last = merged[starts + counts - 1]
+        return {
+            name: {
+                "count": n,
+                "mean": m,
+                "min": lo,
+                "max": hi,
+                "stddev": sd,
+                "last": value,
+                "last_timestamp": timestamp
+            }
+            for name, n, m, lo, hi, sd, value, timestamp in zip(
+                names, counts.tolist(), mean.tolist(), np.minimum.reduceat(merged, starts).tolist(),
+                np.maximum.reduceat(merged, starts).tolist(), np.sqrt(variance).tolist(), last.tolist(),
+                _to_datetimes(np.array(last_epochs))
+            )
+        }
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self._users),
+            "bytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+    def _load(self, connection: Connection, user_id: int) -> UserWindow:
+        table = self.table
+        cutoff = self._cutoff()
+        rows = connection.execute(
+            select(table.c.data_type, table.c.timestamp, table.c.value)
+            .where(and_(table.c.user_id == user_id, table.c.timestamp >= EPOCH.utcfromtimestamp(cutoff)))
+            .order_by(table.c.data_type, table.c.timestamp)
+        ).all()
+
+        metrics = {}
+        if rows:
+            data_types = [row[0] for row in rows]
+            times = _to_epochs([row[1] for row in rows])
+            values = np.array([row[2] for row in rows], dtype=np.float32)
+            bounds = [0] + [i for i in range(1, len(rows)) if data_types[i] != data_types[i - 1]] + [len(rows)]
+            for first, end in zip(bounds, bounds[1:]):
+                metrics[data_types[first]] = MetricRing.from_arrays(
+                    times[first:end], values[first:end], self.max_samples
+                )
+        return UserWindow(metrics, time.monotonic())
+
+    def _store(self, user_id: int, entry: UserWindow):
+        previous = self._users.pop(user_id, None)
+        if previous is not None:
+            self.nbytes -= previous.nbytes
+        self._users[user_id] = entry
+        self.nbytes += entry.nbytes
+        self._evict()
+
+    def _evict(self):
+        # The most recently used user is kept even if it alone exceeds the budget
+        while self.nbytes > self.max_bytes and len(self._users) > 1:
+            _, entry = self._users.popitem(last=False)
+            self.nbytes -= entry.nbytes
+            self.evictions += 1
+
+    def _cutoff(self) -> int:
+        return int(time.time()) - self.window
+
+
+recent_metrics_cache = RecentMetricsCache()
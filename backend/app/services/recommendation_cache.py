@@ -0,0 +1,229 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional
+
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import RedisError
+except ImportError:  # Redis tier is optional
+    aioredis = None
+    RedisError = ()  # no Redis client to fail
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL")
+# Seconds before a Redis call is given up on and the local tier used alone
+REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", "0.5"))
+
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_TTL = 15 * 60
+# How long past expiry an entry may still be served while it is recomputed
+DEFAULT_STALE_TTL = 24 * 60 * 60
+
+
+class CacheEntry(NamedTuple):
+    fingerprint: str
+    generation: int
+    value: Dict
+    fresh_until: float
+    stale_until: float
+
+
+def fingerprint(user_data: Dict) -> str:
+    """Stable hash of recommendation inputs, independent of dict ordering"""
+    encoded = json.dumps(user_data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class RecommendationCache:
+    """Two-tier cache of generated recommendations, one entry per user.
+
+    Entries are served while the fingerprint of the user's inputs matches
+    and the TTL has not passed. A stale entry (expired, invalidated by new
+    health data, or computed from older inputs) is still returned during
+    the stale window while a single background task recomputes it.
+
+    The local tier is an LRU dict. When a Redis URL is configured, entries
+    are also shared through Redis, and a per-user generation counter there
+    lets an invalidation in one worker reach every worker's local tier.
+    Redis failing or timing out degrades to the local tier: a lookup
+    becomes a local hit or a miss, never an error.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl: float = DEFAULT_TTL,
+        stale_ttl: float = DEFAULT_STALE_TTL,
+        redis_url: Optional[str] = REDIS_URL,
+        redis_client=None
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._local: "OrderedDict[int, CacheEntry]" = OrderedDict()
+        self._generations: Dict[int, int] = {}
+        self._refreshing: Dict[int, asyncio.Task] = {}
+        self.redis = redis_client
+        if self.redis is None and redis_url and aioredis is not None:
+            self.redis = aioredis.from_url(
+                redis_url, socket_timeout=REDIS_TIMEOUT, socket_connect_timeout=REDIS_TIMEOUT
+            )
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.redis_errors = 0
+
+    async def get_or_compute(
+        self,
+        user_id: int,
+        user_data: Dict,
+        compute: Callable[[], Awaitable[Dict]]
+    ) -> Dict:
+        """Cached recommendations for ``user_data``, computing them if needed"""
+        key = fingerprint(user_data)
+        generation = await self._generation(user_id)
+        now = time.time()
+
+        entry = self._local.get(user_id)
+        if entry is not None:
+            self._local.move_to_end(user_id)
+        if not _is_fresh(entry, key, generation, now) and self.redis is not None:
+            # Another worker may already have recomputed it
+            shared = await self._get_shared(user_id)
+            if shared is not None:
+                entry = shared
+                self._put_local(user_id, entry)
+
+        if entry is not None and now < entry.stale_until:
+            if _is_fresh(entry, key, generation, now):
+                self.hits += 1
+                return entry.value
+
+            self.stale_hits += 1
+            if user_id not in self._refreshing:
+                self._refreshing[user_id] = asyncio.create_task(
+                    self._revalidate(user_id, key, generation, compute)
+                )
+            return entry.value
+
+        self.misses += 1
+        return await self._refresh(user_id, key, generation, compute)
+
+    async def put(self, user_id: int, user_data: Dict, value: Dict):
+        """Store recommendations computed elsewhere for ``user_data``, e.g. by a warm-up job"""
+        async def computed() -> Dict:
+            return value
+
+        await self._refresh(user_id, fingerprint(user_data), await self._generation(user_id), computed)
+
+    async def invalidate(self, user_id: int):
+        """Mark a user's entry stale, e.g. after new health data arrives"""
+        self.invalidations += 1
+        if self.redis is not None:
+            try:
+                self._generations[user_id] = await self.redis.incr(_generation_key(user_id))
+                return
+            except RedisError:
+                # Other workers keep serving their entry until it expires
+                self._redis_failed("invalidate", user_id)
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "redis_errors": self.redis_errors,
+            "entries": len(self._local),
+            "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0.0
+        }
+
+    async def _refresh(
+        self, user_id: int, key: str, generation: int, compute: Callable[[], Awaitable[Dict]]
+    ) -> Dict:
+        value = await compute()
+        now = time.time()
+        entry = CacheEntry(key, generation, value, now + self.ttl, now + self.ttl + self.stale_ttl)
+        self._put_local(user_id, entry)
+        if self.redis is not None:
+            try:
+                await self.redis.set(
+                    _entry_key(user_id), json.dumps(entry._asdict()),
+                    ex=int(self.ttl + self.stale_ttl)
+                )
+            except RedisError:
+                self._redis_failed("store", user_id)
+        return value
+
+    async def _revalidate(
+        self, user_id: int, key: str, generation: int, compute: Callable[[], Awaitable[Dict]]
+    ):
+        try:
+            await self._refresh(user_id, key, generation, compute)
+        except Exception:
+            # The stale entry keeps being served until a refresh succeeds
+            logger.exception("Revalidating recommendations for user %s failed", user_id)
+        finally:
+            self._refreshing.pop(user_id, None)
+
+    async def _get_shared(self, user_id: int) -> Optional[CacheEntry]:
+        try:
+            raw = await self.redis.get(_entry_key(user_id))
+        except RedisError:
+            self._redis_failed("read", user_id)
+            return None
+        if raw is None:
+            return None
+        return CacheEntry(**json.loads(raw))
+
+    async def _generation(self, user_id: int) -> int:
+        if self.redis is None:
+            return self._generations.get(user_id, 0)
+        try:
+            generation = await self.redis.get(_generation_key(user_id))
+        except RedisError:
+            # The last generation this worker saw
+            self._redis_failed("read the generation of", user_id)
+            return self._generations.get(user_id, 0)
+        self._generations[user_id] = int(generation) if generation is not None else 0
+        return self._generations[user_id]
+
+    def _redis_failed(self, action: str, user_id: int):
+        self.redis_errors += 1
+        logger.warning(
+            "Redis unavailable, could not %s the recommendations of user %s", action, user_id, exc_info=True
+        )
+
+    def _put_local(self, user_id: int, entry: CacheEntry):
+        self._local[user_id] = entry
+        self._local.move_to_end(user_id)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+
+def _is_fresh(entry: Optional[CacheEntry], key: str, generation: int, now: float) -> bool:
+    return (
+        entry is not None and entry.fingerprint == key
+        and entry.generation == generation and now < entry.fresh_until
+    )
+
+
+def _entry_key(user_id: int) -> str:
+    return f"recommendations:{user_id}"
+
+
+def _generation_key(user_id: int) -> str:
+    return f"recommendations:{user_id}:generation"
+
+
+recommendation_cache = RecommendationCache()
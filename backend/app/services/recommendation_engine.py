@@ -1,10 +1,43 @@
-from typing import List, Dict, Optional
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
-from sklearn.preprocessing import StandardScaler
+import os
+from typing import TYPE_CHECKING, Callable, List, Dict, Mapping, Optional
 import numpy as np
 from datetime import datetime, timedelta
-import pandas as pd
 from enum import Enum
+from ..metrics import STAGE_TIMERS
+from .genetic_index import GeneticMarkerIndex, load_marker_table
+from .model_registry import model_registry, ModelRegistry
+
+if TYPE_CHECKING:
+    # Only batch callers build frames; inference workers never import pandas
+    import pandas as pd
+
+GENETIC_MARKERS_PATH = os.getenv(
+    "GENETIC_MARKERS_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "data", "genetic_markers.json")
+)
+
+# Lifestyle model inputs, in column order
+LIFESTYLE_FEATURES = [
+    "age", "bmi", "daily_steps", "exercise_minutes_per_week", "sleep_hours",
+    "resting_heart_rate", "systolic_bp", "stress_level",
+    "alcohol_units_per_week", "smoker"
+]
+
+# Compiled marker indexes by data file, shared by every engine in the process
+_genetic_indexes: Dict[str, GeneticMarkerIndex] = {}
+
+
+def load_genetic_index(
+    path: str,
+    risk_level: Callable[[float], str],
+    recommendations: Callable[[Mapping], List[str]]
+) -> GeneticMarkerIndex:
+    path = os.path.abspath(path)
+    index = _genetic_indexes.get(path)
+    if index is None:
+        index = GeneticMarkerIndex(load_marker_table(path), risk_level, recommendations)
+        _genetic_indexes[path] = index
+    return index
 
 class RiskLevel(Enum):
     LOW = "low"
@@ -13,46 +46,61 @@ class RiskLevel(Enum):
     VERY_HIGH = "very_high"
 
 class RecommendationEngine:
-    def __init__(self):
-        self.genetic_risk_model = RandomForestClassifier()
-        self.lifestyle_model = GradientBoostingClassifier()
-        self.scaler = StandardScaler()
-        
-        # Initialize genetic risk markers database
-        self.genetic_markers = {
-            # Cancer-related genes
-            "BRCA1": {"cancer_types": ["breast", "ovarian"], "risk_factor": 5.0},
-            "BRCA2": {"cancer_types": ["breast", "ovarian", "pancreatic"], "risk_factor": 4.5},
-            "TP53": {"cancer_types": ["multiple"], "risk_factor": 5.0},
-            "MLH1": {"cancer_types": ["colorectal"], "risk_factor": 4.0},
-            "MSH2": {"cancer_types": ["colorectal", "endometrial"], "risk_factor": 4.0},
-            
-            # Cardiovascular genes
-            "APOB": {"condition": "familial_hypercholesterolemia", "risk_factor": 4.0},
-            "LDLR": {"condition": "heart_disease", "risk_factor": 3.5},
-            "PCSK9": {"condition": "cholesterol_disorders", "risk_factor": 3.0},
-            
-            # Neurodegenerative markers
-            "APOE-e4": {"condition": "alzheimers", "risk_factor": 4.5},
-            "PSEN1": {"condition": "early_onset_alzheimers", "risk_factor": 5.0},
-            "MAPT": {"condition": "frontotemporal_dementia", "risk_factor": 4.0},
-            
-            # Metabolic genes
-            "TCF7L2": {"condition": "type2_diabetes", "risk_factor": 3.0},
-            "MC4R": {"condition": "obesity", "risk_factor": 2.5},
-            "FTO": {"condition": "obesity", "risk_factor": 2.0},
-            
-            # Autoimmune markers
-            "HLA-DRB1": {"conditions": ["rheumatoid_arthritis", "multiple_sclerosis"], "risk_factor": 3.5},
-            "CTLA4": {"conditions": ["type1_diabetes", "thyroid_disorders"], "risk_factor": 3.0},
-            
-            # Pharmacogenetic markers
-            "CYP2D6": {"medication_metabolism": "multiple_drugs", "risk_factor": 3.0},
-            "VKORC1": {"medication_metabolism": "warfarin", "risk_factor": 3.0},
-        }
+    def __init__(
+        self,
+        registry: ModelRegistry = model_registry,
+        markers_path: str = GENETIC_MARKERS_PATH
+    ):
+        # Trained models come from the registry, loaded once per worker
+        self.registry = registry
+        
+        # Genetic risk markers, precompiled once per process and marker file
+        self.genetic_index = load_genetic_index(
+            markers_path, self._calculate_risk_level, self._marker_recommendations
+        )
+        self.genetic_markers = self.genetic_index.markers
 
     def generate_recommendations(self, user_data: dict) -> Dict[str, List[dict]]:
         """Generate comprehensive health recommendations based on multiple data sources."""
+        recommendations = self._rule_recommendations(user_data)
+        
+        # Model-based risk scores, once a trained model set is published
+        with STAGE_TIMERS["risk_scores"].time():
+            risk_scores = self._predict_risk_scores(
+                [user_data.get("genetic_data")], [user_data.get("lifestyle_data")]
+            )
+        if risk_scores:
+            recommendations["monitoring"].append(risk_scores[0])
+        
+        return recommendations
+
+    def generate_recommendations_batch(self, users: "pd.DataFrame") -> List[Dict[str, List[dict]]]:
+        """Generate recommendations for many users at once.
+
+        ``users`` has one row per user and the ``user_data`` keys of
+        generate_recommendations as columns. Feature extraction, scaling and
+        model scoring run once over the whole frame; each user's result is
+        identical to generate_recommendations on that row. A cell missing
+        from a row (NaN in the frame) counts as a missing key.
+        """
+        # NaN is truthy, so it would pass for data in the rule passes
+        users = users.astype(object).where(users.notna(), None)
+        with STAGE_TIMERS["risk_scores"].time():
+            risk_scores = self._predict_risk_scores(
+                users["genetic_data"].tolist() if "genetic_data" in users else [None] * len(users),
+                users["lifestyle_data"].tolist() if "lifestyle_data" in users else [None] * len(users)
+            )
+
+        results = []
+        for index, user_data in enumerate(users.to_dict("records")):
+            recommendations = self._rule_recommendations(user_data)
+            if risk_scores:
+                recommendations["monitoring"].append(risk_scores[index])
+            results.append(recommendations)
+        return results
+
+    def _rule_recommendations(self, user_data: dict) -> Dict[str, List[dict]]:
+        """Run the rule-based analysis passes for one user."""
         recommendations = {
             "critical": [],
             "high_priority": [],
@@ -64,53 +112,99 @@ class RecommendationEngine:
         
         # Analyze genetic risks
         if user_data.get("genetic_data"):
-            genetic_risks = self._analyze_genetic_risks(user_data["genetic_data"])
+            with STAGE_TIMERS["genetic"].time():
+                genetic_risks = self._analyze_genetic_risks(user_data["genetic_data"])
             recommendations["genetic"].extend(genetic_risks)
         
         # Analyze lifestyle factors
         if user_data.get("lifestyle_data"):
-            lifestyle_recs = self._analyze_lifestyle(user_data["lifestyle_data"])
+            with STAGE_TIMERS["lifestyle"].time():
+                lifestyle_recs = self._analyze_lifestyle(user_data["lifestyle_data"])
             recommendations["lifestyle"].extend(lifestyle_recs)
         
         # Analyze medical history
         if user_data.get("medical_history"):
-            medical_recs = self._analyze_medical_history(
-                user_data["medical_history"],
-                genetic_risks=recommendations["genetic"]
-            )
+            with STAGE_TIMERS["medical_history"].time():
+                medical_recs = self._analyze_medical_history(
+                    user_data["medical_history"],
+                    genetic_risks=recommendations["genetic"]
+                )
             self._categorize_medical_recommendations(medical_recs, recommendations)
         
         # Analyze environmental factors
         if user_data.get("environmental_data"):
-            env_recs = self._analyze_environmental_factors(user_data["environmental_data"])
+            with STAGE_TIMERS["environmental"].time():
+                env_recs = self._analyze_environmental_factors(user_data["environmental_data"])
             recommendations["preventive"].extend(env_recs)
         
         # Analyze recent health metrics
         if user_data.get("health_metrics"):
-            metric_recs = self._analyze_health_metrics(user_data["health_metrics"])
+            with STAGE_TIMERS["health_metrics"].time():
+                metric_recs = self._analyze_health_metrics(user_data["health_metrics"])
             self._categorize_recommendations(metric_recs, recommendations)
         
         return recommendations
 
+    @property
+    def genetic_features(self) -> List[str]:
+        """Genetic model inputs: one risk-variant flag per known marker"""
+        return list(self.genetic_index.feature_columns)
+
+    def _genetic_features(self, genetic_data: List[Optional[Dict[str, dict]]]) -> np.ndarray:
+        """Risk-variant flags, one row per user and one column per marker."""
+        index = self.genetic_index
+        features = np.zeros((len(genetic_data), len(index)))
+        for row, genes in enumerate(genetic_data):
+            for risk in index.match(genes or {}):
+                features[row, index.feature_columns[risk.gene]] = 1.0
+        return features
+
+    def _lifestyle_features(self, lifestyle_data: List[Optional[dict]]) -> np.ndarray:
+        """Lifestyle inputs, one row per user; missing values are NaN."""
+        rows = [
+            [(data or {}).get(feature) for feature in LIFESTYLE_FEATURES]
+            for data in lifestyle_data
+        ]
+        # None converts to NaN under a float dtype
+        return np.array(rows, dtype=np.float64).reshape(len(lifestyle_data), len(LIFESTYLE_FEATURES))
+
+    def _predict_risk_scores(
+        self,
+        genetic_data: List[Optional[Dict[str, dict]]],
+        lifestyle_data: List[Optional[dict]]
+    ) -> Optional[List[dict]]:
+        """Score genetic and lifestyle risk for a batch of users in one call per model."""
+        models = self.registry.current()
+        if models is None:
+            return None
+
+        genetic = self._genetic_features(genetic_data)
+        lifestyle = self._lifestyle_features(lifestyle_data)
+        # Missing inputs are imputed with the training means
+        lifestyle = np.where(np.isnan(lifestyle), models.scaler.mean_, lifestyle)
+
+        genetic_risk = models.genetic_risk_model.predict_proba(genetic)[:, 1].tolist()
+        lifestyle_risk = models.lifestyle_model.predict_proba(
+            models.scaler.transform(lifestyle)
+        )[:, 1].tolist()
+
+        return [
+            {
+                "type": "risk_scores",
+                "model_version": models.version,
+                "genetic_risk": genetic_score,
+                "lifestyle_risk": lifestyle_score
+            }
+            for genetic_score, lifestyle_score in zip(genetic_risk, lifestyle_risk)
+        ]
+
+    def _is_risk_variant(self, gene: str, variant: Optional[str]) -> bool:
+        """Whether a reported variant of a known marker gene carries risk."""
+        return self.genetic_index.is_risk_variant(gene, variant)
+
     def _analyze_genetic_risks(self, genetic_data: Dict[str, dict]) -> List[dict]:
         """Analyze genetic markers for health risks and recommendations."""
-        risks = []
-        
-        for gene, data in genetic_data.items():
-            if gene in self.genetic_markers:
-                marker_info = self.genetic_markers[gene]
-                variant = data.get("variant")
-                
-                if self._is_risk_variant(gene, variant):
-                    risk = {
-                        "gene": gene,
-                        "risk_level": self._calculate_risk_level(marker_info["risk_factor"]),
-                        "conditions": marker_info.get("cancer_types") or [marker_info.get("condition")],
-                        "recommendations": self._get_genetic_recommendations(gene, variant)
-                    }
-                    risks.append(risk)
-        
-        return risks
+        return [risk.to_dict() for risk in self.genetic_index.match(genetic_data)]
 
     def _analyze_lifestyle(self, lifestyle_data: dict) -> List[dict]:
         """Analyze lifestyle factors and generate recommendations."""
@@ -190,28 +284,181 @@ class RecommendationEngine:
 
     def _get_genetic_recommendations(self, gene: str, variant: str) -> List[str]:
         """Get specific recommendations based on genetic variants."""
+        risk = self.genetic_index.risk(gene)
+        return list(risk.recommendations) if risk else []
+
+    def _marker_recommendations(self, marker: Mapping) -> List[str]:
+        """Recommendations for one marker table entry, compiled into the index."""
         recommendations = []
         
-        if gene in self.genetic_markers:
-            marker = self.genetic_markers[gene]
-            
-            # Cancer prevention recommendations
-            if "cancer_types" in marker:
-                for cancer_type in marker["cancer_types"]:
-                    recommendations.extend(self._get_cancer_prevention_recs(cancer_type))
-            
-            # Cardiovascular recommendations
-            if marker.get("condition") in ["heart_disease", "familial_hypercholesterolemia"]:
-                recommendations.extend(self._get_cardiovascular_recs())
-            
-            # Neurodegenerative recommendations
-            if marker.get("condition") in ["alzheimers", "frontotemporal_dementia"]:
-                recommendations.extend(self._get_neurodegenerative_recs())
-            
-            # Metabolic recommendations
-            if marker.get("condition") in ["type2_diabetes", "obesity"]:
-                recommendations.extend(self._get_metabolic_recs())
+        # Cancer prevention recommendations
+        if "cancer_types" in marker:
+            for cancer_type in marker["cancer_types"]:
+                recommendations.extend(self._get_cancer_prevention_recs(cancer_type))
+        
+        # Cardiovascular recommendations
+        if marker.get("condition") in ["heart_disease", "familial_hypercholesterolemia"]:
+            recommendations.extend(self._get_cardiovascular_recs())
+        
+        # Neurodegenerative recommendations
+        if marker.get("condition") in ["alzheimers", "frontotemporal_dementia"]:
+            recommendations.extend(self._get_neurodegenerative_recs())
+        
+        # Metabolic recommendations
+        if marker.get("condition") in ["type2_diabetes", "obesity"]:
+            recommendations.extend(self._get_metabolic_recs())
         
         return recommendations
 
-    # Additional helper methods would be implemented here...
\ No newline at end of file
+    def _calculate_risk_level(self, risk_factor: float) -> str:
+        """Map a marker's relative risk factor onto a RiskLevel."""
+        if risk_factor >= 4.5:
+            return RiskLevel.VERY_HIGH.value
+        if risk_factor >= 3.5:
+            return RiskLevel.HIGH.value
+        if risk_factor >= 2.5:
+            return RiskLevel.MODERATE.value
+        return RiskLevel.LOW.value
+
+    def _get_cancer_prevention_recs(self, cancer_type: str) -> List[str]:
+        """Screening recommendations for a cancer type; none until a clinically reviewed table exists."""
+        return []
+
+    def _get_cardiovascular_recs(self) -> List[str]:
+        """Cardiovascular recommendations for a risk marker; none until a clinically reviewed table exists."""
+        return []
+
+    def _get_neurodegenerative_recs(self) -> List[str]:
+        """Neurodegenerative recommendations for a risk marker; none until a clinically reviewed table exists."""
+        return []
+
+    def _get_metabolic_recs(self) -> List[str]:
+        """Metabolic recommendations for a risk marker; none until a clinically reviewed table exists."""
+        return []
+
+    def _analyze_physical_activity(self, lifestyle_data: dict) -> List[dict]:
+        recs = []
+        exercise = lifestyle_data.get("exercise_minutes_per_week")
+        if exercise is not None and exercise < 150:
+            recs.append(self._recommendation(
+                "activity", "lifestyle",
+                "Build up to at least 150 minutes of moderate exercise per week"
+            ))
+        steps = lifestyle_data.get("daily_steps")
+        if steps is not None and steps < 5000:
+            recs.append(self._recommendation(
+                "activity", "lifestyle", "Aim for at least 7,000 steps a day"
+            ))
+        return recs
+
+    def _analyze_diet(self, lifestyle_data: dict) -> List[dict]:
+        recs = []
+        servings = lifestyle_data.get("fruit_veg_servings")
+        if servings is not None and servings < 5:
+            recs.append(self._recommendation(
+                "diet", "lifestyle", "Eat at least five servings of fruit and vegetables a day"
+            ))
+        bmi = lifestyle_data.get("bmi")
+        if bmi is not None and bmi >= 30:
+            recs.append(self._recommendation(
+                "diet", "lifestyle", "Talk to a dietitian about a weight management plan"
+            ))
+        return recs
+
+    def _analyze_sleep(self, lifestyle_data: dict) -> List[dict]:
+        hours = lifestyle_data.get("sleep_hours")
+        if hours is None:
+            return []
+        if hours < 7:
+            return [self._recommendation("sleep", "lifestyle", "Aim for 7-9 hours of sleep per night")]
+        if hours > 9:
+            return [self._recommendation(
+                "sleep", "lifestyle", "Regularly sleeping over 9 hours is worth discussing with a doctor"
+            )]
+        return []
+
+    def _analyze_stress_levels(self, lifestyle_data: dict) -> List[dict]:
+        stress = lifestyle_data.get("stress_level")
+        if stress is not None and stress >= 7:
+            return [self._recommendation(
+                "stress", "lifestyle", "Try 10 minutes of daily meditation or breathing exercises"
+            )]
+        return []
+
+    def _analyze_substance_use(self, lifestyle_data: dict) -> List[dict]:
+        recs = []
+        if lifestyle_data.get("smoker"):
+            recs.append(self._recommendation(
+                "substance_use", "lifestyle", "Join a smoking cessation program"
+            ))
+        alcohol = lifestyle_data.get("alcohol_units_per_week")
+        if alcohol is not None and alcohol > 14:
+            recs.append(self._recommendation(
+                "substance_use", "lifestyle", "Keep alcohol under 14 units per week"
+            ))
+        return recs
+
+    def _analyze_chronic_conditions(self, conditions: List[str], genetic_risks: List[dict]) -> List[dict]:
+        """Chronic condition management advice; none until clinically reviewed rules exist."""
+        return []
+
+    def _analyze_medications(self, medications: List, genetic_risks: List[dict]) -> List[dict]:
+        """Drug-gene interaction checks; none until clinically reviewed rules exist."""
+        return []
+
+    def _analyze_family_history(self, family_history: List[str], genetic_risks: List[dict]) -> List[dict]:
+        """Family history screening advice; none until clinically reviewed rules exist."""
+        return []
+
+    def _analyze_environmental_factors(self, environmental_data: dict) -> List[dict]:
+        recs = []
+        aqi = environmental_data.get("air_quality_index")
+        if aqi is not None and aqi > 100:
+            recs.append(self._recommendation(
+                "environment", "preventive", "Limit outdoor exercise while air quality is poor"
+            ))
+        uv = environmental_data.get("uv_index")
+        if uv is not None and uv >= 6:
+            recs.append(self._recommendation(
+                "environment", "preventive", "Use SPF 30+ sunscreen and avoid midday sun"
+            ))
+        noise = environmental_data.get("noise_level")
+        if noise is not None and noise > 85:
+            recs.append(self._recommendation(
+                "environment", "preventive", "Use hearing protection in loud environments"
+            ))
+        return recs
+
+    def _analyze_vital_signs(self, metrics: Dict[str, List[float]]) -> List[dict]:
+        """Vital sign thresholds; none until clinically reviewed ones exist."""
+        return []
+
+    def _analyze_lab_results(self, lab_results: dict) -> List[dict]:
+        """Lab result thresholds; none until clinically reviewed ones exist."""
+        return []
+
+    def _analyze_fitness_metrics(self, fitness_metrics: dict) -> List[dict]:
+        vo2_max = fitness_metrics.get("vo2_max")
+        if vo2_max is not None and vo2_max < 30:
+            return [self._recommendation(
+                "fitness", "preventive", "Add interval training to improve cardiorespiratory fitness"
+            )]
+        return []
+
+    def _categorize_recommendations(self, recs: List[dict], recommendations: Dict[str, List[dict]]):
+        """Route recommendations into result buckets by priority."""
+        buckets = {
+            "critical": "critical",
+            "high": "high_priority",
+            "preventive": "preventive",
+            "lifestyle": "lifestyle",
+        }
+        for rec in recs:
+            recommendations[buckets.get(rec["priority"], "monitoring")].append(rec)
+
+    def _categorize_medical_recommendations(self, recs: List[dict], recommendations: Dict[str, List[dict]]):
+        self._categorize_recommendations(recs, recommendations)
+
+    @staticmethod
+    def _recommendation(category: str, priority: str, message: str) -> dict:
+        return {"category": category, "priority": priority, "message": message}
\ No newline at end of file
@@ -0,0 +1,109 @@
+import json
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import AsyncSessionLocal
+from ..models.rollups import HealthDataDayRollup
+from ..models.user import User
+from .environment_index import EnvironmentIndex, conditions
+from .executors import BoundedExecutor, Coalescer, generate_recommendations, inference_executor
+from .recommendation_cache import RecommendationCache, recommendation_cache
+
+# Days of daily metric means passed to the engine
+METRIC_WINDOW_DAYS = 7
+
+
+class RecommendationService:
+    """Recommendations for one user, served through the recommendation cache.
+
+    Only the engine inputs are read per request, through an AsyncSession
+    on the primary: results are cached under the generation a sync bumps,
+    and inputs read from a lagging replica would be cached as fresh. The
+    engine itself runs on a cache miss or in the background when a stale
+    entry is revalidated, in the inference process pool so it never
+    blocks the event loop.
+    Concurrent requests for one user share a single load and computation,
+    which opens its own session: it outlives any one request, including
+    the first one whose client may disconnect while the others wait.
+    """
+
+    def __init__(
+        self,
+        executor: BoundedExecutor = inference_executor,
+        cache: RecommendationCache = recommendation_cache,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal
+    ):
+        self.executor = executor
+        self.cache = cache
+        self.session_factory = session_factory
+        self.coalescer = Coalescer()
+        self.users = User.__table__
+        self.day_rollup = HealthDataDayRollup.__table__
+        self.environment = EnvironmentIndex()
+
+    async def get_recommendations(self, user_id: int) -> Optional[Dict[str, List[dict]]]:
+        """Cached recommendations of a user, or None if the user does not exist.
+
+        Raises ExecutorSaturated when the inference pool cannot take more work.
+        """
+        return await self.coalescer.run(user_id, lambda: self._get_recommendations(user_id))
+
+    async def _get_recommendations(self, user_id: int) -> Optional[Dict[str, List[dict]]]:
+        async with self.session_factory() as db:
+            user_data = await self.load_inputs(db, user_id)
+        if user_data is None:
+            return None
+
+        def compute():
+            return self.executor.run(generate_recommendations, user_data)
+
+        return await self.cache.get_or_compute(user_id, user_data, compute)
+
+    async def load_inputs(self, db: AsyncSession, user_id: int, now: Optional[datetime] = None) -> Optional[Dict]:
+        """Engine inputs of a user: profile data, recent daily metric means and current conditions"""
+        user = (await db.execute(
+            select(
+                self.users.c.genetic_data,
+                self.users.c.lifestyle_data,
+                self.users.c.medical_history
+            ).where(self.users.c.id == user_id)
+        )).first()
+        if user is None:
+            return None
+
+        now = now or datetime.utcnow()
+        health_metrics = await self._recent_metrics(db, user_id, now)
+        return {
+            "genetic_data": json.loads(user.genetic_data) if user.genetic_data else None,
+            "lifestyle_data": user.lifestyle_data,
+            "medical_history": user.medical_history,
+            "health_metrics": health_metrics,
+            "environmental_data": await self._environmental_data(db, user_id, now, health_metrics)
+        }
+
+    async def _recent_metrics(self, db: AsyncSession, user_id: int, now: datetime) -> Dict[str, List[float]]:
+        rollup = self.day_rollup
+        since = (now - timedelta(days=METRIC_WINDOW_DAYS)).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        rows = await db.execute(
+            select(rollup.c.data_type, rollup.c.sum, rollup.c.count)
+            .where(rollup.c.user_id == user_id, rollup.c.bucket >= since)
+            .order_by(rollup.c.data_type, rollup.c.bucket)
+        )
+
+        metrics: Dict[str, List[float]] = {}
+        for data_type, total, count in rows:
+            metrics.setdefault(data_type, []).append(total / count)
+        return metrics
+
+    async def _environmental_data(
+        self, db: AsyncSession, user_id: int, now: datetime, health_metrics: Dict[str, List[float]]
+    ) -> Optional[Dict[str, float]]:
+        # Place metrics come from the readings of the user's current area;
+        # noise exposure is personal, so it is the user's own latest daily mean
+        environment = conditions(await db.execute(self.environment.conditions_query(user_id, now)))
+        if health_metrics.get("noise_level"):
+            environment["noise_level"] = health_metrics["noise_level"][-1]
+        return environment or None
@@ -0,0 +1,371 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Iterator, List, Dict, Optional, Tuple
+import numpy as np
+from sqlalchemy import select, delete, and_, text
+from sqlalchemy.engine import Connection
+from ..models.health_data import HealthData
+from ..models.rollups import ROLLUP_MODELS
+from .health_archive import HealthArchive
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+
+# Months of health_data partitions kept ahead of the current one
+PARTITION_MONTHS_AHEAD = 3
+
+# Rows fetched per round trip when streaming a range
+STREAM_CHUNK_SIZE = 10000
+
+
+class TimeSeriesStore:
+    """Range reads and rollup maintenance for health_data.
+
+    Minute rollups are rebuilt from raw samples, hour rollups from minutes
+    and day rollups from hours, so a refresh only touches the buckets
+    covering newly written samples and is safe to repeat. Raw sample
+    reads include the archived cold tier.
+    """
+
+    def __init__(self, archive: Optional[HealthArchive] = None):
+        self.raw = HealthData.__table__
+        self.archive = archive or HealthArchive()
+        self.rollups = {width: model.__table__ for width, model in ROLLUP_MODELS.items()}
+
+    def refresh_rollups(
+        self,
+        connection: Connection,
+        user_id: int,
+        spans: Dict[str, Tuple[datetime, datetime]]
+    ):
+        """Recompute every rollup bucket overlapping each (data_type, span).
+
+        On Postgres each (user, data_type) stream is locked for the rest of
+        the transaction before it is read. Concurrent refreshes of a stream,
+        e.g. a watch and a phone sync or an ingest and the refresh_rollups
+        job, share its hour and day buckets. Without the lock the second
+        DELETE would miss the first one's new rows and its INSERT would hit
+        the primary key, or it would rebuild the buckets without the other
+        transaction's samples.
+        """
+        if not spans:
+            return
+        # One catalog lookup for all spans; fresh samples rarely fall in an archived month
+        archived = bool(self.archive.paths(
+            connection, user_id,
+            min(first for first, _ in spans.values()),
+            max(last for _, last in spans.values()) + timedelta(minutes=1)
+        ))
+        # A fixed order, so two transactions never wait on each other's locks
+        for data_type, (first, last) in sorted(spans.items()):
+            if connection.dialect.name == "postgresql":
+                connection.execute(
+                    text("SELECT pg_advisory_xact_lock(:user_id, hashtext(:data_type))"),
+                    {"user_id": user_id, "data_type": data_type}
+                )
+            source, source_width = self.raw, None
+            for width, table in self.rollups.items():
+                start = _floor(first, width)
+                end = _floor(last, width) + timedelta(seconds=width)
+                columns = self._read(connection, source, source_width, user_id, data_type, start, end, archived)
+                buckets = _aggregate(columns, width)
+
+                connection.execute(delete(table).where(and_(
+                    table.c.user_id == user_id,
+                    table.c.data_type == data_type,
+                    table.c.bucket >= start,
+                    table.c.bucket < end
+                )))
+                if buckets["count"].size:
+                    connection.execute(table.insert(), _to_rows(buckets, user_id, data_type))
+
+                source, source_width = table, width
+
+    def query_range(
+        self,
+        connection: Connection,
+        user_id: int,
+        data_type: str,
+        start: datetime,
+        end: datetime,
+        resolution: int
+    ) -> List[Dict]:
+        """Aggregate a metric over [start, end) into buckets of ``resolution`` seconds.
+
+        Reads the coarsest rollup whose bucket width evenly divides the
+        requested resolution, falling back to raw samples below a minute.
+        """
+        width = self.route(resolution)
+        source = self.raw if width is None else self.rollups[width]
+        start = _floor(start, resolution)
+        columns = self._read(connection, source, width, user_id, data_type, start, end)
+        buckets = _aggregate(columns, resolution)
+
+        count = buckets["count"]
+        mean = buckets["sum"] / np.maximum(count, 1)
+        variance = np.maximum(buckets["sum_sq"] / np.maximum(count, 1) - mean ** 2, 0.0)
+        return [
+            {
+                "bucket": bucket,
+                "count": int(n),
+                "mean": float(m),
+                "min": float(lo),
+                "max": float(hi),
+                "stddev": float(sd)
+            }
+            for bucket, n, m, lo, hi, sd in zip(
+                _to_datetimes(buckets["bucket"]), count, mean,
+                buckets["min"], buckets["max"], np.sqrt(variance)
+            )
+        ]
+
+    @staticmethod
+    def route(resolution: int) -> Optional[int]:
+        """Bucket width of the rollup serving ``resolution``, or None for raw"""
+        widths = [width for width in ROLLUP_MODELS if width <= resolution and resolution % width == 0]
+        return max(widths) if widths else None
+
+    def ensure_partitions(self, connection: Connection, now: Optional[datetime] = None) -> List[str]:
+        """Create monthly health_data partitions up to PARTITION_MONTHS_AHEAD (Postgres only).
+
+        Returns the partitions created. A month whose rows already landed
+        in health_data_default cannot get a partition (Postgres refuses
+        one overlapping the default's rows), so it is logged and skipped.
+        """
+        if connection.dialect.name != "postgresql":
+            return []
+        existing = set(connection.execute(text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = 'health_data'::regclass"
+        )).scalars())
+        created = []
+        month = (now or datetime.utcnow()).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        for _ in range(PARTITION_MONTHS_AHEAD + 1):
+            following = (month + timedelta(days=32)).replace(day=1)
+            name = f"health_data_y{month:%Y}m{month:%m}"
+            if name not in existing:
+                stranded = connection.execute(
+                    text(
+                        "SELECT 1 FROM health_data_default "
+                        'WHERE "timestamp" >= :month AND "timestamp" < :following LIMIT 1'
+                    ),
+                    {"month": month, "following": following}
+                ).first()
+                if stranded is not None:
+                    logger.error("Cannot create %s: health_data_default holds rows of that month", name)
+                else:
+                    connection.execute(text(
+                        f"CREATE TABLE {name} "
+                        f"PARTITION OF health_data FOR VALUES FROM ('{month:%Y-%m-%d}') "
+                        f"TO ('{following:%Y-%m-%d}')"
+                    ))
+                    created.append(name)
+            month = following
+        return created
+
+    def downsample(
+        self,
+        connection: Connection,
+        user_id: int,
+        data_type: str,
+        start: datetime,
+        end: datetime,
+        max_points: int
+    ) -> Tuple[int, List[Dict]]:
+        """Min/max/mean buckets of a metric over [start, end), at most ``max_points`` of them.
+
+        Returns the bucket width in seconds and the points.
+        """
+        width, buckets = self.downsample_columns(connection, user_id, data_type, start, end, max_points)
+        if buckets is None:
+            return width, []
+
+        count = buckets["count"]
+        return width, [
+            {"timestamp": timestamp, "value": total / n, "min": lo, "max": hi, "count": int(n)}
+            for timestamp, total, lo, hi, n in zip(
+                _to_datetimes(buckets["bucket"]), buckets["sum"].tolist(),
+                buckets["min"].tolist(), buckets["max"].tolist(), count.tolist()
+            )
+        ]
+
+    def downsample_columns(
+        self,
+        connection: Connection,
+        user_id: int,
+        data_type: str,
+        start: datetime,
+        end: datetime,
+        max_points: int
+    ) -> Tuple[int, Optional[Dict[str, np.ndarray]]]:
+        """downsample() as columnar arrays (bucket epochs, count, sum, sum_sq, min, max).
+
+        Rows are streamed from the finest table that is not finer than the
+        bucket width (raw samples below a minute) and folded into the
+        buckets chunk by chunk, so memory stays bounded by ``max_points``.
+        The width is a multiple of the source rollup's and the buckets are
+        aligned to it, like query_range does, so every rollup row falls in
+        exactly one bucket; the range is widened to whole rollup buckets.
+        The buckets are None when the range holds no data.
+        """
+        span = max(int((end - start).total_seconds()), 1)
+        width = -(-span // max_points)
+        rollup_widths = [rollup for rollup in self.rollups if rollup <= width]
+        source_width = max(rollup_widths) if rollup_widths else None
+        source = self.raw if source_width is None else self.rollups[source_width]
+        if source_width is not None:
+            start = _floor(start, source_width)
+            # Whole rollup buckets over the widened range, still at most max_points of them
+            aligned = -(-int((end - start).total_seconds()) // source_width) * source_width
+            width = -(-aligned // max_points)
+            width = -(-width // source_width) * source_width
+        origin = int((start - EPOCH).total_seconds())
+
+        buckets = None
+        for chunk in self._stream(connection, source, source_width, user_id, data_type, start, end):
+            chunk = _aggregate(chunk, width, origin)
+            if buckets is not None:
+                chunk = _aggregate(
+                    {key: np.concatenate([buckets[key], chunk[key]]) for key in chunk},
+                    width, origin
+                )
+            buckets = chunk
+
+        return width, buckets
+
+    def _read(
+        self, connection, table, width, user_id, data_type, start, end, archived: bool = True
+    ) -> Dict[str, np.ndarray]:
+        """Load samples or rollup rows of one metric as columnar arrays"""
+        chunks = list(self._stream(connection, table, width, user_id, data_type, start, end, archived=archived))
+        if not chunks:
+            return _empty_columns()
+        return {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+
+    def _stream(
+        self, connection, table, width, user_id, data_type, start, end,
+        chunk_size: int = STREAM_CHUNK_SIZE, archived: bool = True
+    ) -> Iterator[Dict[str, np.ndarray]]:
+        """Yield samples or rollup rows of one metric as columnar chunks, in time order.
+
+        Raw samples come from both tiers unless ``archived`` is False:
+        archived ones are merged into the chunks of health_data rows, which
+        may hold late samples of an archived month. Archived copies of
+        samples stored again or deleted are already left out by
+        HealthArchive.columns, so no sample is counted twice.
+        """
+        chunks = self._stream_table(connection, table, width, user_id, data_type, start, end, chunk_size)
+        cold = None
+        if width is None and archived:
+            cold = self.archive.columns(connection, user_id, data_type, start, end)
+        if cold is None:
+            yield from chunks
+            return
+
+        pending = _sample_columns(*cold)
+        for chunk in chunks:
+            cut = int(np.searchsorted(pending["bucket"], chunk["bucket"][-1], side="right"))
+            if cut:
+                merged = {key: np.concatenate([pending[key][:cut], values]) for key, values in chunk.items()}
+                order = np.argsort(merged["bucket"], kind="stable")
+                chunk = {key: values[order] for key, values in merged.items()}
+                pending = {key: values[cut:] for key, values in pending.items()}
+            yield chunk
+        for offset in range(0, pending["bucket"].size, chunk_size):
+            yield {key: values[offset:offset + chunk_size] for key, values in pending.items()}
+
+    def _stream_table(
+        self, connection, table, width, user_id, data_type, start, end, chunk_size: int
+    ) -> Iterator[Dict[str, np.ndarray]]:
+        """Yield rows of one table as columnar chunks.
+
+        Uses a server-side cursor where the driver supports one, so large
+        ranges are never fully materialized.
+        """
+        if width is None:
+            time_column, value_columns = table.c.timestamp, [table.c.value]
+        else:
+            time_column = table.c.bucket
+            value_columns = [table.c["count"], table.c["sum"], table.c.sum_sq, table.c["min"], table.c["max"]]
+
+        result = connection.execution_options(stream_results=True).execute(
+            select(time_column, *value_columns)
+            .where(and_(
+                table.c.user_id == user_id,
+                table.c.data_type == data_type,
+                time_column >= start,
+                time_column < end
+            ))
+            .order_by(time_column)
+        )
+
+        for rows in result.partitions(chunk_size):
+            epochs = _to_epochs([row[0] for row in rows])
+            if width is None:
+                yield _sample_columns(epochs, np.array([row[1] for row in rows], dtype=np.float64))
+            else:
+                stats = np.array([row[1:] for row in rows], dtype=np.float64)
+                yield {
+                    "bucket": epochs, "count": stats[:, 0], "sum": stats[:, 1],
+                    "sum_sq": stats[:, 2], "min": stats[:, 3], "max": stats[:, 4]
+                }
+
+
+def _aggregate(columns: Dict[str, np.ndarray], width: int, origin: int = 0) -> Dict[str, np.ndarray]:
+    """Merge time-ordered statistics into buckets of ``width`` seconds from ``origin``"""
+    buckets = (columns["bucket"] - origin) // width * width + origin
+    if buckets.size == 0:
+        return {key: values[:0] for key, values in columns.items()}
+
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    return {
+        "bucket": buckets[starts],
+        "count": np.add.reduceat(columns["count"], starts),
+        "sum": np.add.reduceat(columns["sum"], starts),
+        "sum_sq": np.add.reduceat(columns["sum_sq"], starts),
+        "min": np.minimum.reduceat(columns["min"], starts),
+        "max": np.maximum.reduceat(columns["max"], starts)
+    }
+
+
+def _sample_columns(epochs: np.ndarray, values: np.ndarray) -> Dict[str, np.ndarray]:
+    """Raw samples as single-sample statistics"""
+    return {
+        "bucket": epochs, "count": np.ones(len(values)), "sum": values,
+        "sum_sq": values ** 2, "min": values, "max": values
+    }
+
+
+def _empty_columns() -> Dict[str, np.ndarray]:
+    columns = {key: np.empty(0) for key in ("count", "sum", "sum_sq", "min", "max")}
+    columns["bucket"] = np.empty(0, dtype=np.int64)
+    return columns
+
+
+def _to_rows(buckets: Dict[str, np.ndarray], user_id: int, data_type: str) -> List[Dict]:
+    return [
+        {
+            "user_id": user_id, "data_type": data_type, "bucket": bucket,
+            "count": int(count), "sum": total, "sum_sq": total_sq, "min": lo, "max": hi
+        }
+        for bucket, count, total, total_sq, lo, hi in zip(
+            _to_datetimes(buckets["bucket"]), buckets["count"].tolist(),
+            buckets["sum"].tolist(), buckets["sum_sq"].tolist(),
+            buckets["min"].tolist(), buckets["max"].tolist()
+        )
+    ]
+
+
+def _to_epochs(timestamps: List[datetime]) -> np.ndarray:
+    return np.array(timestamps, dtype="datetime64[s]").astype(np.int64)
+
+
+def _to_datetimes(epochs: np.ndarray) -> List[datetime]:
+    return epochs.astype("datetime64[s]").tolist()
+
+
+def _floor(timestamp: datetime, width: int) -> datetime:
+    seconds = int((timestamp - EPOCH).total_seconds())
+    return EPOCH + timedelta(seconds=seconds - seconds % width)
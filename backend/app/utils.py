@@ -0,0 +1,19 @@
+"""Helpers shared by the routers and services."""
+from datetime import datetime, timezone
+import orjson
+
+
+def naive_utc(timestamp: datetime) -> datetime:
+    """``timestamp`` as naive UTC, the form timestamps are stored in"""
+    if timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def dumps(content) -> bytes:
+    """Compact JSON; datetimes as ISO 8601, NumPy arrays as lists"""
+    return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def loads(data):
+    return orjson.loads(data)
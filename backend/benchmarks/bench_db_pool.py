@@ -0,0 +1,166 @@
+"""Request throughput with and without connection pooling.
+
+Runs concurrent clients against two routes, at a few concurrency levels:
+
+* GET /users/{id}: an AsyncSession per request on the async engine
+* GET /health-data/{type}: a read-replica Session, queried on the compute pool
+
+Each route is run once with the tuned pools from app.database and once
+with NullPool, which opens and closes a connection per request. Pool
+counters come from the db_pool_* metrics. Against SQLite a connection is
+cheap to open; pass ``--url`` to measure a PostgreSQL server, where each
+new connection costs a TCP and authentication round trip.
+
+    cd backend && python -m benchmarks.bench_db_pool [--url postgresql://...]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+import httpx
+import numpy as np
+from fastapi import FastAPI
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import metrics
+from app.database import async_url, engine_options, get_async_db, get_read_db
+from app.models.user import Base
+from app.models import health_data as health_data_models, rollups  # noqa: F401
+from app.routers import health_data, users
+from app.schemas.health_data import HealthSyncPayload
+from app.services.ingestion_service import IngestionService
+
+START = datetime(2024, 1, 1)
+
+
+def load_database(url: str, users_count: int, days: int):
+    engine = create_engine(url, **engine_options(url, pooled=False))
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(Base.metadata.tables["users"].insert(), [
+            {"id": user_id, "email": f"user{user_id}@example.com"} for user_id in range(1, users_count + 1)
+        ])
+    rng = np.random.default_rng(0)
+    session = sessionmaker(bind=engine)()
+    IngestionService().ingest(session, HealthSyncPayload(
+        user_id=1, device_id="bench-watch",
+        samples=[
+            {"type": "heart_rate", "value": value, "timestamp": START + timedelta(minutes=minute)}
+            for minute, value in enumerate(rng.normal(72, 8, days * 1440).clip(40, 200).tolist())
+        ]
+    ))
+    session.close()
+    engine.dispose()
+
+
+def build_app(url: str, pooled: bool, name: str):
+    sync_engine = create_engine(url, **engine_options(url, pooled=pooled))
+    async_engine = create_async_engine(async_url(url), **engine_options(url, pooled=pooled, asynchronous=True))
+    metrics.instrument_pool(f"{name}_async", async_engine.sync_engine)
+    metrics.instrument_pool(f"{name}_sync", sync_engine)
+    session_factory = sessionmaker(bind=sync_engine)
+    async_session_factory = sessionmaker(bind=async_engine, class_=AsyncSession, expire_on_commit=False)
+
+    def override_read_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def override_async_db():
+        async with async_session_factory() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(users.router)
+    app.include_router(health_data.router)
+    app.dependency_overrides[get_read_db] = override_read_db
+    app.dependency_overrides[get_async_db] = override_async_db
+    return app, sync_engine, async_engine
+
+
+async def client_loop(client, request, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        began = time.perf_counter()
+        response = await request(client)
+        latencies.append(time.perf_counter() - began)
+        if response.status_code != 200:
+            errors.append(response.status_code)
+
+
+def metric(name: str) -> float:
+    return REGISTRY.get_sample_value(name) or 0.0
+
+
+async def run_mode(url: str, pooled: bool, args):
+    name = "pooled" if pooled else "unpooled"
+    app, sync_engine, async_engine = build_app(url, pooled, name)
+    rng = random.Random(0)
+
+    async def get_user(client):
+        return await client.get(f"/users/{rng.randrange(args.users) + 1}")
+
+    async def get_series(client):
+        day = START + timedelta(days=rng.randrange(args.days))
+        return await client.get("/health-data/heart_rate", params={
+            "user_id": 1, "start": day.isoformat(), "end": (day + timedelta(days=1)).isoformat()
+        })
+
+    print(name)
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        for label, request, pool in (
+            ("GET /users/{id}", get_user, f"db_pool_{name}_async"),
+            ("GET /health-data/{type}", get_series, f"db_pool_{name}_sync")
+        ):
+            for level in args.levels:
+                connects = metric(f"{pool}_connects_total")
+                checkouts = metric(f"{pool}_checkouts_total")
+                latencies, errors, utilization = [], [], []
+                deadline = time.perf_counter() + args.seconds
+
+                async def sample_pool():
+                    while time.perf_counter() < deadline:
+                        utilization.append(metric(f"{pool}_utilization"))
+                        await asyncio.sleep(0.05)
+
+                await asyncio.gather(
+                    sample_pool(),
+                    *[client_loop(client, request, deadline, latencies, errors) for _ in range(level)]
+                )
+                p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+                served = len(latencies) - len(errors)
+                print(
+                    f"  {label:<24} {level:3d} clients: {served / args.seconds:7.0f} req/s  "
+                    f"p50 {p50:6.1f} ms  p99 {p99:6.1f} ms  errors {len(errors)}  "
+                    f"connects/checkouts {metric(f'{pool}_connects_total') - connects:.0f}/"
+                    f"{metric(f'{pool}_checkouts_total') - checkouts:.0f}"
+                    + (f"  peak utilization {max(utilization):.0%}" if pooled else "")
+                )
+    await async_engine.dispose()
+    sync_engine.dispose()
+
+
+def main(args):
+    url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'pool.db')}"
+    load_database(url, args.users, args.days)
+    print(f"{url.split('://', 1)[0]} database, {args.seconds:.0f} s per level")
+    asyncio.run(run_mode(url, True, args))
+    asyncio.run(run_mode(url, False, args))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", help="database to load and query; a temporary SQLite file by default")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 16, 64])
+    main(parser.parse_args())
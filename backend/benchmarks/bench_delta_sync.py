@@ -0,0 +1,211 @@
+"""Full versus delta HealthKit sync of a device with a year of history.
+
+A simulated device keeps a year of samples of the 17 synced metrics and
+exposes them through anchored queries: changes come back in write order
+with a sequence-number anchor. Every response is measured as the JSON it
+would be on the wire and costs transfer time at ``--mbps``.
+
+After a first full sync the device records one more day, uploads a day
+of late (backfilled) samples from the day before, and deletes some
+samples. The next sync is then run from a copy of the same database in
+three ways:
+
+* full: anchors ignored, the whole history fetched again
+* delta, anchored: changes since each metric's anchor
+* delta, high-water mark: a client without anchors, read from the
+  high-water mark minus the backfill lookback
+
+Each run reports bytes received, wall time and what it wrote. The result
+is checked against the device's current samples.
+
+    cd backend && python -m benchmarks.bench_delta_sync
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import numpy as np
+
+
+class SimulatedDevice:
+    """HealthKit store of one device: samples and deletions in write order"""
+
+    def __init__(self, mbps: float):
+        self.bytes_per_second = mbps * 1e6 / 8
+        self.log: Dict[str, List] = {}
+        self.live: Dict[str, Dict[datetime, float]] = {}
+        self.sequence = 0
+        self.bytes_sent = 0
+        self.anchors = True
+
+    def write(self, metric: str, timestamp: datetime, value: float):
+        self.sequence += 1
+        self.log.setdefault(metric, []).append((self.sequence, "sample", timestamp, value))
+        self.live.setdefault(metric, {})[timestamp] = value
+
+    def delete(self, metric: str, timestamp: datetime):
+        self.sequence += 1
+        self.log[metric].append((self.sequence, "deleted", timestamp, None))
+        del self.live[metric][timestamp]
+
+    def __getattr__(self, name):
+        # Present anchored_query only while anchors are enabled
+        if name == "anchored_query" and self.anchors:
+            return self._anchored_query
+        raise AttributeError(name)
+
+    async def _anchored_query(self, metric: str, user_id: int, anchor: Optional[str]) -> Dict:
+        after = int(anchor) if anchor else 0
+        entries = [entry for entry in self.log.get(metric, []) if entry[0] > after]
+        if anchor is None:
+            # A fresh anchored query returns the current samples, not the deletion history
+            entries = [entry for entry in entries if entry[1] == "sample" and entry[2] in self.live[metric]]
+        result = {
+            "samples": [
+                {"value": value, "timestamp": timestamp.isoformat()}
+                for _, kind, timestamp, value in entries if kind == "sample"
+            ],
+            "deleted": [
+                {"timestamp": timestamp.isoformat()} for _, kind, timestamp, _ in entries if kind == "deleted"
+            ],
+            "anchor": str(self.sequence)
+        }
+        return await self._send(result)
+
+    async def query(self, metric: str, user_id: int, start_date: Optional[datetime] = None) -> List[Dict]:
+        samples = sorted(self.live.get(metric, {}).items())
+        result = [
+            {"value": value, "timestamp": timestamp.isoformat()}
+            for timestamp, value in samples if start_date is None or timestamp >= start_date
+        ]
+        return await self._send(result)
+
+    async def _send(self, result):
+        size = len(json.dumps(result))
+        self.bytes_sent += size
+        await asyncio.sleep(size / self.bytes_per_second)
+        return result
+
+
+sys.modules.setdefault("healthkit", types.SimpleNamespace(HealthKit=lambda: None))
+
+from sqlalchemy import create_engine, func, select  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.models.user import Base  # noqa: E402
+from app.models import health_data, rollups, sync_anchors  # noqa: E402,F401
+from app.services.executors import BoundedExecutor  # noqa: E402
+from app.services.healthkit_service import HealthKitService  # noqa: E402
+from app.services.healthkit_sync import HealthKitSyncService  # noqa: E402
+from benchmarks.synthetic import _value_range  # noqa: E402
+
+START = datetime(2023, 1, 1)
+DEVICE = "bench-iphone"
+
+# Minutes between samples of each synced metric
+INTERVALS = {
+    "heart_rate": 5, "blood_pressure": 720, "respiratory_rate": 60,
+    "blood_oxygen": 60, "body_temperature": 1440, "blood_glucose": 360,
+    "heart_rate_variability": 60, "vo2_max": 10080, "electrocardiogram": 10080,
+    "galvanic_skin_response": 60, "blood_alcohol_content": 43200,
+    "ambient_temperature": 60, "humidity": 60, "air_quality": 60,
+    "noise_level": 30, "uv_exposure": 60, "atmospheric_pressure": 60
+}
+
+
+def record(device: SimulatedDevice, rng, start: datetime, end: datetime):
+    for metric, interval in INTERVALS.items():
+        low, high = _value_range(metric)
+        count = int((end - start).total_seconds() // 60 // interval)
+        values = (low + (high - low) * rng.beta(4, 4, count)).round(2).tolist()
+        for index, value in enumerate(values):
+            device.write(metric, start + timedelta(minutes=index * interval), value)
+
+
+def live_rows(device: SimulatedDevice) -> int:
+    """Device samples the ingestion accepts, i.e. what the table should hold"""
+    supported = health_data.HealthData.Config.supported_types
+    return sum(len(samples) for metric, samples in device.live.items() if metric in supported)
+
+
+async def run_sync(device: SimulatedDevice, db_path: str, full: bool):
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    session = sessionmaker(bind=engine)()
+    healthkit = HealthKitService(metric_timeout=600)
+    healthkit.healthkit = device
+    executor = BoundedExecutor("bench", ThreadPoolExecutor, 1, 4)
+    service = HealthKitSyncService(healthkit=healthkit, executor=executor)
+
+    device.bytes_sent = 0
+    began = time.perf_counter()
+    result = await service.sync(session, 1, DEVICE, full=full)
+    elapsed = time.perf_counter() - began
+
+    with engine.connect() as connection:
+        stored = connection.execute(select(func.count()).select_from(health_data.HealthData.__table__)).scalar()
+    session.close()
+    executor.shutdown()
+    engine.dispose()
+    return result, elapsed, device.bytes_sent, stored, live_rows(device)
+
+
+def report(label: str, result: Dict, elapsed: float, sent: int, stored: int, expected: int):
+    print(
+        f"  {label:<24} {sent / 1e6:9.2f} MB {elapsed:8.2f} s  "
+        f"received {result['received']:>7}  inserted {result['inserted']:>6}  "
+        f"backfilled {result['backfilled']:>4}  deleted {result['deleted']:>3}  "
+        f"rows {stored} ({stored - expected:+d} vs device)"
+    )
+
+
+async def main(args):
+    rng = np.random.default_rng(0)
+    device = SimulatedDevice(args.mbps)
+    now = START + timedelta(days=args.days)
+    record(device, rng, START, now)
+
+    workdir = tempfile.mkdtemp()
+    synced = os.path.join(workdir, "synced.db")
+    Base.metadata.create_all(create_engine(f"sqlite:///{synced}"))
+
+    total = sum(len(samples) for samples in device.live.values())
+    print(f"{args.days} days of history, {total} samples over {len(INTERVALS)} metrics, {args.mbps:.0f} Mbit/s")
+    report("first sync", *await run_sync(device, synced, full=False))
+
+    # One more day, a day of late samples from the day before, some deletions
+    record(device, rng, now, now + timedelta(days=1))
+    late = now - timedelta(days=1)
+    for minute in range(0, 1440, 5):
+        device.write("heart_rate", late + timedelta(minutes=minute, seconds=30), 70.0)
+    deleted_from = now - timedelta(days=7)
+    for timestamp in [t for t in sorted(device.live["blood_oxygen"]) if t >= deleted_from][:args.deletions]:
+        device.delete("blood_oxygen", timestamp)
+
+    print("after one more day, 288 backfilled and "
+          f"{args.deletions} deleted samples:")
+    for label, full, anchors in (
+        ("full", True, True),
+        ("delta, anchored", False, True),
+        ("delta, high-water mark", False, False)
+    ):
+        path = os.path.join(workdir, "run.db")
+        shutil.copy(synced, path)
+        device.anchors = anchors
+        report(label, *await run_sync(device, path, full=full))
+    shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--mbps", type=float, default=20.0)
+    parser.add_argument("--deletions", type=int, default=24)
+    asyncio.run(main(parser.parse_args()))
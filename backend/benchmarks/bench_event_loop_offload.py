@@ -0,0 +1,182 @@
+"""Health-data GET latency under rising recommendation load.
+
+Runs the health-data and recommendation routers in one event loop against
+a temporary SQLite database, with the recommendation cache disabled so
+every recommendation request runs the engine. A fixed set of clients
+keeps requesting one day of heart rate while the number of concurrent
+recommendation clients grows. Compared:
+
+* inline:    the engine called directly inside the async route
+* offloaded: the engine in the inference process pool, bounded queue
+
+Finishes with a burst of identical requests for one user to show
+request coalescing.
+
+    cd backend && python -m benchmarks.bench_event_loop_offload
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+tmpdir = tempfile.mkdtemp()
+os.environ.setdefault("MODEL_REGISTRY_DIR", os.path.join(tmpdir, "models"))
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+
+import httpx  # noqa: E402
+import numpy as np  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+
+from app.database import AsyncSessionLocal, SessionLocal, async_engine, engine  # noqa: E402
+from app.models.user import Base  # noqa: E402
+from app.models import health_data as health_data_models, rollups  # noqa: E402,F401
+from app.routers import health_data, recommendations  # noqa: E402
+from app.schemas.health_data import HealthSyncPayload  # noqa: E402
+from app.services.executors import inference_executor  # noqa: E402
+from app.services.ingestion_service import IngestionService  # noqa: E402
+from app.services.model_registry import model_registry  # noqa: E402
+from app.services.model_training import train_models, synthetic_training_set  # noqa: E402
+from app.services.recommendation_cache import RecommendationCache  # noqa: E402
+from app.services.recommendation_engine import RecommendationEngine  # noqa: E402
+from app.services.recommendation_service import RecommendationService  # noqa: E402
+from benchmarks.synthetic import synthetic_users  # noqa: E402
+
+START = datetime(2024, 1, 1)
+
+
+def load_database(users: int, days: int):
+    Base.metadata.create_all(engine)
+    population = synthetic_users(users)
+    with engine.begin() as connection:
+        connection.execute(Base.metadata.tables["users"].insert(), [
+            {
+                "id": int(row["user_id"]) + 1,
+                "email": f"user{row['user_id']}@example.com",
+                "genetic_data": json.dumps(row["genetic_data"]),
+                "lifestyle_data": row["lifestyle_data"],
+                "medical_history": row["medical_history"]
+            }
+            for row in population.to_dict("records")
+        ])
+
+    rng = np.random.default_rng(0)
+    service = IngestionService()
+    for day in range(days):
+        session = SessionLocal()
+        service.ingest(session, HealthSyncPayload(
+            user_id=1,
+            device_id="bench-watch",
+            samples=[
+                {"type": "heart_rate", "value": value, "timestamp": START + timedelta(days=day, minutes=minute)}
+                for minute, value in enumerate(rng.normal(72, 8, 1440).clip(40, 200).tolist())
+            ]
+        ))
+        session.close()
+
+
+def build_app(mode: str) -> FastAPI:
+    app = FastAPI()
+    app.include_router(health_data.router)
+    if mode == "offloaded":
+        recommendations.recommendation_service = RecommendationService(
+            cache=RecommendationCache(ttl=0, stale_ttl=0, redis_url=None)
+        )
+        app.include_router(recommendations.router)
+    else:
+        service = RecommendationService()
+        recommendation_engine = RecommendationEngine()
+
+        @app.get("/recommendations/{user_id}")
+        async def inline_recommendations(user_id: int):
+            async with AsyncSessionLocal() as db:
+                return recommendation_engine.generate_recommendations(await service.load_inputs(db, user_id))
+    return app
+
+
+async def health_client(client, deadline, latencies, days):
+    rng = random.Random()
+    while time.perf_counter() < deadline:
+        day = START + timedelta(days=rng.randrange(days))
+        began = time.perf_counter()
+        response = await client.get("/health-data/heart_rate", params={
+            "user_id": 1, "start": day.isoformat(), "end": (day + timedelta(days=1)).isoformat()
+        })
+        latencies.append(time.perf_counter() - began)
+        assert response.status_code in (200, 429)
+
+
+async def recommendation_client(client, deadline, statuses, users):
+    rng = random.Random()
+    while time.perf_counter() < deadline:
+        response = await client.get(f"/recommendations/{rng.randrange(users) + 1}")
+        statuses.append(response.status_code)
+        if response.status_code == 429:
+            await asyncio.sleep(float(response.headers["retry-after"]) / 10)
+
+
+async def run(mode: str, args):
+    app = build_app(mode)
+    print(mode)
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        # Warm up the pools so worker start-up is not measured
+        await client.get("/recommendations/1")
+        await client.get("/health-data/heart_rate", params={"user_id": 1})
+
+        for level in args.levels:
+            latencies, statuses = [], []
+            deadline = time.perf_counter() + args.seconds
+            await asyncio.gather(
+                *[health_client(client, deadline, latencies, args.days) for _ in range(args.health_clients)],
+                *[recommendation_client(client, deadline, statuses, args.users) for _ in range(level)]
+            )
+            p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+            served = statuses.count(200)
+            print(
+                f"  {level:3d} recommendation clients: health GET p50 {p50:7.1f} ms  p99 {p99:7.1f} ms  "
+                f"recommendations {served / args.seconds:6.1f}/s  429s {statuses.count(429)}"
+            )
+    # Pooled async connections belong to this event loop
+    await async_engine.dispose()
+
+
+async def coalescing(args):
+    app = build_app("offloaded")
+    service = recommendations.recommendation_service
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        responses = await asyncio.gather(*[client.get("/recommendations/2") for _ in range(args.burst)])
+    computed = service.cache.misses + service.cache.stale_hits
+    print(
+        f"coalescing: {args.burst} concurrent requests for one user -> {computed} engine run(s), "
+        f"{sum(r.status_code == 200 for r in responses)} served"
+    )
+    await async_engine.dispose()
+
+
+def main(args):
+    if model_registry.current() is None:
+        model_registry.publish(train_models(*synthetic_training_set(20000, len(RecommendationEngine().genetic_features))))
+    load_database(args.users, args.days)
+    print(
+        f"{args.health_clients} health-data clients, {args.seconds:.0f} s per level, "
+        f"inference pool of {inference_executor.max_workers} (queue {inference_executor.max_queue}), "
+        f"{os.cpu_count()} CPU(s)"
+    )
+    asyncio.run(run("inline", args))
+    asyncio.run(run("offloaded", args))
+    asyncio.run(coalescing(args))
+    inference_executor.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--health-clients", type=int, default=4)
+    parser.add_argument("--levels", type=int, nargs="+", default=[0, 4, 16, 64])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--burst", type=int, default=100)
+    main(parser.parse_args())
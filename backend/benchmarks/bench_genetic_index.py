@@ -0,0 +1,84 @@
+"""Per-user genetic analysis: per-call marker evaluation vs the precompiled index.
+
+Runs with the shipped marker table and with a synthetic table of several
+thousand markers, for users reporting a handful of genes each.
+
+    cd backend && python -m benchmarks.bench_genetic_index
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from app.services.genetic_index import REFERENCE_VARIANTS
+from app.services.recommendation_engine import RecommendationEngine, GENETIC_MARKERS_PATH
+
+
+def legacy_analyze(engine: RecommendationEngine, markers: dict, genetic_data: dict) -> list:
+    """_analyze_genetic_risks as it was before the index"""
+    risks = []
+    for gene, data in genetic_data.items():
+        if gene in markers:
+            marker_info = markers[gene]
+            variant = data.get("variant")
+            if variant not in REFERENCE_VARIANTS:
+                risks.append({
+                    "gene": gene,
+                    "risk_level": engine._calculate_risk_level(marker_info["risk_factor"]),
+                    "conditions": marker_info.get("cancer_types") or [marker_info.get("condition")],
+                    "recommendations": engine._marker_recommendations(marker_info)
+                })
+    return risks
+
+
+def synthetic_table(size: int) -> dict:
+    with open(GENETIC_MARKERS_PATH) as f:
+        entries = list(json.load(f).values())
+    return {f"GENE{i}": entries[i % len(entries)] for i in range(size)}
+
+
+def run(label: str, markers_path: str, users: int, genes_per_user: int):
+    engine = RecommendationEngine(markers_path=markers_path)
+    markers = {gene: dict(marker) for gene, marker in engine.genetic_markers.items()}
+    genes = list(markers)
+    rng = random.Random(0)
+    population = [
+        {
+            gene: {"variant": rng.choice(["pathogenic", "benign"])}
+            for gene in rng.sample(genes, min(genes_per_user, len(genes)))
+        }
+        for _ in range(users)
+    ]
+
+    began = time.perf_counter()
+    for genetic_data in population:
+        legacy_analyze(engine, markers, genetic_data)
+    legacy = time.perf_counter() - began
+
+    began = time.perf_counter()
+    for genetic_data in population:
+        engine._analyze_genetic_risks(genetic_data)
+    indexed = time.perf_counter() - began
+
+    print(f"{label}: {len(markers)} markers, {users} users x {genes_per_user} genes")
+    print(f"  per-call evaluation  {legacy / users * 1e6:8.2f} us/user")
+    print(f"  precompiled index    {indexed / users * 1e6:8.2f} us/user")
+
+
+def main(args):
+    run("shipped table", GENETIC_MARKERS_PATH, args.users, args.genes)
+
+    path = os.path.join(tempfile.mkdtemp(), "markers.json")
+    with open(path, "w") as f:
+        json.dump(synthetic_table(args.markers), f)
+    run("synthetic table", path, args.users, args.genes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--genes", type=int, default=8)
+    parser.add_argument("--markers", type=int, default=5000)
+    main(parser.parse_args())
@@ -0,0 +1,189 @@
+"""Cold-tier archive: storage saved and latency of reads served from archives.
+
+Ingests ``--months`` months of samples for ``--users`` users through
+IngestionService: heart rate every 2 minutes plus six metrics hourly,
+with the default sample metadata. Every read below is run once with the
+samples in health_data and once after HealthArchive.archive_user moved
+all but the last month to Parquet files. Outputs must be identical:
+
+* samples of one day and of one month, rows (HealthData.to_dict shape)
+  and columnar
+* a one-day chart at 18 s buckets, which reads raw samples
+* a day of the hot month, to show what the catalog lookup costs reads
+  that the archive does not serve
+
+Storage is the SQLite size of health_data and its indexes (dbstat)
+against the archive files. A late sample is then added to an archived
+month, the month re-archived and restored.
+
+    cd backend && python -m benchmarks.bench_health_archive [--users 3 --months 4]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+WORKDIR = tempfile.mkdtemp(prefix="bench-archive-")
+os.environ.setdefault("HEALTH_ARCHIVE_DIR", os.path.join(WORKDIR, "archive"))
+
+import numpy as np  # noqa: E402
+from sqlalchemy import create_engine, func, select  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.models.user import Base, User  # noqa: E402
+from app.models import anomalies, archives, rollups  # noqa: E402,F401
+from app.schemas.health_data import HealthSyncPayload  # noqa: E402
+from app.services.health_archive import HealthArchive  # noqa: E402
+from app.services.health_serializer import HealthDataSerializer  # noqa: E402
+from app.services.ingestion_service import IngestionService  # noqa: E402
+from app.services.timeseries_store import TimeSeriesStore  # noqa: E402
+from benchmarks.synthetic import _value_range  # noqa: E402
+
+START = datetime(2024, 1, 1)
+HOURLY = ["steps", "blood_oxygen", "respiratory_rate", "body_temperature", "ambient_temperature", "stress_level"]
+
+
+def ingest(session_factory, users: int, months: int) -> int:
+    service = IngestionService()
+    rng = np.random.default_rng(0)
+    end = _month(months)
+    total = 0
+    for user_id in range(1, users + 1):
+        day = START
+        while day < end:
+            samples = [
+                {"type": "heart_rate", "value": value, "timestamp": day + timedelta(minutes=2 * index)}
+                for index, value in enumerate(rng.normal(72, 8, 720).clip(40, 200).round(1).tolist())
+            ]
+            for data_type in HOURLY:
+                low, high = _value_range(data_type)
+                samples.extend(
+                    {"type": data_type, "value": value, "timestamp": day + timedelta(hours=hour)}
+                    for hour, value in enumerate((low + (high - low) * rng.beta(4, 4, 24)).round(2).tolist())
+                )
+            with session_factory() as session:
+                total += service.ingest(session, HealthSyncPayload(
+                    user_id=user_id, device_id="bench-watch", samples=samples
+                ))["inserted"]
+            day += timedelta(days=1)
+    return total
+
+
+def hot_bytes(engine) -> int:
+    with engine.connect() as connection:
+        connection.exec_driver_sql("VACUUM")
+        return connection.exec_driver_sql(
+            "SELECT sum(pgsize) FROM dbstat "
+            "WHERE name IN (SELECT name FROM sqlite_master WHERE tbl_name = 'health_data')"
+        ).scalar()
+
+
+def median_ms(function, rounds: int) -> float:
+    timings = []
+    for _ in range(rounds):
+        began = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - began)
+    return statistics.median(timings) * 1000
+
+
+def main(args):
+    engine = create_engine(f"sqlite:///{os.path.join(WORKDIR, 'bench.db')}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [
+            {"id": user_id, "email": f"user{user_id}@example.com"} for user_id in range(1, args.users + 1)
+        ])
+    session_factory = sessionmaker(bind=engine)
+    began = time.perf_counter()
+    samples = ingest(session_factory, args.users, args.months)
+    print(f"{samples} samples of {args.users} users over {args.months} months "
+          f"ingested in {time.perf_counter() - began:.1f} s")
+
+    serializer, store, archive = HealthDataSerializer(), TimeSeriesStore(), HealthArchive()
+    table = serializer.table
+    day = START + timedelta(days=40), START + timedelta(days=41)
+    month = START + timedelta(days=31), START + timedelta(days=60)
+    # The last month stays hot
+    last = _month(args.months - 1)
+    hot_month = last - timedelta(days=2), last - timedelta(days=1)
+    reads = {
+        "samples, 1 day": lambda c: serializer.samples_json(serializer.read_samples(c, 1, "heart_rate", *day)),
+        "samples, 1 month": lambda c: serializer.samples_json(
+            serializer.read_samples(c, 1, "heart_rate", *month, limit=100000)
+        ),
+        "columnar, 1 month": lambda c: serializer.samples_columnar_json("heart_rate", "bpm", serializer.read_samples(
+            c, 1, "heart_rate", *month, limit=100000, columns=[table.c.timestamp, table.c.value]
+        )),
+        "chart, 1 day raw": lambda c: store.downsample(c, 1, "heart_rate", *day, 5000),
+        "hot month, 1 day": lambda c: serializer.samples_json(
+            serializer.read_samples(c, 1, "heart_rate", *hot_month)
+        ),
+    }
+
+    def run_reads():
+        with engine.connect() as connection:
+            return {
+                name: (read(connection), median_ms(lambda: read(connection), args.rounds))
+                for name, read in reads.items()
+            }
+
+    before_bytes = hot_bytes(engine)
+    hot = run_reads()
+
+    began = time.perf_counter()
+    totals = {"months": 0, "rows": 0, "bytes": 0}
+    with engine.connect() as connection:
+        for user_id in range(1, args.users + 1):
+            result = archive.archive_user(connection, user_id, before=last)
+            for key in totals:
+                totals[key] += result[key]
+        remaining = connection.execute(select(func.count()).select_from(table)).scalar()
+    elapsed = time.perf_counter() - began
+    after_bytes = hot_bytes(engine)
+    print(f"archived {totals['rows']} samples in {totals['months']} user-months: "
+          f"{totals['rows'] / elapsed:.0f} samples/s, {remaining} left in health_data")
+
+    moved = before_bytes - after_bytes
+    print(f"  health_data + indexes  {before_bytes / 1e6:8.2f} MB -> {after_bytes / 1e6:.2f} MB")
+    print(f"  archive files          {totals['bytes'] / 1e6:8.2f} MB for the {moved / 1e6:.2f} MB moved: "
+          f"{moved / totals['bytes']:.1f}x smaller, "
+          f"{moved / totals['rows']:.1f} -> {totals['bytes'] / totals['rows']:.2f} B/sample")
+
+    cold = run_reads()
+    print(f"  {'read':<20} {'hot':>9} {'cold':>9}")
+    for name in reads:
+        assert hot[name][0] == cold[name][0], f"{name} differs between tiers"
+        print(f"  {name:<20} {hot[name][1]:7.2f} ms {cold[name][1]:7.2f} ms")
+
+    # A sample of an archived month arriving late, then the month moved back
+    late = START + timedelta(days=45, seconds=30)
+    with session_factory() as session:
+        IngestionService().ingest(session, HealthSyncPayload(
+            user_id=1, device_id="bench-watch", samples=[{"type": "heart_rate", "value": 99.0, "timestamp": late}]
+        ))
+    with engine.connect() as connection:
+        around = late - timedelta(minutes=1), late + timedelta(minutes=1)
+        merged = [row[3] for row in serializer.read_samples(connection, 1, "heart_rate", *around)]
+        rearchived = archive.archive_user(connection, 1, before=last)
+        restored = archive.restore(connection, 1, late)
+        back = connection.execute(
+            select(func.count()).select_from(table)
+            .where(table.c.user_id == 1, table.c.timestamp < START + timedelta(days=60))
+        ).scalar()
+    print(f"late sample merged into reads: {late in merged}; re-archived {rearchived['rows']} into "
+          f"{rearchived['months']} month; restored {restored} samples ({back} in health_data)")
+
+
+def _month(offset: int) -> datetime:
+    return (START + timedelta(days=31 * offset)).replace(day=1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=3)
+    parser.add_argument("--months", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=5)
+    main(parser.parse_args())
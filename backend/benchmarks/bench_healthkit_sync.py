@@ -0,0 +1,86 @@
+"""Wall-clock benchmark for HealthKitService.sync_health_data.
+
+Runs against a fake ``healthkit`` module with injected per-query latency and
+compares the previous sequential fan-out with the concurrent one.
+
+    cd backend && python -m benchmarks.bench_healthkit_sync
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import types
+from typing import Dict, List
+
+
+class FakeHealthKit:
+    """Stand-in for ``healthkit.HealthKit`` with a fixed latency per query."""
+
+    def __init__(self, latency: float = 0.05, slow_metrics: Dict[str, float] = None):
+        self.latency = latency
+        self.slow_metrics = slow_metrics or {}
+
+    async def query(self, metric: str, user_id: int) -> List[Dict]:
+        await asyncio.sleep(self.slow_metrics.get(metric, self.latency))
+        return [{"value": 1.0, "timestamp": "2024-03-20T10:00:00"}]
+
+
+sys.modules.setdefault("healthkit", types.SimpleNamespace(HealthKit=FakeHealthKit))
+
+from app.services.healthkit_service import HealthKitService  # noqa: E402
+
+
+async def sequential_sync(service: HealthKitService, user_id: int) -> List[Dict]:
+    """The pre-fan-out behaviour: every metric awaited one after another."""
+    metrics = [
+        "heart_rate", "blood_pressure", "respiratory_rate",
+        "blood_oxygen", "body_temperature", "blood_glucose",
+        "heart_rate_variability", "vo2_max", "electrocardiogram",
+        "galvanic_skin_response", "blood_alcohol_content",
+        "ambient_temperature", "humidity", "air_quality",
+        "noise_level", "uv_exposure", "atmospheric_pressure"
+    ]
+    synced_data = []
+    for metric in metrics:
+        synced_data.extend((await service._query(metric, user_id)).samples)
+    return synced_data
+
+
+async def time_syncs(sync, users: int, rounds: int) -> List[float]:
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        await asyncio.gather(*(sync(user_id) for user_id in range(users)))
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+async def main(args):
+    service = HealthKitService(metric_timeout=args.timeout)
+    service.healthkit = FakeHealthKit(args.latency)
+
+    before = await time_syncs(
+        lambda user_id: sequential_sync(service, user_id), args.users, args.rounds
+    )
+    after = await time_syncs(service.sync_health_data, args.users, args.rounds)
+
+    print(f"{args.users} user(s), {args.latency * 1000:.0f} ms per metric query")
+    print(f"  sequential: {statistics.median(before) * 1000:8.1f} ms")
+    print(f"  concurrent: {statistics.median(after) * 1000:8.1f} ms")
+
+    # One metric far slower than the timeout must not hold up the sync
+    service.healthkit = FakeHealthKit(args.latency, {"vo2_max": args.timeout * 10})
+    start = time.perf_counter()
+    samples = await service.sync_health_data(0)
+    elapsed = time.perf_counter() - start
+    print(f"  one stalled metric: {elapsed * 1000:8.1f} ms, {len(samples)}/17 metrics")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--timeout", type=float, default=0.5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,97 @@
+"""Rows/sec for POST /health-data/sync ingestion.
+
+Compares one INSERT per sample with IngestionService's bulk path, then
+re-sends the same payload to measure the de-duplication path. Defaults to a
+temporary SQLite file; pass --database-url to run against Postgres (COPY).
+
+    cd backend && python -m benchmarks.bench_ingestion --samples 20000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.user import Base
+from app.models.health_data import HealthData
+from app.schemas.health_data import HealthSyncPayload
+from app.services.ingestion_service import IngestionService
+
+
+def make_payload(user_id: int, samples: int) -> HealthSyncPayload:
+    start = datetime(2024, 1, 1)
+    types = ["heart_rate", "blood_oxygen", "steps", "respiratory_rate"]
+    return HealthSyncPayload(
+        user_id=user_id,
+        device_id="bench-device",
+        samples=[
+            {
+                "type": types[i % len(types)],
+                "value": random.uniform(80, 100),
+                "timestamp": start + timedelta(seconds=i)
+            }
+            for i in range(samples)
+        ]
+    )
+
+
+def row_at_a_time(session_factory, service: IngestionService, payload) -> float:
+    rows, _ = service.validate_batch(payload)
+    session = session_factory()
+    start = time.perf_counter()
+    for row in rows:
+        session.execute(HealthData.__table__.insert().values(row))
+    session.commit()
+    elapsed = time.perf_counter() - start
+    session.close()
+    return elapsed
+
+
+def bulk(session_factory, service: IngestionService, payload):
+    session = session_factory()
+    start = time.perf_counter()
+    result = service.ingest(session, payload)
+    elapsed = time.perf_counter() - start
+    session.close()
+    return elapsed, result
+
+
+def main(args):
+    tmpdir = None
+    url = args.database_url
+    if url is None:
+        tmpdir = tempfile.mkdtemp()
+        url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    service = IngestionService()
+
+    n = args.samples
+    elapsed = row_at_a_time(session_factory, service, make_payload(1, n))
+    print(f"{engine.dialect.name}, {n} samples")
+    print(f"  row-at-a-time: {n / elapsed:10.0f} rows/s")
+
+    payload = make_payload(2, n)
+    elapsed, result = bulk(session_factory, service, payload)
+    print(f"  bulk:          {n / elapsed:10.0f} rows/s ({result['inserted']} inserted)")
+
+    elapsed, result = bulk(session_factory, service, payload)
+    print(
+        f"  bulk re-sync:  {n / elapsed:10.0f} rows/s "
+        f"({result['inserted']} inserted, {result['duplicates']} duplicates)"
+    )
+
+    Base.metadata.drop_all(engine)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--samples", type=int, default=20000)
+    parser.add_argument("--database-url")
+    main(parser.parse_args())
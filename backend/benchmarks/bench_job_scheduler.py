@@ -0,0 +1,215 @@
+"""Background job scheduler: a dry run of every job, then scheduled runs with retries.
+
+Builds a temporary SQLite database of ``--users`` users, each with the
+last hour of heart rate and step samples written without their rollups
+(what refresh_rollups repairs), a training CSV and a model set in a
+temporary registry. Then:
+
+* dry run: JobScheduler.benchmark runs every shard of every job once and
+  reports duration and users/s. It checks that nothing was written.
+* scheduled: ``--schedulers`` schedulers, each with its own process
+  pool, share one run of the jobs plus a "flaky" job whose shards all
+  fail on their first attempt. Reports who ran which shards, retries and
+  outcomes, the most shards of a job running at once against its limit,
+  and per-job durations from job_runs.
+
+Without REDIS_URL, warm_recommendations computes in the dry run but is
+skipped in the scheduled one: the cache it fills lives in Redis.
+
+    cd backend && python -m benchmarks.bench_job_scheduler [--users 2000]
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict
+
+# Before the app modules read them; pool workers inherit the same values
+WORKDIR = os.environ.setdefault("BENCH_JOB_DIR", tempfile.mkdtemp())
+# A generous busy timeout: job workers and schedulers share one SQLite writer lock
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(WORKDIR, 'jobs.db')}?timeout=30")
+os.environ.setdefault("MODEL_REGISTRY_DIR", os.path.join(WORKDIR, "models"))
+os.environ.setdefault("MODEL_TRAINING_DATA", os.path.join(WORKDIR, "training.csv"))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+
+from app.database import engine  # noqa: E402
+from app.models.health_data import HealthData  # noqa: E402
+from app.models.jobs import JobRun  # noqa: E402
+from app.models.rollups import HealthDataMinuteRollup  # noqa: E402
+from app.models.user import Base, User  # noqa: E402
+from app.models import anomalies, rollups, sync_anchors  # noqa: E402,F401
+from app.services.job_scheduler import JobScheduler  # noqa: E402
+from app.services.jobs import JOBS, JobSpec  # noqa: E402
+from app.services.model_registry import model_registry  # noqa: E402
+from app.services.model_training import LIFESTYLE_FEATURES, synthetic_training_set, train_models  # noqa: E402
+from app.services.recommendation_engine import RecommendationEngine  # noqa: E402
+from benchmarks.synthetic import synthetic_users  # noqa: E402
+
+FLAKY_MARKERS = os.path.join(WORKDIR, "flaky")
+
+
+def flaky(user_range, dry_run: bool = False) -> Dict:
+    """Fails the first attempt of every shard, then succeeds"""
+    marker = os.path.join(FLAKY_MARKERS, str(user_range[0]))
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        raise RuntimeError("transient failure")
+    time.sleep(0.05)
+    return {}
+
+
+def build(args):
+    Base.metadata.create_all(engine)
+    profiles = synthetic_users(args.users)
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [
+            {
+                "id": index + 1, "email": f"user{index + 1}@example.com",
+                "genetic_data": json.dumps(row["genetic_data"]),
+                "lifestyle_data": row["lifestyle_data"], "medical_history": row["medical_history"]
+            }
+            for index, row in enumerate(profiles.to_dict("records"))
+        ])
+        now = datetime.utcnow().replace(second=0, microsecond=0)
+        rng = np.random.default_rng(0)
+        for user_id in range(1, args.users + 1):
+            connection.execute(HealthData.__table__.insert(), [
+                {
+                    "user_id": user_id, "data_type": data_type, "device_id": "bench",
+                    "value": float(value), "timestamp": now - timedelta(minutes=minute)
+                }
+                for data_type, values in (
+                    ("heart_rate", rng.normal(72, 8, 60)), ("steps", rng.poisson(80, 60))
+                )
+                for minute, value in enumerate(values)
+            ])
+
+    genetic_features = RecommendationEngine().genetic_features
+    genetic, lifestyle, genetic_labels, lifestyle_labels = synthetic_training_set(
+        args.training_samples, len(genetic_features)
+    )
+    frame = pd.DataFrame(np.column_stack([genetic, lifestyle]), columns=genetic_features + LIFESTYLE_FEATURES)
+    frame["genetic_risk"], frame["lifestyle_risk"] = genetic_labels, lifestyle_labels
+    frame.to_csv(os.environ["MODEL_TRAINING_DATA"], index=False)
+    model_registry.publish(train_models(genetic, lifestyle, genetic_labels, lifestyle_labels))
+    os.makedirs(FLAKY_MARKERS, exist_ok=True)
+
+
+def counts(connection) -> Dict[str, int]:
+    return {
+        "minute_rollups": connection.execute(
+            select(func.count()).select_from(HealthDataMinuteRollup.__table__)
+        ).scalar(),
+        "models": len(os.listdir(os.path.join(os.environ["MODEL_REGISTRY_DIR"], "versions")))
+    }
+
+
+def dry_run(args, jobs: Dict[str, JobSpec]):
+    with engine.connect() as connection:
+        before = counts(connection)
+    reports = JobScheduler(jobs, workers=args.workers).benchmark(dry_run=True)
+    with engine.connect() as connection:
+        after = counts(connection)
+    assert before == after, f"dry run wrote: {before} -> {after}"
+
+    print(f"dry run, {args.workers} workers (nothing written: {after})")
+    for report in reports:
+        print(
+            f"  {report['job']:<22} {report['shards']:3d} shards {report['seconds']:7.2f} s "
+            f"{report['users_per_second']:8.0f} users/s  slowest shard {report['shard_seconds_max']:.2f} s"
+        )
+
+
+def scheduled(args, jobs: Dict[str, JobSpec]):
+    runs = JobRun.__table__
+    stop = threading.Event()
+    schedulers = [
+        JobScheduler(
+            jobs, workers=args.workers, poll_interval=0.1, lease=10, retry_delay=0.5,
+            owner=f"scheduler-{index}"
+        )
+        for index in range(args.schedulers)
+    ]
+    threads = [threading.Thread(target=scheduler.run, args=(stop,)) for scheduler in schedulers]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+
+    with engine.connect() as connection:
+        while all(thread.is_alive() for thread in threads):
+            time.sleep(0.2)
+            statuses = dict(connection.execute(
+                select(runs.c.status, func.count()).group_by(runs.c.status)
+            ).all())
+            if statuses and set(statuses) <= {"succeeded", "failed"}:
+                break
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    with engine.connect() as connection:
+        rows = connection.execute(select(runs)).all()
+        after = counts(connection)
+    print(f"scheduled, {args.schedulers} schedulers x {args.workers} workers: "
+          f"{len(rows)} shards in {elapsed:.1f} s, {after}")
+    for name, spec in jobs.items():
+        job_rows = [row for row in rows if row.job == name]
+        owners = {}
+        for row in job_rows:
+            owners[row.owner] = owners.get(row.owner, 0) + 1
+        durations = [(row.finished_at - row.started_at).total_seconds() for row in job_rows]
+        outcomes = {}
+        for row in job_rows:
+            outcomes[row.status] = outcomes.get(row.status, 0) + 1
+        users = sum((row.result or {}).get("users", 0) for row in job_rows)
+        print(
+            f"  {name:<22} {outcomes} attempts {sum(row.attempts for row in job_rows)} "
+            f"peak concurrency {_peak(job_rows)}/{spec.max_concurrency} "
+            f"shard p50 {np.median(durations):.2f} s  {users} users  by {owners}"
+        )
+
+
+def _peak(rows) -> int:
+    """Most intervals (started_at, finished_at) of the last attempts overlapping at once"""
+    edges = sorted(
+        [(row.started_at, 1) for row in rows] + [(row.finished_at, -1) for row in rows],
+        key=lambda edge: (edge[0], edge[1])
+    )
+    peak = running = 0
+    for _, step in edges:
+        running += step
+        peak = max(peak, running)
+    return peak
+
+
+def main(args):
+    began = time.perf_counter()
+    build(args)
+    print(f"{args.users} users with 120 samples each, {args.training_samples} training rows, "
+          f"built in {time.perf_counter() - began:.1f} s")
+
+    jobs = {
+        name: spec._replace(shard_size=args.shard_size) if spec.shard_size else spec
+        for name, spec in JOBS.items()
+    }
+    dry_run(args, jobs)
+    jobs["flaky"] = JobSpec("flaky", flaky, interval=3600, shard_size=args.shard_size, max_concurrency=3)
+    scheduled(args, jobs)
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--shard-size", type=int, default=250)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--schedulers", type=int, default=2)
+    parser.add_argument("--training-samples", type=int, default=5000)
+    main(parser.parse_args())
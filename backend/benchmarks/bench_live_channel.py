@@ -0,0 +1,239 @@
+"""Load test of the live channel: 10k concurrent WebSocket connections on one node.
+
+Starts a uvicorn server (one worker, in-memory pub/sub) with the live
+router and a publisher thread that stands in for ingestion: it publishes
+``--rate`` sample events a second to random users, through
+LiveBroker.publish from a non-loop thread as the compute pool does. User
+0 additionally gets a firehose of ``--firehose`` events a second.
+
+This process then opens ``--connections`` WebSockets spread over
+``--users`` users, plus ``--slow`` connections to user 0 that never read
+(tiny receive buffers), and ``--slow`` ones to user 0 that do. It reports
+connect time, delivery latency (event creation to frame receipt, same
+host clock, including the coalescing window), frames and events received,
+the server's memory per connection, and how many slow consumers the
+server dropped. Client and server share the machine's CPUs.
+
+    cd backend && python -m benchmarks.bench_live_channel [--connections 10000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from typing import Dict, List
+import numpy as np
+
+from orjson import loads
+
+
+def build_server(args):
+    from fastapi import FastAPI
+    from app.routers import live
+    from app.services.live_channel import live_broker
+
+    app = FastAPI()
+    app.include_router(live.router)
+    stop = threading.Event()
+
+    def publish():
+        rng = random.Random(0)
+        tick = 0.01
+        while not stop.is_set():
+            began = time.perf_counter()
+            for _ in range(max(1, int(args.rate * tick))):
+                user_id = rng.randrange(1, args.users + 1)
+                live_broker.publish(user_id, [
+                    {"type": "sample", "data_type": "heart_rate", "value": 72.0, "sent": time.time()}
+                ])
+            if args.firehose:
+                live_broker.publish(0, [
+                    {"type": "sample", "data_type": "heart_rate", "value": 72.0, "sent": time.time()}
+                ] * int(args.firehose * tick))
+            time.sleep(max(0.0, tick - (time.perf_counter() - began)))
+
+    @app.on_event("startup")
+    async def start():
+        await live_broker.start()
+        threading.Thread(target=publish, daemon=True).start()
+
+    @app.on_event("shutdown")
+    async def shutdown():
+        stop.set()
+        await live_broker.stop()
+
+    @app.get("/stats")
+    def stats() -> Dict:
+        with open("/proc/self/status") as status:
+            rss_kb = next(int(line.split()[1]) for line in status if line.startswith("VmRSS:"))
+        return dict(live_broker.stats(), rss_mb=rss_kb / 1024, cpu_seconds=time.process_time())
+
+    return app
+
+
+def serve(args):
+    import uvicorn
+    resource.setrlimit(resource.RLIMIT_NOFILE, (resource.getrlimit(resource.RLIMIT_NOFILE)[1],) * 2)
+    uvicorn.run(
+        build_server(args), host="127.0.0.1", port=args.port, log_level="warning",
+        backlog=4096, ws="websockets", ws_ping_interval=None
+    )
+
+
+def server_stats(port: int) -> Dict:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/stats") as response:
+        return json.loads(response.read())
+
+
+class ClientStats:
+    def __init__(self):
+        self.frames = 0
+        self.events = 0
+        self.latencies: List[float] = []
+        self.closed = {}
+        self.failed = 0
+
+
+async def connect(port: int, user_id: int, slow: bool = False):
+    import websockets
+    sock = None
+    if slow:
+        # Never read, and keep the kernel from buffering much on our behalf
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        sock.setblocking(False)
+        await asyncio.get_running_loop().sock_connect(sock, ("127.0.0.1", port))
+    return await websockets.connect(
+        f"ws://127.0.0.1:{port}/live/{user_id}", sock=sock, compression=None,
+        ping_interval=None, max_queue=1 if slow else 32, open_timeout=60
+    )
+
+
+async def read(websocket, stats: ClientStats, measuring: List[bool]):
+    import websockets
+    try:
+        async for message in websocket:
+            received = time.time()
+            frame = loads(message)
+            if measuring[0]:
+                stats.frames += 1
+                stats.events += len(frame["events"])
+                stats.latencies.append(received - frame["events"][0]["sent"])
+    except websockets.ConnectionClosed:
+        pass
+    code = websocket.close_code
+    stats.closed[code] = stats.closed.get(code, 0) + 1
+
+
+async def load(args):
+    stats = ClientStats()
+    firehose_stats = ClientStats()
+    measuring = [False]
+    semaphore = asyncio.Semaphore(args.connect_concurrency)
+    sockets, readers = [], []
+
+    async def open_one(user_id: int, slow: bool, target: ClientStats):
+        async with semaphore:
+            try:
+                websocket = await connect(args.port, user_id, slow)
+            except Exception:
+                target.failed += 1
+                return
+        sockets.append(websocket)
+        if not slow:
+            readers.append(asyncio.create_task(read(websocket, target, measuring)))
+
+    before = server_stats(args.port)
+    began = time.perf_counter()
+    await asyncio.gather(*(
+        open_one(index % args.users + 1, False, stats) for index in range(args.connections)
+    ))
+    connect_seconds = time.perf_counter() - began
+    await asyncio.gather(*(open_one(0, True, firehose_stats) for _ in range(args.slow)))
+    await asyncio.gather(*(open_one(0, False, firehose_stats) for _ in range(args.slow)))
+    connected = server_stats(args.port)
+
+    measuring[0] = True
+    cpu = connected["cpu_seconds"]
+    await asyncio.sleep(args.seconds)
+    measuring[0] = False
+    after = server_stats(args.port)
+
+    for websocket in sockets:
+        websocket.transport.abort()
+    await asyncio.gather(*readers, return_exceptions=True)
+    return stats, firehose_stats, connect_seconds, before, connected, after, cpu
+
+
+def report(args, stats, firehose_stats, connect_seconds, before, connected, after, cpu):
+    opened = args.connections - stats.failed
+    print(f"{opened} of {args.connections} connections over {args.users} users "
+          f"in {connect_seconds:.1f} s ({opened / connect_seconds:.0f}/s)")
+    per_connection = (connected["rss_mb"] - before["rss_mb"]) * 1024 / max(connected["connections"], 1)
+    print(f"server RSS {before['rss_mb']:.0f} MB idle, {connected['rss_mb']:.0f} MB with "
+          f"{connected['connections']} connections ({per_connection:.1f} KiB each), "
+          f"{after['rss_mb']:.0f} MB at the end")
+
+    frames = after["frames"] - connected["frames"]
+    published = after["published"] - connected["published"]
+    deliveries = after["deliveries"] - connected["deliveries"]
+    busy = (after["cpu_seconds"] - cpu) / args.seconds
+    print(f"{args.seconds:.0f} s: {published / args.seconds:.0f} events/s published, "
+          f"{frames / args.seconds:.0f} frames/s built ({published / max(frames, 1):.1f} events per frame), "
+          f"{deliveries / args.seconds:.0f} deliveries/s, server CPU {busy:.0%}")
+    if stats.latencies:
+        p50, p99 = np.percentile(stats.latencies, [50, 99]) * 1000
+        print(f"fan-out clients: {stats.frames / args.seconds:.0f} frames/s, "
+              f"{stats.events / args.seconds:.0f} events/s received, "
+              f"latency p50 {p50:.0f} ms p99 {p99:.0f} ms")
+    if firehose_stats.latencies:
+        p50, p99 = np.percentile(firehose_stats.latencies, [50, 99]) * 1000
+        print(f"firehose readers ({args.slow}): {firehose_stats.events / args.seconds / args.slow:.0f} "
+              f"events/s each, latency p50 {p50:.0f} ms p99 {p99:.0f} ms, "
+              f"dropped {firehose_stats.closed.get(1013, 0)}")
+    print(f"slow consumers dropped by the server: {after['dropped']} of {args.slow}")
+
+
+def main(args):
+    command = [sys.executable, "-m", "benchmarks.bench_live_channel", "--serve"] + [
+        f"--{name.replace('_', '-')}={value}" for name, value in vars(args).items()
+        if name in ("port", "users", "rate", "firehose")
+    ]
+    server = subprocess.Popen(command, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    try:
+        for _ in range(100):
+            try:
+                server_stats(args.port)
+                break
+            except OSError:
+                time.sleep(0.1)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (resource.getrlimit(resource.RLIMIT_NOFILE)[1],) * 2)
+        report(args, *asyncio.run(load(args)))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--connections", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=2000.0, help="sample events/s over all users")
+    parser.add_argument("--firehose", type=float, default=5000.0, help="events/s to user 0")
+    parser.add_argument("--slow", type=int, default=20, help="non-reading (and reading) clients of user 0")
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--connect-concurrency", type=int, default=200)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+    if arguments.serve:
+        serve(arguments)
+    else:
+        main(arguments)
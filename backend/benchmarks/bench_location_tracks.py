@@ -0,0 +1,240 @@
+"""Batched location tracks, the cell index and environment sharing.
+
+``--users`` users spread over ``--cities`` cities each upload a day of
+fixes, one per ``--interval`` seconds, in hourly batches through
+LocationStore.ingest. One user in ``--reporters`` records hourly
+environmental samples (air quality, UV, temperature, humidity, pressure,
+noise), ingested through IngestionService after the first 23 hours of
+fixes; the last hour of fixes is uploaded after them, so both refresh
+paths of the index run. Reports:
+
+* storage: bytes per fix of the encoded tracks, and SQLite file size per
+  fix of the location_tracks table against the same fixes as one
+  indexed row each
+* ingest: fixes/s of the batched uploads
+* reads: decode and one-day history latency, points and columnar
+* environment: conditions_query latency and RecommendationService
+  environmental_data coverage of users without sensors of their own
+
+    cd backend && python -m benchmarks.bench_location_tracks [--users 500]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+WORKDIR = tempfile.mkdtemp(prefix="bench-location-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(WORKDIR, 'location.db')}")
+
+import numpy as np  # noqa: E402
+from sqlalchemy import Column, DateTime, Float, Index, Integer, MetaData, String, Table  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.database import AsyncSessionLocal, async_engine, engine  # noqa: E402
+from app.models.user import Base, User  # noqa: E402
+from app.models import anomalies, locations, rollups  # noqa: E402,F401
+from app.schemas.health_data import HealthSyncPayload  # noqa: E402
+from app.schemas.location import LocationBatch  # noqa: E402
+from app.services.environment_index import AREA_METRICS, EnvironmentIndex, conditions  # noqa: E402
+from app.services.ingestion_service import IngestionService  # noqa: E402
+from app.services.location_store import LocationStore, decode_track  # noqa: E402
+from app.services.recommendation_service import RecommendationService  # noqa: E402
+from benchmarks.synthetic import _value_range  # noqa: E402
+
+# The day ends in the current hour, so its last readings are current conditions
+DAY = datetime.utcnow().replace(minute=0, second=0, microsecond=0) - timedelta(hours=23)
+EPOCH = datetime(1970, 1, 1)
+CITIES = [(37.7749, -122.4194), (40.7128, -74.0060), (51.5074, -0.1278), (48.8566, 2.3522),
+          (35.6762, 139.6503), (-33.8688, 151.2093), (52.5200, 13.4050), (41.8781, -87.6298)]
+
+
+def walk(rng, city, fixes: int, interval: int) -> Dict[str, np.ndarray]:
+    """A day of fixes wandering around a city, about 1.5 m/s on average"""
+    start = np.array(city) + rng.normal(0, 0.03, 2)
+    steps = rng.normal(0, interval * 1.5 / 111000, (fixes, 2))
+    path = start + np.cumsum(steps, axis=0)
+    return {
+        "timestamp": int((DAY - EPOCH).total_seconds()) + np.arange(fixes) * interval,
+        "latitude": path[:, 0],
+        "longitude": path[:, 1],
+        "accuracy": rng.gamma(2, 6, fixes)
+    }
+
+
+def batches(user_id: int, track: Dict[str, np.ndarray], hours: range) -> List[LocationBatch]:
+    hour_of = (track["timestamp"] - track["timestamp"][0]) // 3600
+    uploads = []
+    for hour in hours:
+        rows = np.flatnonzero(hour_of == hour)
+        uploads.append(LocationBatch(user_id=user_id, device_id="phone", fixes=[
+            {
+                "latitude": track["latitude"][row], "longitude": track["longitude"][row],
+                "timestamp": EPOCH + timedelta(seconds=int(track["timestamp"][row])),
+                "accuracy": track["accuracy"][row]
+            }
+            for row in rows.tolist()
+        ]))
+    return uploads
+
+
+def row_storage(tracks: Dict[int, Dict[str, np.ndarray]]) -> int:
+    """SQLite bytes of the same fixes stored one row each, indexed by user and time"""
+    path = os.path.join(WORKDIR, "rows.db")
+    rows_engine = create_engine(f"sqlite:///{path}")
+    metadata = MetaData()
+    table = Table(
+        "location_fixes", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("user_id", Integer, nullable=False),
+        Column("device_id", String, nullable=False),
+        Column("timestamp", DateTime, nullable=False),
+        Column("latitude", Float, nullable=False),
+        Column("longitude", Float, nullable=False),
+        Column("accuracy", Float),
+        Index("ix_location_fixes_user_time", "user_id", "timestamp")
+    )
+    metadata.create_all(rows_engine)
+    with rows_engine.begin() as connection:
+        for user_id, track in tracks.items():
+            connection.execute(table.insert(), [
+                {
+                    "user_id": user_id, "device_id": "phone", "timestamp": EPOCH + timedelta(seconds=timestamp),
+                    "latitude": latitude, "longitude": longitude, "accuracy": accuracy
+                }
+                for timestamp, latitude, longitude, accuracy in zip(
+                    track["timestamp"].tolist(), track["latitude"].tolist(),
+                    track["longitude"].tolist(), track["accuracy"].tolist()
+                )
+            ])
+    rows_engine.dispose()
+    return os.path.getsize(path)
+
+
+def track_storage() -> int:
+    """SQLite bytes of the location_tracks table on its own"""
+    path = os.path.join(WORKDIR, "tracks.db")
+    tracks_engine = create_engine(f"sqlite:///{path}")
+    table = locations.LocationTrack.__table__
+    table.metadata.create_all(tracks_engine, tables=[User.__table__, table])
+    with engine.connect() as source, tracks_engine.begin() as connection:
+        for copied in (User.__table__, table):
+            connection.execute(copied.insert(), [dict(row) for row in source.execute(copied.select()).mappings()])
+    tracks_engine.dispose()
+    return os.path.getsize(path)
+
+
+def timed(function, rounds: int = 20) -> float:
+    """Median milliseconds of ``rounds`` calls"""
+    durations = []
+    for _ in range(rounds):
+        began = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - began)
+    return statistics.median(durations) * 1000
+
+
+async def load_inputs(service: RecommendationService, users: List[int], now: datetime) -> List[Optional[Dict]]:
+    async with AsyncSessionLocal() as db:
+        results = [(await service.load_inputs(db, user_id, now))["environmental_data"] for user_id in users]
+    await async_engine.dispose()
+    return results
+
+
+def main(args):
+    rng = np.random.default_rng(0)
+    Base.metadata.create_all(engine)
+    fixes = 86400 // args.interval
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [
+            {"id": user_id, "email": f"user{user_id}@example.com", "hashed_password": "x"}
+            for user_id in range(1, args.users + 1)
+        ])
+    tracks = {
+        user_id: walk(rng, CITIES[user_id % args.cities], fixes, args.interval)
+        for user_id in range(1, args.users + 1)
+    }
+    reporters = [user_id for user_id in tracks if user_id % args.reporters == 0]
+    print(f"{args.users} users in {args.cities} cities, {fixes} fixes/day each, "
+          f"{len(reporters)} reporting environmental samples")
+
+    store = LocationStore()
+    Session = sessionmaker(bind=engine)
+    uploads = {user_id: batches(user_id, track, range(24)) for user_id, track in tracks.items()}
+
+    def upload(hours: range) -> float:
+        began = time.perf_counter()
+        with Session() as db:
+            for user_id in tracks:
+                for batch in uploads[user_id][hours.start:hours.stop]:
+                    store.ingest(db, batch)
+        return time.perf_counter() - began
+
+    elapsed = upload(range(0, 23))
+    ingestion = IngestionService()
+    samples_began = time.perf_counter()
+    with Session() as db:
+        for user_id in reporters:
+            samples = []
+            for metric in AREA_METRICS + ["noise_level"]:
+                low, high = _value_range(metric)
+                values = low + (high - low) * rng.beta(4, 4, 24)
+                samples.extend(
+                    {"type": metric, "value": float(value), "timestamp": DAY + timedelta(hours=hour, minutes=30)}
+                    for hour, value in enumerate(values)
+                )
+            ingestion.ingest(db, HealthSyncPayload(user_id=user_id, device_id="phone", samples=samples))
+    samples_elapsed = time.perf_counter() - samples_began
+    elapsed += upload(range(23, 24))
+
+    with Session() as db:
+        duplicate = store.ingest(db, uploads[1][0])
+    total = args.users * fixes
+    print(f"  ingest      {total / elapsed:10.0f} fixes/s ({args.users * 24} hourly batches in {elapsed:.2f} s); "
+          f"resent batch stored {duplicate['stored']}")
+    print(f"  samples     {len(reporters) * 144 / samples_elapsed:10.0f} environmental samples/s "
+          f"with readings refreshed")
+
+    with engine.connect() as connection:
+        encoded = connection.exec_driver_sql("SELECT sum(length(fixes)) FROM location_tracks").scalar()
+        cell_rows = connection.exec_driver_sql("SELECT count(*) FROM location_cells").scalar()
+        reading_rows = connection.exec_driver_sql("SELECT count(*) FROM environmental_readings").scalar()
+    tracks_bytes, rows_bytes = track_storage(), row_storage(tracks)
+    print(f"  storage     {encoded / total:10.2f} B/fix encoded, {tracks_bytes / total:.2f} B/fix as track rows, "
+          f"{rows_bytes / total:.2f} B/fix as one indexed row each ({rows_bytes / tracks_bytes:.1f}x); "
+          f"{cell_rows} cell/hour index rows, {reading_rows} area readings")
+
+    with engine.connect() as connection:
+        blob = connection.exec_driver_sql("SELECT fixes FROM location_tracks LIMIT 1").scalar()
+        per_batch = timed(lambda: decode_track(blob), 200)
+        day = DAY, DAY + timedelta(days=1)
+        points = timed(lambda: store.history_json(7, store.history(connection, 7, *day), False))
+        columnar = timed(lambda: store.history_json(7, store.history(connection, 7, *day), True))
+        print(f"  reads       decode {per_batch * 1000:.0f} us/batch of {fixes // 24}; "
+              f"one day history {points:.2f} ms points, {columnar:.2f} ms columnar")
+
+        now = datetime.utcnow()
+        environment = EnvironmentIndex()
+        query = environment.conditions_query(5, now)
+        lookup = timed(lambda: conditions(connection.execute(query)), 200)
+        print(f"  environment conditions lookup {lookup:.2f} ms")
+
+    others = [user_id for user_id in tracks if user_id not in reporters]
+    results = asyncio.run(load_inputs(RecommendationService(), others, now))
+    covered = [result for result in results if result]
+    keys = sorted({key for result in covered for key in result})
+    print(f"  engine      environmental_data for {len(covered)}/{len(others)} users without sensors "
+          f"({', '.join(keys)})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--cities", type=int, default=4)
+    parser.add_argument("--interval", type=int, default=60, help="seconds between fixes")
+    parser.add_argument("--reporters", type=int, default=5, help="one user in N records environmental samples")
+    main(parser.parse_args())
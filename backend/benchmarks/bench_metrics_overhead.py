@@ -0,0 +1,164 @@
+"""Cost of the Prometheus instrumentation on the hot paths it covers.
+
+Each path is timed with the instrumentation in place and with it swapped
+for a no-op, interleaved over several rounds; the best round of each is
+reported.
+
+* Histogram.observe on a pre-bound child
+* RecommendationEngine.generate_recommendations (six stage timers), rule
+  passes only and with a published model set
+* a trivial SELECT through an engine with the query listeners
+* GET /health-data/{type} through the ASGI app with the route middleware
+
+    cd backend && python -m benchmarks.bench_metrics_overhead
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import tempfile
+import time
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+
+os.environ.setdefault("MODEL_REGISTRY_DIR", tempfile.mkdtemp())
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from sqlalchemy import create_engine, text  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app import metrics  # noqa: E402
+from app.database import get_db, get_read_db  # noqa: E402
+from app.models.user import Base  # noqa: E402
+from app.models import health_data as health_data_models, rollups  # noqa: E402,F401
+from app.routers import health_data  # noqa: E402
+from app.schemas.health_data import HealthSyncPayload  # noqa: E402
+from app.services import recommendation_engine  # noqa: E402
+from app.services.ingestion_service import IngestionService  # noqa: E402
+from app.services.model_registry import model_registry  # noqa: E402
+from app.services.model_training import train_models, synthetic_training_set  # noqa: E402
+from benchmarks.synthetic import synthetic_users  # noqa: E402
+
+ROUNDS = 5
+
+
+class NoopTimer:
+    def time(self):
+        return nullcontext()
+
+
+def best_of(fn, n: int) -> float:
+    """Best per-call time of ``n`` calls over ROUNDS rounds"""
+    best = float("inf")
+    for _ in range(ROUNDS):
+        began = time.perf_counter()
+        for _ in range(n):
+            fn()
+        best = min(best, (time.perf_counter() - began) / n)
+    return best
+
+
+def report(label: str, plain: float, instrumented: float):
+    overhead = instrumented - plain
+    print(
+        f"  {label:<28} {plain * 1e6:9.2f} us -> {instrumented * 1e6:9.2f} us  "
+        f"({overhead * 1e6:+.2f} us, {overhead / plain:+.1%})"
+    )
+
+
+def bench_observe(n: int):
+    child = metrics.DB_QUERY_LATENCY.labels("select")
+    observe = best_of(lambda: child.observe(0.001), n)
+    print(f"  {'Histogram.observe':<28} {observe * 1e9:9.0f} ns per call")
+
+
+def bench_engine(label: str, n: int):
+    engine = recommendation_engine.RecommendationEngine()
+    users = synthetic_users(200).to_dict("records")
+    cycle = itertools.cycle(users)
+
+    timers = recommendation_engine.STAGE_TIMERS
+    instrumented = best_of(lambda: engine.generate_recommendations(next(cycle)), n)
+    recommendation_engine.STAGE_TIMERS = {stage: NoopTimer() for stage in timers}
+    plain = best_of(lambda: engine.generate_recommendations(next(cycle)), n)
+    recommendation_engine.STAGE_TIMERS = timers
+    report(label, plain, instrumented)
+
+
+def bench_queries(n: int):
+    plain_engine = create_engine("sqlite://")
+    instrumented_engine = create_engine("sqlite://")
+    metrics.instrument_engine(instrumented_engine)
+    with plain_engine.connect() as plain_connection, instrumented_engine.connect() as connection:
+        plain = best_of(lambda: plain_connection.execute(text("SELECT 1")).scalar(), n)
+        instrumented = best_of(lambda: connection.execute(text("SELECT 1")).scalar(), n)
+    report("SELECT 1 (SQLite, in memory)", plain, instrumented)
+
+
+def bench_route(n: int):
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    start = datetime(2024, 1, 1)
+    session = session_factory()
+    IngestionService().ingest(session, HealthSyncPayload(
+        user_id=1, device_id="bench-watch",
+        samples=[
+            {"type": "heart_rate", "value": 60 + minute % 40, "timestamp": start + timedelta(minutes=minute)}
+            for minute in range(1440)
+        ]
+    ))
+    session.close()
+
+    def override_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def build(instrumented: bool) -> FastAPI:
+        app = FastAPI()
+        if instrumented:
+            app.add_middleware(metrics.PrometheusMiddleware)
+        app.include_router(health_data.router)
+        app.dependency_overrides[get_db] = override_db
+        app.dependency_overrides[get_read_db] = override_db
+        return app
+
+    params = {"user_id": 1, "start": start.isoformat(), "end": (start + timedelta(hours=6)).isoformat()}
+
+    async def run(app) -> float:
+        async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+            best = float("inf")
+            for _ in range(ROUNDS):
+                began = time.perf_counter()
+                for _ in range(n):
+                    await client.get("/health-data/heart_rate", params=params)
+                best = min(best, (time.perf_counter() - began) / n)
+            return best
+
+    plain = asyncio.run(run(build(False)))
+    metrics.instrument_engine(engine)
+    instrumented = asyncio.run(run(build(True)))
+    report("GET /health-data/{type}", plain, instrumented)
+
+
+def main(args):
+    print("instrumentation overhead (best of 5 rounds)")
+    bench_observe(args.calls)
+    bench_engine("recommendations, rules only", args.calls // 10)
+    engine = recommendation_engine.RecommendationEngine()
+    model_registry.publish(train_models(*synthetic_training_set(20000, len(engine.genetic_features))))
+    bench_engine("recommendations, with models", args.calls // 100)
+    bench_queries(args.calls // 10)
+    bench_route(args.requests)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=300)
+    main(parser.parse_args())
@@ -0,0 +1,93 @@
+"""Worker cold-start time and RSS with and without the model registry.
+
+Each mode runs in a fresh interpreter, the way a newly booted uvicorn
+worker would:
+
+* train:    fit the RecommendationEngine models in the worker itself
+* load:     load the published version fully into memory
+* mmap:     load the published version memory-mapped (the registry default)
+
+RssAnon is private to the worker; RssFile is page cache shared between
+workers mapping the same artifacts. Linux only (reads /proc).
+
+    cd backend && python -m benchmarks.bench_model_registry
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def rss_kib() -> dict:
+    fields = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "RssAnon", "RssFile"):
+                fields[key] = int(value.split()[0])
+    return fields
+
+
+def worker(mode: str, samples: int):
+    started = time.perf_counter()
+    import joblib
+    from app.services.model_registry import model_registry, ModelBundle
+    from app.services.model_training import train_models, synthetic_training_set
+    from app.services.recommendation_engine import RecommendationEngine
+
+    engine = RecommendationEngine()
+    if mode == "train":
+        data = synthetic_training_set(samples, len(engine.genetic_features))
+        models = train_models(*data)
+        bundle = ModelBundle(version="local", metadata={}, **models)
+    elif mode == "load":
+        version = model_registry.current_version()
+        directory = os.path.join(model_registry.root, "versions", version)
+        models = {
+            name: joblib.load(os.path.join(directory, f"{name}.joblib"))
+            for name in ("genetic_risk_model", "lifestyle_model", "scaler")
+        }
+        bundle = ModelBundle(version=version, metadata={}, **models)
+    else:
+        bundle = model_registry.current()
+
+    engine.registry = type("Pinned", (), {"current": staticmethod(lambda: bundle)})()
+    engine._predict_risk_scores({"genetic_data": {"BRCA1": {"variant": "c.68_69delAG"}},
+                                 "lifestyle_data": {"age": 52, "bmi": 29}})
+    print(json.dumps(dict(rss_kib(), seconds=time.perf_counter() - started)))
+
+
+def main(args):
+    root = tempfile.mkdtemp()
+    env = dict(os.environ, MODEL_REGISTRY_DIR=root)
+    subprocess.run(
+        [sys.executable, "-m", "app.services.model_training", "--synthetic", str(args.samples)],
+        env=env, check=True, capture_output=True
+    )
+
+    print(f"worker cold start, models trained on {args.samples} synthetic users")
+    for mode in ("train", "load", "mmap"):
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_model_registry", "--worker", mode,
+             "--samples", str(args.samples)],
+            env=env, check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        print(
+            f"  {mode:<6} {result['seconds']:7.2f} s  RSS {result['VmRSS'] / 1024:6.1f} MiB "
+            f"(anon {result['RssAnon'] / 1024:6.1f}, file {result['RssFile'] / 1024:6.1f})"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--samples", type=int, default=20000)
+    parser.add_argument("--worker", choices=["train", "load", "mmap"])
+    args = parser.parse_args()
+    if args.worker:
+        worker(args.worker, args.samples)
+    else:
+        main(args)
@@ -0,0 +1,97 @@
+"""Range-query latency: raw health_data scans vs rollup routing.
+
+Ingests N days of minutely heart rate through IngestionService (which keeps
+the rollups current), then reads the last 30 days at hourly resolution both
+from raw samples and through TimeSeriesStore.query_range.
+
+    cd backend && python -m benchmarks.bench_range_query --days 90
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.user import Base
+from app.models import rollups  # noqa: F401
+from app.schemas.health_data import HealthSyncPayload
+from app.services.ingestion_service import IngestionService
+from app.services.timeseries_store import TimeSeriesStore, _aggregate
+
+
+def ingest_days(session_factory, service: IngestionService, days: int, start: datetime) -> float:
+    rng = np.random.default_rng(0)
+    elapsed = 0.0
+    for day in range(days):
+        values = rng.normal(72, 8, 1440).clip(40, 200).tolist()
+        payload = HealthSyncPayload(
+            user_id=1,
+            device_id="bench-watch",
+            samples=[
+                {
+                    "type": "heart_rate",
+                    "value": value,
+                    "timestamp": start + timedelta(days=day, minutes=minute)
+                }
+                for minute, value in enumerate(values)
+            ]
+        )
+        session = session_factory()
+        began = time.perf_counter()
+        service.ingest(session, payload)
+        elapsed += time.perf_counter() - began
+        session.close()
+    return elapsed
+
+
+def median_ms(fn, rounds: int) -> float:
+    timings = []
+    for _ in range(rounds):
+        began = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - began)
+    return statistics.median(timings) * 1000
+
+
+def main(args):
+    tmpdir = tempfile.mkdtemp()
+    engine = create_engine(f"sqlite:///{os.path.join(tmpdir, 'bench.db')}")
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    service = IngestionService()
+    store = TimeSeriesStore()
+
+    start = datetime(2024, 1, 1)
+    elapsed = ingest_days(session_factory, service, args.days, start)
+    samples = args.days * 1440
+    print(f"ingested {samples} samples with rollups: {samples / elapsed:.0f} rows/s")
+
+    end = start + timedelta(days=args.days)
+    window = end - timedelta(days=30)
+    with engine.connect() as connection:
+        def raw():
+            columns = store._read(connection, store.raw, None, 1, "heart_rate", window, end)
+            return _aggregate(columns, 3600)
+
+        def routed():
+            return store.query_range(connection, 1, "heart_rate", window, end, 3600)
+
+        assert len(routed()) == raw()["count"].size
+        print("last 30 days of heart_rate at 1h resolution")
+        print(f"  raw scan:      {median_ms(raw, args.rounds):8.1f} ms")
+        print(f"  hour rollup:   {median_ms(routed, args.rounds):8.1f} ms")
+        print(
+            "  day rollup:    "
+            f"{median_ms(lambda: store.query_range(connection, 1, 'heart_rate', window, end, 86400), args.rounds):8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--rounds", type=int, default=5)
+    main(parser.parse_args())
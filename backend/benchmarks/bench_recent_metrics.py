@@ -0,0 +1,181 @@
+"""Recent-window statistics from the columnar cache versus the database.
+
+Loads the last week of a handful of metrics for a set of users into a
+temporary SQLite database, then times "count/mean/min/max/stddev of every
+metric over the last 7 days for user X" three ways:
+
+* ORM: HealthData rows hydrated through a Session, statistics in NumPy
+* columns: timestamp and value columns only (a cache miss costs this)
+* cache: RecentMetricsCache.window_stats on a warm cache
+
+Also reports the cache memory per user against the hydrated ORM rows of
+the same window, and the cost of an ingestion batch updating the cache.
+
+    cd backend && python -m benchmarks.bench_recent_metrics
+"""
+import argparse
+import gc
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Dict
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.user import Base
+from app.models.health_data import HealthData
+from app.models import rollups  # noqa: F401
+from app.schemas.health_data import HealthSyncPayload
+from app.services.ingestion_service import IngestionService
+from app.services.recent_metrics import RecentMetricsCache
+
+# Minutes between samples: a watch recording heart rate every minute
+INTERVALS = {
+    "heart_rate": 1, "heart_rate_variability": 60, "respiratory_rate": 60,
+    "blood_oxygen": 60, "noise_level": 30, "body_temperature": 1440
+}
+
+
+def load_users(session_factory, users: int, days: int, now: datetime) -> int:
+    rng = np.random.default_rng(0)
+    # No cache attached while loading: the benchmark fills its own
+    service = IngestionService(recent=RecentMetricsCache(max_bytes=0))
+    # A little inside the window, so no sample falls out of it while the benchmark runs
+    first = now - timedelta(days=days) + timedelta(minutes=10)
+    total = 0
+    for user_id in range(1, users + 1):
+        samples = []
+        for metric, interval in INTERVALS.items():
+            count = days * 1440 // interval
+            values = rng.normal(70, 5, count).clip(40, 100).round(1).tolist()
+            samples.extend(
+                {"type": metric, "value": value, "timestamp": first + timedelta(minutes=index * interval)}
+                for index, value in enumerate(values)
+            )
+        session = session_factory()
+        total += service.ingest(session, HealthSyncPayload(
+            user_id=user_id, device_id="bench-watch", samples=samples
+        ))["inserted"]
+        session.close()
+    return total
+
+
+def orm_stats(session, user_id: int, since: datetime) -> Dict[str, Dict]:
+    rows = session.query(HealthData).filter(
+        HealthData.user_id == user_id, HealthData.timestamp >= since
+    ).all()
+    values: Dict[str, list] = {}
+    for row in rows:
+        values.setdefault(row.data_type, []).append(row.value)
+    return {metric: _stats(np.array(series)) for metric, series in values.items()}
+
+
+def column_stats(connection, user_id: int, since: datetime) -> Dict[str, Dict]:
+    table = HealthData.__table__
+    rows = connection.execute(
+        table.select().with_only_columns([table.c.data_type, table.c.value])
+        .where(table.c.user_id == user_id, table.c.timestamp >= since)
+        .order_by(table.c.data_type, table.c.timestamp)
+    ).all()
+    values: Dict[str, list] = {}
+    for data_type, value in rows:
+        values.setdefault(data_type, []).append(value)
+    return {metric: _stats(np.array(series)) for metric, series in values.items()}
+
+
+def _stats(values: np.ndarray) -> Dict:
+    return {
+        "count": len(values), "mean": values.mean(), "min": values.min(),
+        "max": values.max(), "stddev": values.std()
+    }
+
+
+def timed(fn, rounds: int):
+    latencies = []
+    for index in range(rounds):
+        began = time.perf_counter()
+        fn(index)
+        latencies.append(time.perf_counter() - began)
+    return statistics.median(latencies) * 1000, np.percentile(latencies, 99) * 1000
+
+
+def main(args):
+    path = os.path.join(tempfile.mkdtemp(), "recent.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    now = datetime.utcnow().replace(second=0, microsecond=0)
+    began = time.perf_counter()
+    rows = load_users(session_factory, args.users, args.days, now)
+    print(f"{args.users} users, {rows} samples over {args.days} days "
+          f"({rows // args.users} per user), loaded in {time.perf_counter() - began:.1f} s")
+
+    since = now - timedelta(days=args.days)
+    rng = np.random.default_rng(1)
+    picks = (rng.integers(args.users, size=args.rounds) + 1).tolist()
+    cache = RecentMetricsCache(window_days=args.days, max_bytes=args.cache_mb * 1024 * 1024, ttl=3600)
+
+    session = session_factory()
+    connection = session.connection()
+    orm = timed(lambda i: orm_stats(session, picks[i], since), args.rounds)
+    session.expunge_all()
+    columns = timed(lambda i: column_stats(connection, picks[i], since), args.rounds)
+
+    # Warm every user, then measure hits only
+    gc.collect()
+    tracemalloc.start()
+    for user_id in range(1, args.users + 1):
+        cache.lookup(connection, user_id)
+    cache_traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    hits = timed(lambda i: cache.window_stats(connection, picks[i]), args.rounds)
+    one_day = timed(lambda i: cache.window_stats(connection, picks[i], seconds=86400), args.rounds)
+
+    expected = column_stats(connection, picks[0], since)
+    cached = cache.window_stats(connection, picks[0])
+    assert all(cached[metric]["count"] == expected[metric]["count"] for metric in expected)
+    assert all(abs(cached[metric]["mean"] - expected[metric]["mean"]) < 1e-3 for metric in expected)
+
+    tracemalloc.start()
+    hydrated = session.query(HealthData).filter(
+        HealthData.user_id == 1, HealthData.timestamp >= since
+    ).all()
+    orm_traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del hydrated
+    session.close()
+
+    print(f"window statistics of every metric, median / p99 over {args.rounds} reads:")
+    for label, (p50, p99) in (
+        ("ORM rows", orm), ("timestamp, value columns", columns),
+        ("cache, 7-day window", hits), ("cache, last 24 h", one_day)
+    ):
+        print(f"  {label:<26} {p50:8.3f} ms {p99:8.3f} ms")
+
+    stats = cache.stats()
+    print("memory per user:")
+    print(f"  cache buffers              {stats['bytes'] / stats['users'] / 1024:8.1f} KiB")
+    print(f"  cache, all allocations     {cache_traced / args.users / 1024:8.1f} KiB")
+    print(f"  hydrated ORM rows          {orm_traced / 1024:8.1f} KiB")
+
+    # An ingestion batch of one more minute of every metric, for a cached user
+    batch = [
+        {"data_type": metric, "value": 70.0, "timestamp": now + timedelta(minutes=1)}
+        for metric in INTERVALS
+    ]
+    p50, _ = timed(lambda i: cache.record(picks[i], batch), args.rounds)
+    print(f"record() of a {len(batch)}-sample batch: {p50 * 1000:.1f} us")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--cache-mb", type=int, default=64)
+    main(parser.parse_args())
@@ -0,0 +1,84 @@
+"""Dashboard loads of GET /recommendations/{user_id}: uncached engine vs cache.
+
+Simulates a Zipf-like population of dashboard loads where a small share of
+users sync new health data between loads, with the local tier alone and
+with fakeredis standing in for the shared Redis tier.
+
+    cd backend && python -m benchmarks.bench_recommendation_cache
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("MODEL_REGISTRY_DIR", tempfile.mkdtemp())
+
+from app.services.model_registry import model_registry  # noqa: E402
+from app.services.model_training import train_models, synthetic_training_set  # noqa: E402
+from app.services.recommendation_cache import RecommendationCache  # noqa: E402
+from app.services.recommendation_engine import RecommendationEngine  # noqa: E402
+from benchmarks.synthetic import synthetic_users  # noqa: E402
+
+
+def workload(users: int, loads: int, sync_share: float, seed: int = 0):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(users)]
+    for user_id in rng.choices(range(users), weights=weights, k=loads):
+        yield user_id, rng.random() < sync_share
+
+
+async def run(label: str, engine, population, cache, loads, sync_share):
+    latencies = []
+    for user_id, synced in workload(len(population), loads, sync_share):
+        user_data = population[user_id]
+        if synced and cache is not None:
+            await cache.invalidate(user_id)
+
+        began = time.perf_counter()
+        if cache is None:
+            engine.generate_recommendations(user_data)
+        else:
+            await cache.get_or_compute(
+                user_id, user_data,
+                lambda: asyncio.to_thread(engine.generate_recommendations, user_data)
+            )
+        latencies.append(time.perf_counter() - began)
+    # Let pending revalidations finish before reading stats
+    await asyncio.sleep(0.1)
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(f"  {label:<22} mean {statistics.mean(latencies) * 1e3:7.3f} ms  p99 {p99 * 1e3:7.3f} ms")
+    if cache is not None:
+        stats = cache.stats()
+        print(
+            f"  {'':<22} hit rate {stats['hit_rate']:.1%} "
+            f"({stats['hits']} fresh, {stats['stale_hits']} stale, {stats['misses']} misses)"
+        )
+
+
+async def main(args):
+    engine = RecommendationEngine()
+    if model_registry.current() is None:
+        model_registry.publish(train_models(*synthetic_training_set(20000, len(engine.genetic_features))))
+    population = synthetic_users(args.users).to_dict("records")
+    print(f"{args.loads} dashboard loads over {args.users} users, {args.sync_share:.0%} after a sync")
+
+    await run("no cache", engine, population, None, args.loads, args.sync_share)
+    await run("local LRU", engine, population, RecommendationCache(redis_url=None),
+              args.loads, args.sync_share)
+
+    import fakeredis.aioredis
+    cache = RecommendationCache(redis_client=fakeredis.aioredis.FakeRedis())
+    await run("local + fakeredis", engine, population, cache, args.loads, args.sync_share)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--loads", type=int, default=20000)
+    parser.add_argument("--sync-share", type=float, default=0.05)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,64 @@
+"""Nightly recommendation recompute: per-user loop vs batch vs sharded pool.
+
+Publishes a model set trained on synthetic data into a temporary registry,
+checks that batch results equal the single-user path, then times each mode.
+The per-user loop is timed on a sample and extrapolated for large N.
+
+    cd backend && python -m benchmarks.bench_recommendations_batch --users 10000 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+os.environ.setdefault("MODEL_REGISTRY_DIR", tempfile.mkdtemp())
+
+from app.services.batch_recommendations import run_nightly_batch  # noqa: E402
+from app.services.model_registry import model_registry  # noqa: E402
+from app.services.model_training import train_models, synthetic_training_set  # noqa: E402
+from app.services.recommendation_engine import RecommendationEngine  # noqa: E402
+from benchmarks.synthetic import synthetic_users  # noqa: E402
+
+LOOP_SAMPLE = 2000
+
+
+def main(args):
+    engine = RecommendationEngine()
+    if model_registry.current() is None:
+        model_registry.publish(train_models(*synthetic_training_set(20000, len(engine.genetic_features))))
+
+    check = synthetic_users(500, seed=1)
+    batch = engine.generate_recommendations_batch(check)
+    single = [engine.generate_recommendations(row) for row in check.to_dict("records")]
+    assert batch == single, "batch results differ from the single-user path"
+    print("batch output identical to generate_recommendations on 500 users")
+
+    for n in args.users:
+        users = synthetic_users(n)
+        sample = users.iloc[:min(n, LOOP_SAMPLE)].to_dict("records")
+        began = time.perf_counter()
+        for user_data in sample:
+            engine.generate_recommendations(user_data)
+        loop = (time.perf_counter() - began) * n / len(sample)
+
+        began = time.perf_counter()
+        engine.generate_recommendations_batch(users)
+        in_process = time.perf_counter() - began
+
+        began = time.perf_counter()
+        for _ in run_nightly_batch(users, shard_size=args.shard_size, workers=args.workers):
+            pass
+        pooled = time.perf_counter() - began
+
+        print(f"{n} users")
+        print(f"  per-user loop{' (extrapolated)' if n > LOOP_SAMPLE else ''}  {loop:8.2f} s")
+        print(f"  batch, one process  {in_process:8.2f} s")
+        print(f"  batch, {args.workers or os.cpu_count()} worker pool, {args.shard_size}-user shards {pooled:6.2f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--shard-size", type=int, default=5000)
+    parser.add_argument("--workers", type=int)
+    main(parser.parse_args())
@@ -0,0 +1,110 @@
+"""Encoding a list response of raw health samples: ORM + to_dict vs bulk serializer.
+
+Loads minutely heart rate into a temporary SQLite database, then builds
+the JSON body for N samples three ways, query included:
+
+* orm:      HealthData instances -> to_dict -> jsonable_encoder -> json.dumps
+            (what a FastAPI route returning to_dict rows does)
+* tuples:   result tuples -> HealthDataSerializer.samples_json (orjson)
+* columnar: (timestamp, value) tuples -> parallel arrays (orjson)
+
+    cd backend && python -m benchmarks.bench_serialization
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.user import Base
+from app.models.health_data import HealthData
+from app.models import rollups  # noqa: F401
+from app.schemas.health_data import HealthSyncPayload
+from app.services.health_serializer import HealthDataSerializer
+from app.services.ingestion_service import IngestionService
+
+START = datetime(2024, 1, 1)
+
+
+def load(session_factory, samples: int):
+    rng = np.random.default_rng(0)
+    service = IngestionService()
+    for day in range(-(-samples // 1440)):
+        session = session_factory()
+        service.ingest(session, HealthSyncPayload(
+            user_id=1, device_id="bench-watch",
+            samples=[
+                {"type": "heart_rate", "value": value, "timestamp": START + timedelta(days=day, minutes=minute)}
+                for minute, value in enumerate(rng.normal(72, 8, 1440).clip(40, 200).tolist())
+            ]
+        ))
+        session.close()
+
+
+def best(fn, rounds: int = 5):
+    timings = []
+    for _ in range(rounds):
+        began = time.perf_counter()
+        body = fn()
+        timings.append(time.perf_counter() - began)
+    return min(timings), body
+
+
+def main(args):
+    engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    load(session_factory, max(args.sizes))
+    serializer = HealthDataSerializer()
+    table = serializer.table
+
+    for n in args.sizes:
+        end = START + timedelta(minutes=n)
+        session = session_factory()
+
+        def orm():
+            rows = (
+                session.query(HealthData)
+                .filter(HealthData.user_id == 1, HealthData.data_type == "heart_rate",
+                        HealthData.timestamp >= START, HealthData.timestamp < end)
+                .order_by(HealthData.timestamp).all()
+            )
+            body = json.dumps(jsonable_encoder([row.to_dict() for row in rows])).encode()
+            session.expunge_all()
+            return body
+
+        def tuples():
+            rows = serializer.read_samples(session.connection(), 1, "heart_rate", START, end, n)
+            return serializer.samples_json(rows)
+
+        def columnar():
+            rows = serializer.read_samples(
+                session.connection(), 1, "heart_rate", START, end, n,
+                columns=[table.c.timestamp, table.c.value]
+            )
+            return serializer.samples_columnar_json("heart_rate", "bpm", rows)
+
+        orm_time, orm_body = best(orm)
+        tuples_time, tuples_body = best(tuples)
+        columnar_time, columnar_body = best(columnar)
+        session.close()
+        assert json.loads(orm_body) == json.loads(tuples_body), "bulk rows differ from to_dict"
+
+        print(f"{n} samples")
+        for label, elapsed, body in (
+            ("orm + to_dict", orm_time, orm_body),
+            ("tuples + orjson", tuples_time, tuples_body),
+            ("columnar", columnar_time, columnar_body),
+        ):
+            print(f"  {label:<16} {elapsed * 1000:8.1f} ms  {len(body) / 1024:8.0f} KiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    main(parser.parse_args())
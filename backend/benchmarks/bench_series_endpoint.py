@@ -0,0 +1,117 @@
+"""Response size and latency of GET /health-data/{type} over one year.
+
+Loads a year of minutely heart rate into a temporary SQLite database and
+compares shipping every raw sample with the downsampled endpoint.
+
+    cd backend && python -m benchmarks.bench_series_endpoint
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from app.database import get_db, get_read_db
+from app.models.user import Base
+from app.models.health_data import HealthData
+from app.models import rollups  # noqa: F401
+from app.routers import health_data
+from app.schemas.health_data import HealthSyncPayload
+from app.services.ingestion_service import IngestionService
+
+START = datetime(2023, 1, 1)
+
+
+def load_year(session_factory, days: int):
+    rng = np.random.default_rng(0)
+    service = IngestionService()
+    for day in range(days):
+        values = rng.normal(72, 8, 1440).clip(40, 200).tolist()
+        session = session_factory()
+        service.ingest(session, HealthSyncPayload(
+            user_id=1,
+            device_id="bench-watch",
+            samples=[
+                {"type": "heart_rate", "value": value, "timestamp": START + timedelta(days=day, minutes=minute)}
+                for minute, value in enumerate(values)
+            ]
+        ))
+        session.close()
+
+
+def percentile_ms(timings, q):
+    return float(np.percentile(timings, q)) * 1000
+
+
+def main(args):
+    tmpdir = tempfile.mkdtemp()
+    engine = create_engine(
+        f"sqlite:///{os.path.join(tmpdir, 'bench.db')}", connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    load_year(session_factory, args.days)
+
+    def override_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    app.include_router(health_data.router)
+    app.dependency_overrides[get_db] = override_db
+    app.dependency_overrides[get_read_db] = override_db
+    client = TestClient(app)
+    end = START + timedelta(days=args.days)
+
+    def raw_response():
+        # Every sample serialized, as a non-downsampled list endpoint would
+        table = HealthData.__table__
+        with engine.connect() as connection:
+            rows = connection.execute(
+                select(table.c.data_type, table.c.value, table.c.timestamp)
+                .where(table.c.user_id == 1, table.c.data_type == "heart_rate")
+                .order_by(table.c.timestamp)
+            ).all()
+        return json.dumps([
+            {"type": t, "value": v, "timestamp": ts.isoformat()} for t, v, ts in rows
+        ]).encode()
+
+    def series_response():
+        response = client.get("/health-data/heart_rate", params={
+            "user_id": 1, "start": START.isoformat(), "end": end.isoformat(),
+            "max_points": args.max_points
+        })
+        response.raise_for_status()
+        return response.content
+
+    print(f"{args.days} days of minutely heart_rate ({args.days * 1440} samples)")
+    for label, fn, rounds in (
+        ("raw samples", raw_response, max(args.rounds // 10, 3)),
+        (f"downsampled ({args.max_points} pts)", series_response, args.rounds)
+    ):
+        timings = []
+        for _ in range(rounds):
+            began = time.perf_counter()
+            body = fn()
+            timings.append(time.perf_counter() - began)
+        print(
+            f"  {label:<26} {len(body) / 1024:9.1f} KiB  "
+            f"p50 {percentile_ms(timings, 50):7.1f} ms  p95 {percentile_ms(timings, 95):7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--max-points", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=50)
+    main(parser.parse_args())
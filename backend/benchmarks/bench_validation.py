@@ -0,0 +1,61 @@
+"""Micro-benchmark of per-row vs columnar HealthData validation.
+
+    cd backend && python -m benchmarks.bench_validation --samples 1000000
+"""
+import argparse
+import time
+import numpy as np
+
+from app.models.health_data import HealthData, metric_validator
+
+
+def legacy_validate(data_type: str, value: float) -> bool:
+    """HealthData.validate_data before the lookup tables"""
+    if data_type in HealthData.Config.thresholds:
+        threshold = HealthData.Config.thresholds[data_type]
+        if threshold["min"] <= value <= threshold["max"]:
+            return True
+    return False
+
+
+def legacy_metric_type(data_type: str) -> str:
+    """HealthData.get_metric_type before the lookup tables"""
+    for metric_type, metrics in HealthData.Config.metric_types.items():
+        if data_type in metrics:
+            return metric_type
+    return "other"
+
+
+def timed(label: str, n: int, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<28} {elapsed * 1000:9.1f} ms  {n / elapsed / 1e6:7.2f} M samples/s")
+
+
+def main(args):
+    rng = np.random.default_rng(0)
+    n = args.samples
+    types = np.array(HealthData.Config.supported_types)[
+        rng.integers(0, len(HealthData.Config.supported_types), n)
+    ].tolist()
+    values = rng.uniform(0, 250, n)
+    value_list = values.tolist()
+    type_ids = metric_validator.encode_types(types)
+
+    print(f"{n} samples")
+    timed("legacy per-row", n, lambda: [
+        (legacy_validate(t, v), legacy_metric_type(t)) for t, v in zip(types, value_list)
+    ])
+    timed("per-row wrappers", n, lambda: [
+        (metric_validator.validate(t, v), metric_validator.metric_type(t))
+        for t, v in zip(types, value_list)
+    ])
+    timed("batch (encode + validate)", n, lambda: metric_validator.validate_batch(types, values))
+    timed("batch (pre-encoded IDs)", n, lambda: metric_validator.validate_batch(type_ids, values))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--samples", type=int, default=1_000_000)
+    main(parser.parse_args())
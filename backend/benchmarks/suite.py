@@ -0,0 +1,385 @@
+"""Backend benchmark suite with JSON results and regression checks.
+
+Micro-benchmarks of the per-row and per-user hot paths, end-to-end
+scenarios run in-process against ``app.main.app``, and the cold start of
+an API worker and of an inference worker in fresh interpreters. SQLite
+stands in for Postgres and fakeredis for Redis. Every run is written to
+benchmarks/results/<timestamp>.json and compared with a baseline. The
+run exits with status 1 when a tracked metric is worse than the baseline
+by more than the threshold.
+
+Baselines are machine-specific. Record one on the machine that runs the
+checks:
+
+    cd backend && python -m benchmarks.suite --update-baseline
+    cd backend && python -m benchmarks.suite                # compare
+    cd backend && python -m benchmarks.suite --quick --only micro
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+workdir = tempfile.mkdtemp(prefix="bench-suite-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'suite.db')}"
+os.environ["MODEL_REGISTRY_DIR"] = os.path.join(workdir, "models")
+os.environ.pop("REDIS_URL", None)
+
+import fakeredis.aioredis  # noqa: E402
+import httpx  # noqa: E402
+import numpy as np  # noqa: E402
+
+from app.database import engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.user import Base  # noqa: E402
+from app.models import rollups  # noqa: E402,F401
+from app.services.executors import inference_executor  # noqa: E402
+from app.services.model_registry import model_registry  # noqa: E402
+from app.services.model_training import train_models, synthetic_training_set  # noqa: E402
+from app.services.recommendation_cache import recommendation_cache  # noqa: E402
+from app.services.recommendation_engine import RecommendationEngine  # noqa: E402
+from benchmarks.synthetic import synthetic_health_data, synthetic_samples, synthetic_users  # noqa: E402
+
+BENCHMARK_DIR = os.path.dirname(__file__)
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, "results")
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, "baseline.json")
+DEFAULT_THRESHOLD = 0.2
+ROUNDS = 5
+START = datetime(2024, 1, 1)
+# Packages API workers must not import at startup
+HEAVY_MODULES = ["pandas", "sklearn", "scipy", "tensorflow", "torch"]
+
+# Run in a fresh interpreter; prints the import time, peak RSS and heavy modules loaded
+# Peak RSS is read from VmHWM (Linux): ru_maxrss would carry over the suite's own peak
+STARTUP_PROBE = """
+import json, sys, time
+began = time.perf_counter()
+{body}
+with open("/proc/self/status") as status:
+    peak_kb = next(int(line.split()[1]) for line in status if line.startswith("VmHWM:"))
+print(json.dumps({{
+    "seconds": time.perf_counter() - began,
+    "rss_mb": peak_kb / 1024,
+    "heavy": [name for name in {heavy!r} if name in sys.modules]
+}}))
+"""
+
+# name -> (group, function); functions return {metric: (value, unit, better)}
+BENCHMARKS: Dict[str, tuple] = {}
+
+
+def benchmark(name: str, group: str):
+    def register(fn: Callable):
+        BENCHMARKS[name] = (group, fn)
+        return fn
+    return register
+
+
+def per_call(fn: Callable, n: int) -> float:
+    """Median over ROUNDS of the mean time of ``n`` calls"""
+    timings = []
+    for _ in range(ROUNDS):
+        began = time.perf_counter()
+        for _ in range(n):
+            fn()
+        timings.append((time.perf_counter() - began) / n)
+    return statistics.median(timings)
+
+
+@benchmark("validate_data", "micro")
+def bench_validate_data(scale: float):
+    rows = synthetic_health_data(int(20000 * scale))
+    elapsed = per_call(lambda: [row.validate_data() for row in rows], 1)
+    return {"validate_data.per_row": (elapsed / len(rows) * 1e9, "ns", "lower")}
+
+
+@benchmark("to_dict", "micro")
+def bench_to_dict(scale: float):
+    rows = synthetic_health_data(int(20000 * scale))
+    elapsed = per_call(lambda: [row.to_dict() for row in rows], 1)
+    return {"to_dict.per_row": (elapsed / len(rows) * 1e9, "ns", "lower")}
+
+
+@benchmark("generate_recommendations", "micro")
+def bench_generate_recommendations(scale: float):
+    engine = RecommendationEngine()
+    users = synthetic_users(int(1000 * scale)).to_dict("records")
+    elapsed = per_call(lambda: [engine.generate_recommendations(user) for user in users], 1)
+    batch = synthetic_users(int(10000 * scale))
+    batch_elapsed = per_call(lambda: engine.generate_recommendations_batch(batch), 1)
+    return {
+        "generate_recommendations.per_user": (elapsed / len(users) * 1e6, "us", "lower"),
+        "generate_recommendations_batch.per_user": (batch_elapsed / len(batch) * 1e6, "us", "lower"),
+    }
+
+
+async def concurrent(client: httpx.AsyncClient, requests: List[Callable], concurrency: int) -> List[float]:
+    """Issue requests from ``concurrency`` workers; latencies in seconds"""
+    queue = list(reversed(requests))
+    latencies = []
+
+    async def worker():
+        while queue:
+            request = queue.pop()
+            began = time.perf_counter()
+            response = await request(client)
+            latencies.append(time.perf_counter() - began)
+            response.raise_for_status()
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+def percentiles(prefix: str, latencies: List[float]) -> Dict:
+    # p99 of a few hundred in-process requests is too noisy to gate on
+    p50, p95 = np.percentile(latencies, [50, 95]) * 1000
+    return {
+        f"{prefix}.p50": (p50, "ms", "lower"),
+        f"{prefix}.p95": (p95, "ms", "lower"),
+    }
+
+
+def run_app(scenario: Callable, *args) -> Dict:
+    """Run ``scenario(client, *args)`` against app.main.app with startup/shutdown"""
+    async def main():
+        # fakeredis binds to the running loop, so a fresh one per scenario
+        recommendation_cache.redis = fakeredis.aioredis.FakeRedis()
+        await app.router.startup()
+        try:
+            async with httpx.AsyncClient(app=app, base_url="http://suite") as client:
+                return await scenario(client, *args)
+        finally:
+            await app.router.shutdown()
+    return asyncio.run(main())
+
+
+async def create_users(client: httpx.AsyncClient, n: int) -> List[int]:
+    ids = []
+    for user in synthetic_users(n, seed=7).to_dict("records"):
+        response = await client.post("/users/", json={
+            "email": f"suite-{user['user_id']}-{time.monotonic_ns()}@example.com",
+            "genetic_data": user["genetic_data"],
+            "lifestyle_data": user["lifestyle_data"],
+            "medical_history": user["medical_history"],
+        })
+        response.raise_for_status()
+        ids.append(response.json()["id"])
+    return ids
+
+
+@benchmark("ingest", "e2e")
+def bench_ingest(scale: float):
+    async def scenario(client, batches, batch_size):
+        user_id = (await create_users(client, 1))[0]
+        samples = synthetic_samples(batches * batch_size, seed=3, start=START)
+        payloads = [
+            {"user_id": user_id, "device_id": "suite-watch", "samples": [
+                dict(sample, timestamp=sample["timestamp"].isoformat())
+                for sample in samples[start:start + batch_size]
+            ]}
+            for start in range(0, len(samples), batch_size)
+        ]
+        # One client: SQLite serialises writers, so concurrent syncs only measure lock waits
+        began = time.perf_counter()
+        latencies = await concurrent(
+            client, [lambda c, p=payload: c.post("/health-data/sync", json=p) for payload in payloads], 1
+        )
+        elapsed = time.perf_counter() - began
+        return dict(
+            percentiles("ingest.batch", latencies),
+            **{"ingest.throughput": (len(samples) / elapsed, "samples/s", "higher")}
+        )
+    return run_app(scenario, max(4, int(40 * scale)), 1000)
+
+
+@benchmark("health_series", "e2e")
+def bench_health_series(scale: float):
+    async def scenario(client, days, requests):
+        user_id = (await create_users(client, 1))[0]
+        for day in range(days):
+            response = await client.post("/health-data/sync", json={
+                "user_id": user_id, "device_id": "suite-watch", "samples": [
+                    {"type": "heart_rate", "value": 60 + (minute * 7) % 50,
+                     "timestamp": (START + timedelta(days=day, minutes=minute)).isoformat()}
+                    for minute in range(1440)
+                ]
+            })
+            response.raise_for_status()
+
+        rng = np.random.default_rng(0)
+        spans = [1, 7, days]
+        calls = []
+        for _ in range(requests):
+            span = spans[rng.integers(len(spans))]
+            first = START + timedelta(days=int(rng.integers(0, days - span + 1)))
+            params = {"user_id": user_id, "start": first.isoformat(),
+                      "end": (first + timedelta(days=span)).isoformat()}
+            calls.append(lambda c, p=params: c.get("/health-data/heart_rate", params=p))
+        return percentiles("health_series", await concurrent(client, calls, 8))
+    return run_app(scenario, max(7, int(30 * scale)), max(50, int(400 * scale)))
+
+
+@benchmark("recommendations", "e2e")
+def bench_recommendations(scale: float):
+    async def scenario(client, users, requests):
+        warmup, *ids = await create_users(client, users + 1)
+        # Starts the inference pool, which would otherwise land in the miss tail
+        (await client.get(f"/recommendations/{warmup}")).raise_for_status()
+        misses = await concurrent(
+            client, [lambda c, u=user_id: c.get(f"/recommendations/{u}") for user_id in ids], 8
+        )
+        rng = np.random.default_rng(1)
+        hits = await concurrent(client, [
+            lambda c, u=int(rng.choice(ids)): c.get(f"/recommendations/{u}") for _ in range(requests)
+        ], 8)
+        stats = (await client.get("/recommendations/cache/stats")).json()
+        return dict(
+            percentiles("recommendations.miss", misses),
+            **percentiles("recommendations.hit", hits),
+            **{"recommendations.hit_rate": (stats["hit_rate"], "ratio", "higher")}
+        )
+    return run_app(scenario, max(20, int(200 * scale)), max(100, int(2000 * scale)))
+
+
+def probe(body: str, importtime: bool = False) -> subprocess.CompletedProcess:
+    code = STARTUP_PROBE.format(body=body, heavy=HEAVY_MODULES)
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    return subprocess.run(
+        command, cwd=os.path.dirname(BENCHMARK_DIR), capture_output=True, text=True, check=True
+    )
+
+
+def import_report(stderr: str, top: int = 8) -> str:
+    """Self import time per top-level package from ``-X importtime`` output"""
+    totals = Counter()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        totals[name.strip().split(".")[0]] += int(self_us)
+    return ", ".join(f"{name} {us / 1000:.0f} ms" for name, us in totals.most_common(top))
+
+
+def measure_startup(prefix: str, body: str) -> Dict:
+    runs = [json.loads(probe(body).stdout) for _ in range(ROUNDS)]
+    print(f"{prefix} imports: {import_report(probe(body, importtime=True).stderr)}", file=sys.stderr)
+    return {
+        f"{prefix}.import": (statistics.median(run["seconds"] for run in runs) * 1000, "ms", "lower"),
+        f"{prefix}.rss": (max(run["rss_mb"] for run in runs), "MB", "lower"),
+        f"{prefix}.heavy_modules": (len(runs[0]["heavy"]), "modules", "lower"),
+    }
+
+
+@benchmark("api_startup", "startup")
+def bench_api_startup(scale: float):
+    return measure_startup("startup.api", "import app.main")
+
+
+@benchmark("inference_startup", "startup")
+def bench_inference_startup(scale: float):
+    # What _init_inference_worker does, models included (published by main())
+    return measure_startup("startup.inference_worker", (
+        "from app.services.recommendation_engine import RecommendationEngine\n"
+        "RecommendationEngine().registry.current()"
+    ))
+
+
+def compare(metrics: Dict, baseline: Dict, threshold: float) -> List[str]:
+    regressions = []
+    for name, metric in sorted(metrics.items()):
+        reference = baseline.get(name)
+        if reference is None:
+            print(f"  {name:<42} {metric['value']:12.3f} {metric['unit']:<10} (new)")
+            continue
+        if reference["value"]:
+            change = (metric["value"] - reference["value"]) / reference["value"]
+        else:
+            # e.g. heavy modules at startup: any appearance counts
+            change = float("inf") if metric["value"] > 0 else 0.0
+        worse = change if metric["better"] == "lower" else -change
+        flag = "REGRESSED" if worse > threshold else ""
+        print(f"  {name:<42} {metric['value']:12.3f} {metric['unit']:<10} {change:+7.1%} {flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main(args) -> int:
+    Base.metadata.create_all(engine)
+    if model_registry.current() is None:
+        model_registry.publish(train_models(*synthetic_training_set(
+            int(20000 * args.scale), len(RecommendationEngine().genetic_features)
+        )))
+
+    metrics = {}
+    for name, (group, fn) in BENCHMARKS.items():
+        if args.only and name not in args.only and group not in args.only:
+            continue
+        began = time.perf_counter()
+        for metric, (value, unit, better) in fn(args.scale).items():
+            metrics[metric] = {"value": float(value), "unit": unit, "better": better}
+        print(f"ran {name} in {time.perf_counter() - began:.1f} s", file=sys.stderr)
+    inference_executor.shutdown()
+
+    result = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "cpus": os.cpu_count(),
+        "scale": args.scale,
+        "metrics": metrics,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{datetime.utcnow():%Y%m%dT%H%M%S}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"results written to {path}")
+
+    if args.update_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("scale") != args.scale:
+        print(f"baseline was recorded at scale {baseline.get('scale')}, not {args.scale}; not comparing")
+        return 0
+
+    print(f"compared with baseline {baseline['commit']} ({baseline['timestamp']}), threshold {args.threshold:.0%}")
+    regressions = compare(metrics, baseline["metrics"], args.threshold)
+    if regressions:
+        print(f"{len(regressions)} metric(s) regressed: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", help="benchmark names or groups (micro, e2e, startup)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier for data sizes")
+    parser.add_argument("--quick", action="store_const", const=0.1, dest="scale", help="same as --scale 0.1")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    sys.exit(main(parser.parse_args()))
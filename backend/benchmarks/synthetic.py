@@ -0,0 +1,101 @@
+"""Synthetic inputs shared by the benchmarks."""
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from app.models.health_data import HealthData, DEFAULT_SAMPLE_METADATA
+
+GENES = [
+    "BRCA1", "BRCA2", "TP53", "MLH1", "MSH2", "APOB", "LDLR", "PCSK9", "APOE-e4",
+    "PSEN1", "MAPT", "TCF7L2", "MC4R", "FTO", "HLA-DRB1", "CTLA4", "CYP2D6", "VKORC1"
+]
+
+
+def synthetic_users(n: int, seed: int = 0) -> pd.DataFrame:
+    """One row per user with the generate_recommendations inputs as columns"""
+    rng = np.random.default_rng(seed)
+    records: List[Dict] = []
+    for user_id in range(n):
+        carried = rng.choice(GENES, size=rng.integers(0, 3), replace=False)
+        records.append({
+            "user_id": user_id,
+            "genetic_data": {
+                gene: {"variant": "pathogenic" if rng.random() < 0.5 else "benign"}
+                for gene in carried
+            },
+            "lifestyle_data": {
+                "age": float(rng.integers(18, 90)),
+                "bmi": float(rng.normal(26, 5)),
+                "daily_steps": float(rng.gamma(4, 2000)),
+                "exercise_minutes_per_week": float(rng.gamma(2, 60)),
+                "sleep_hours": float(rng.normal(7, 1.2)),
+                "stress_level": float(rng.integers(1, 11)),
+                "alcohol_units_per_week": float(rng.gamma(1.5, 4)),
+                "smoker": bool(rng.random() < 0.15),
+                "fruit_veg_servings": float(rng.integers(0, 9)),
+            },
+            "medical_history": {
+                "chronic_conditions": ["hypertension"] if rng.random() < 0.3 else [],
+                "medications": ["warfarin"] if rng.random() < 0.05 else [],
+                "family_history": ["heart_disease"] if rng.random() < 0.2 else [],
+            },
+            "environmental_data": {
+                "air_quality_index": float(rng.integers(10, 200)),
+                "uv_index": float(rng.integers(0, 11)),
+            },
+            "health_metrics": {
+                "heart_rate": rng.normal(72, 12, 7).tolist(),
+                "blood_pressure_systolic": rng.normal(125, 18, 7).tolist(),
+            },
+        })
+    return pd.DataFrame.from_records(records)
+
+
+def synthetic_samples(
+    n: int,
+    seed: int = 0,
+    start: datetime = datetime(2024, 1, 1),
+    types: Optional[List[str]] = None
+) -> List[Dict]:
+    """``n`` samples spread over every supported type, one per minute per type.
+
+    Values fall inside the type's threshold range where it has one, so
+    they pass validation; other types get values in [0, 100).
+    """
+    types = types or HealthData.Config.supported_types
+    rng = np.random.default_rng(seed)
+    type_index = rng.integers(0, len(types), n)
+    low = np.array([_value_range(data_type)[0] for data_type in types])[type_index]
+    high = np.array([_value_range(data_type)[1] for data_type in types])[type_index]
+    values = low + (high - low) * rng.beta(4, 4, n)
+
+    counters = [0] * len(types)
+    samples = []
+    for index, value in zip(type_index.tolist(), values.tolist()):
+        samples.append({
+            "type": types[index],
+            "value": value,
+            "timestamp": start + timedelta(minutes=counters[index])
+        })
+        counters[index] += 1
+    return samples
+
+
+def synthetic_health_data(n: int, seed: int = 0, user_id: int = 1) -> List[HealthData]:
+    """Unsaved HealthData rows over every supported type"""
+    return [
+        HealthData(
+            id=index, user_id=user_id, data_type=sample["type"], value=sample["value"],
+            timestamp=sample["timestamp"], sample_metadata=DEFAULT_SAMPLE_METADATA,
+            source="healthkit", device_id="bench-watch", is_validated=False,
+            quality_score=1.0, confidence_interval=[0.0, 0.0], context_tags=[]
+        )
+        for index, sample in enumerate(synthetic_samples(n, seed))
+    ]
+
+
+def _value_range(data_type: str) -> Tuple[float, float]:
+    threshold = HealthData.Config.thresholds.get(data_type)
+    if threshold is None:
+        return 0.0, 100.0
+    return float(threshold["min"]), float(threshold["max"])
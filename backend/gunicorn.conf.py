@@ -0,0 +1,31 @@
+"""Production server: uvicorn workers forked from a preloaded master.
+
+The master imports the application once (``preload_app``) and warms the
+state every worker would otherwise build itself, so workers start in
+milliseconds and share that memory copy-on-write. The ML stack is not
+part of it: models are loaded only by the inference pool's forkserver
+(app.services.executors).
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+graceful_timeout = 30
+# Recycle workers now and then, staggered so they do not restart together
+max_requests = int(os.getenv("MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+
+
+def when_ready(server):
+    from app.main import preload_shared_state
+    preload_shared_state()
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,105 @@
+"""health_data storage with monthly partitions and rollups
+
+Revision ID: 0001
+Revises:
+Create Date: 2024-04-02 10:00:00
+
+"""
+from datetime import datetime, timedelta
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+ROLLUP_TABLES = [
+    "health_data_rollup_minute",
+    "health_data_rollup_hour",
+    "health_data_rollup_day"
+]
+
+
+def upgrade():
+    is_postgres = op.get_bind().dialect.name == "postgresql"
+    float_array = postgresql.ARRAY(sa.Float) if is_postgres else sa.JSON
+    string_array = postgresql.ARRAY(sa.String) if is_postgres else sa.JSON
+
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer, primary_key=True, index=True),
+        sa.Column("email", sa.String, unique=True, index=True),
+        sa.Column("hashed_password", sa.String),
+        sa.Column("full_name", sa.String),
+        sa.Column("date_of_birth", sa.DateTime),
+        sa.Column("genetic_data", sa.String),
+    )
+
+    # Postgres requires the partition key in every unique constraint,
+    # including the primary key
+    op.create_table(
+        "health_data",
+        sa.Column("id", sa.Integer, autoincrement=True, nullable=False),
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id")),
+        sa.Column("data_type", sa.String),
+        sa.Column("value", sa.Float),
+        sa.Column("timestamp", sa.DateTime, nullable=False),
+        sa.Column("metadata", sa.JSON),
+        sa.Column("source", sa.String),
+        sa.Column("source_version", sa.String),
+        sa.Column("device_id", sa.String),
+        sa.Column("is_validated", sa.Boolean),
+        sa.Column("quality_score", sa.Float),
+        sa.Column("confidence_interval", float_array),
+        sa.Column("context_tags", string_array),
+        sa.Column("notes", sa.Text),
+        sa.PrimaryKeyConstraint(*(["id", "timestamp"] if is_postgres else ["id"])),
+        sa.UniqueConstraint(
+            "user_id", "data_type", "timestamp", "device_id",
+            name="uq_health_data_sample"
+        ),
+        postgresql_partition_by='RANGE ("timestamp")',
+    )
+    op.create_index("ix_health_data_id", "health_data", ["id"])
+    op.create_index(
+        "ix_health_data_user_type_time", "health_data",
+        ["user_id", "data_type", "timestamp"]
+    )
+
+    if is_postgres:
+        op.execute("CREATE TABLE health_data_default PARTITION OF health_data DEFAULT")
+        month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        for _ in range(4):
+            following = (month + timedelta(days=32)).replace(day=1)
+            op.execute(
+                f"CREATE TABLE health_data_y{month:%Y}m{month:%m} "
+                f"PARTITION OF health_data FOR VALUES FROM ('{month:%Y-%m-%d}') "
+                f"TO ('{following:%Y-%m-%d}')"
+            )
+            month = following
+
+    for table in ROLLUP_TABLES:
+        op.create_table(
+            table,
+            sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), primary_key=True),
+            sa.Column("data_type", sa.String, primary_key=True),
+            sa.Column("bucket", sa.DateTime, primary_key=True),
+            sa.Column("count", sa.Integer, nullable=False),
+            sa.Column("sum", sa.Float, nullable=False),
+            sa.Column("sum_sq", sa.Float, nullable=False),
+            sa.Column("min", sa.Float, nullable=False),
+            sa.Column("max", sa.Float, nullable=False),
+        )
+
+
+def downgrade():
+    for table in reversed(ROLLUP_TABLES):
+        op.drop_table(table)
+    # Dropping the parent drops its partitions
+    op.drop_index("ix_health_data_user_type_time", table_name="health_data")
+    op.drop_index("ix_health_data_id", table_name="health_data")
+    op.drop_table("health_data")
+    op.drop_table("users")
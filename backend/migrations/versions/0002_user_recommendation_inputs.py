@@ -0,0 +1,26 @@
+"""lifestyle and medical history on users
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2024-04-09 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("users", sa.Column("lifestyle_data", sa.JSON))
+    op.add_column("users", sa.Column("medical_history", sa.JSON))
+
+
+def downgrade():
+    op.drop_column("users", "medical_history")
+    op.drop_column("users", "lifestyle_data")
@@ -0,0 +1,62 @@
+"""streaming anomaly detection tables
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2024-04-16 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    is_postgres = op.get_bind().dialect.name == "postgresql"
+    string_array = postgresql.ARRAY(sa.String) if is_postgres else sa.JSON
+
+    op.create_table(
+        "health_data_anomalies",
+        sa.Column("id", sa.Integer, primary_key=True, index=True),
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("data_type", sa.String, nullable=False),
+        sa.Column("timestamp", sa.DateTime, nullable=False),
+        sa.Column("device_id", sa.String),
+        sa.Column("value", sa.Float, nullable=False),
+        sa.Column("expected", sa.Float),
+        sa.Column("z_score", sa.Float),
+        sa.Column("ewma_score", sa.Float),
+        sa.Column("mad_score", sa.Float),
+        sa.Column("detectors", string_array),
+        sa.Column("detected_at", sa.DateTime),
+    )
+    op.create_index(
+        "ix_health_data_anomalies_user_type_time", "health_data_anomalies",
+        ["user_id", "data_type", "timestamp"]
+    )
+
+    op.create_table(
+        "health_data_stream_state",
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("data_type", sa.String, primary_key=True),
+        sa.Column("count", sa.Integer, nullable=False),
+        sa.Column("mean", sa.Float, nullable=False),
+        sa.Column("m2", sa.Float, nullable=False),
+        sa.Column("ewma", sa.Float, nullable=False),
+        sa.Column("ewm_var", sa.Float, nullable=False),
+        sa.Column("median", sa.Float, nullable=False),
+        sa.Column("mad", sa.Float, nullable=False),
+        sa.Column("last_timestamp", sa.DateTime, nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("health_data_stream_state")
+    op.drop_index("ix_health_data_anomalies_user_type_time", table_name="health_data_anomalies")
+    op.drop_table("health_data_anomalies")
@@ -0,0 +1,32 @@
+"""per-device HealthKit sync anchors
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2024-04-23 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "healthkit_sync_anchors",
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("device_id", sa.String, primary_key=True),
+        sa.Column("data_type", sa.String, primary_key=True),
+        sa.Column("anchor", sa.String),
+        sa.Column("high_water_mark", sa.DateTime),
+        sa.Column("synced_at", sa.DateTime, nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("healthkit_sync_anchors")
@@ -0,0 +1,44 @@
+"""background job run state
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2024-04-30 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "job_runs",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("job", sa.String, nullable=False),
+        sa.Column("scheduled_for", sa.DateTime, nullable=False),
+        sa.Column("shard", sa.Integer, nullable=False),
+        sa.Column("user_start", sa.Integer),
+        sa.Column("user_end", sa.Integer),
+        sa.Column("status", sa.String, nullable=False),
+        sa.Column("attempts", sa.Integer, nullable=False),
+        sa.Column("run_after", sa.DateTime, nullable=False),
+        sa.Column("owner", sa.String),
+        sa.Column("lease_until", sa.DateTime),
+        sa.Column("started_at", sa.DateTime),
+        sa.Column("finished_at", sa.DateTime),
+        sa.Column("error", sa.Text),
+        sa.Column("result", sa.JSON),
+        sa.UniqueConstraint("job", "scheduled_for", "shard", name="uq_job_runs_job_slot_shard"),
+    )
+    op.create_index("ix_job_runs_status_run_after", "job_runs", ["status", "run_after"])
+
+
+def downgrade():
+    op.drop_index("ix_job_runs_status_run_after", table_name="job_runs")
+    op.drop_table("job_runs")
@@ -0,0 +1,59 @@
+"""location tracks, cell index and environmental readings
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2024-05-07 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "location_tracks",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("device_id", sa.String, nullable=False),
+        sa.Column("start", sa.DateTime, nullable=False),
+        sa.Column("end", sa.DateTime, nullable=False),
+        sa.Column("count", sa.Integer, nullable=False),
+        sa.Column("fixes", sa.LargeBinary, nullable=False),
+        sa.UniqueConstraint("user_id", "device_id", "start", name="uq_location_tracks_batch"),
+    )
+
+    op.create_table(
+        "location_cells",
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("bucket", sa.DateTime, primary_key=True),
+        sa.Column("cell", sa.String, primary_key=True),
+        sa.Column("area", sa.String, nullable=False),
+        sa.Column("fixes", sa.Integer, nullable=False),
+    )
+    op.create_index("ix_location_cells_area_bucket", "location_cells", ["area", "bucket"])
+
+    op.create_table(
+        "environmental_readings",
+        sa.Column("area", sa.String, primary_key=True),
+        sa.Column("bucket", sa.DateTime, primary_key=True),
+        sa.Column("data_type", sa.String, primary_key=True),
+        sa.Column("count", sa.Integer, nullable=False),
+        sa.Column("sum", sa.Float, nullable=False),
+        sa.Column("min", sa.Float, nullable=False),
+        sa.Column("max", sa.Float, nullable=False),
+        sa.Column("users", sa.Integer, nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("environmental_readings")
+    op.drop_index("ix_location_cells_area_bucket", table_name="location_cells")
+    op.drop_table("location_cells")
+    op.drop_table("location_tracks")
@@ -0,0 +1,32 @@
+"""cold-tier archive catalog of health_data
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2024-05-14 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "health_data_archives",
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("month", sa.DateTime, primary_key=True),
+        sa.Column("path", sa.String, nullable=False),
+        sa.Column("rows", sa.Integer, nullable=False),
+        sa.Column("bytes", sa.Integer, nullable=False),
+        sa.Column("archived_at", sa.DateTime, nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("health_data_archives")
@@ -0,0 +1,34 @@
+"""ingestion time of health_data samples
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2024-05-21 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        # Also fills rows written by COPY, which lists its columns; existing
+        # rows get the migration time
+        default = sa.text("(now() AT TIME ZONE 'utc')")
+    else:
+        # SQLite cannot add a column with a non-constant default; rows get
+        # theirs from the model
+        default = None
+    op.add_column("health_data", sa.Column("created_at", sa.DateTime, server_default=default))
+    op.create_index("ix_health_data_created_at", "health_data", ["created_at"])
+
+
+def downgrade():
+    op.drop_index("ix_health_data_created_at", table_name="health_data")
+    op.drop_column("health_data", "created_at")
@@ -0,0 +1,31 @@
+"""samples deleted from archived months of health_data
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2024-05-28 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "health_data_archive_deletions",
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("data_type", sa.String, primary_key=True),
+        sa.Column("timestamp", sa.DateTime, primary_key=True),
+        sa.Column("device_id", sa.String, primary_key=True),
+        sa.Column("deleted_at", sa.DateTime, nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("health_data_archive_deletions")
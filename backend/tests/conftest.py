@@ -0,0 +1,52 @@
+"""Shared fixtures of the backend tests.
+
+SQLite stands in for Postgres, as in the benchmarks; the database file
+and the model and archive directories live in a temporary directory set
+before the app modules read their environment.
+
+    cd backend && python -m pytest tests
+"""
+import os
+import tempfile
+
+workdir = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'tests.db')}"
+os.environ["MODEL_REGISTRY_DIR"] = os.path.join(workdir, "models")
+os.environ["HEALTH_ARCHIVE_DIR"] = os.path.join(workdir, "archive")
+os.environ.pop("REDIS_URL", None)
+
+import pytest  # noqa: E402
+
+from app.database import SessionLocal, engine  # noqa: E402
+from app.models.user import Base, User  # noqa: E402
+from app.models import (  # noqa: E402,F401
+    anomalies, archives, health_data, jobs, locations, rollups, sync_anchors
+)
+
+
+@pytest.fixture
+def db_engine():
+    """The app's engine over empty tables"""
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(db_engine):
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def users(db_engine):
+    """Ids of three users"""
+    with db_engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [
+            {"id": user_id, "email": f"user{user_id}@example.com"} for user_id in (1, 2, 3)
+        ])
+    return [1, 2, 3]
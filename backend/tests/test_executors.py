@@ -0,0 +1,125 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import pytest
+from app.services.executors import BoundedExecutor, Coalescer, ExecutorSaturated
+
+
+def _threads(workers):
+    return ThreadPoolExecutor(max_workers=workers)
+
+
+async def _until(condition, timeout=5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "condition not reached"
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_bounded_executor_rejects_past_workers_plus_queue():
+    executor = BoundedExecutor("test", _threads, max_workers=1, max_queue=1)
+    release = threading.Event()
+    try:
+        running = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(2)]
+        await _until(lambda: executor.pending == 2)
+        with pytest.raises(ExecutorSaturated):
+            await executor.run(release.wait)
+        assert executor.stats()["rejected"] == 1
+        assert executor.stats()["queued"] == 1
+
+        release.set()
+        await asyncio.gather(*running)
+        assert executor.pending == 0
+        assert await executor.run(sum, [1, 2]) == 3
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_callers_hold_their_slot_until_the_job_finishes():
+    executor = BoundedExecutor("test", _threads, max_workers=1, max_queue=0)
+    started, release = threading.Event(), threading.Event()
+
+    def job():
+        started.set()
+        release.wait()
+
+    try:
+        caller = asyncio.ensure_future(executor.run(job))
+        await _until(started.is_set)
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        # Still running in the pool, so still counted against the limit
+        assert executor.pending == 1
+        with pytest.raises(ExecutorSaturated):
+            await executor.run(job)
+
+        release.set()
+        await _until(lambda: executor.pending == 0)
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+class _BrokenPool(ThreadPoolExecutor):
+    def submit(self, *args, **kwargs):
+        raise BrokenProcessPool("a worker died")
+
+
+@pytest.mark.asyncio
+async def test_broken_pool_is_replaced():
+    pools = [_BrokenPool(max_workers=1)]
+
+    def factory(workers):
+        return pools.pop(0) if pools else ThreadPoolExecutor(max_workers=workers)
+
+    executor = BoundedExecutor("test", factory, max_workers=1, max_queue=0)
+    try:
+        assert await executor.run(sum, [2, 3]) == 5
+        assert executor.stats()["restarts"] == 1
+        assert executor.pending == 0
+    finally:
+        executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_coalescer_shares_one_computation_per_key():
+    coalescer = Coalescer()
+    calls = []
+    release = asyncio.Event()
+
+    async def compute():
+        calls.append(1)
+        await release.wait()
+        return "done"
+
+    callers = [asyncio.ensure_future(coalescer.run("user", compute)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    assert await asyncio.gather(*callers) == ["done"] * 3
+    assert len(calls) == 1
+    assert coalescer.coalesced == 2
+
+
+@pytest.mark.asyncio
+async def test_coalescer_survives_the_first_caller_being_cancelled():
+    coalescer = Coalescer()
+    release = asyncio.Event()
+
+    async def compute():
+        await release.wait()
+        return "done"
+
+    first = asyncio.ensure_future(coalescer.run("user", compute))
+    second = asyncio.ensure_future(coalescer.run("user", compute))
+    await asyncio.sleep(0)
+    first.cancel()
+    release.set()
+    assert await second == "done"
+    with pytest.raises(asyncio.CancelledError):
+        await first
@@ -0,0 +1,95 @@
+import sys
+import types
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+
+# The HealthKit bridge only exists on devices; the sync never calls it here
+sys.modules.setdefault("healthkit", types.SimpleNamespace(HealthKit=lambda: None))
+
+from app.models.archives import HealthDataArchiveDeletion  # noqa: E402
+from app.models.health_data import HealthData  # noqa: E402
+from app.schemas.health_data import HealthSyncPayload  # noqa: E402
+from app.services.health_archive import HealthArchive  # noqa: E402
+from app.services.health_serializer import HealthDataSerializer  # noqa: E402
+from app.services.healthkit_service import MetricChanges  # noqa: E402
+from app.services.healthkit_sync import HealthKitSyncService  # noqa: E402
+from app.services.ingestion_service import IngestionService  # noqa: E402
+from app.services.live_channel import LiveBroker  # noqa: E402
+from app.services.recent_metrics import RecentMetricsCache  # noqa: E402
+
+MONTH = datetime(2024, 3, 1)
+START = MONTH + timedelta(days=4, hours=8)
+NEXT_MONTH = datetime(2024, 4, 1)
+
+
+def _ingestion():
+    return IngestionService(recent=RecentMetricsCache(), live=LiveBroker(redis_url=None))
+
+
+def _ingest(db, minutes):
+    _ingestion().ingest(db, HealthSyncPayload(user_id=1, device_id="watch", samples=[
+        {"type": "heart_rate", "value": 60 + minute, "timestamp": START + timedelta(minutes=minute)}
+        for minute in minutes
+    ]))
+
+
+def _archive(db_engine):
+    with db_engine.connect() as connection:
+        return HealthArchive().archive_user(connection, 1, before=NEXT_MONTH)
+
+
+def _timestamps(db):
+    rows = HealthDataSerializer().read_samples(
+        db.connection(), 1, "heart_rate", MONTH, NEXT_MONTH, columns=[HealthData.__table__.c.timestamp]
+    )
+    return [timestamp for timestamp, in rows]
+
+
+def _count(db, model):
+    return db.execute(select(func.count()).select_from(model.__table__)).scalar()
+
+
+def test_archived_samples_are_merged_with_late_ones(db_engine, db, users):
+    _ingest(db, range(3))
+    assert _archive(db_engine)["rows"] == 3
+    _ingest(db, [10])
+
+    assert _count(db, HealthData) == 1
+    assert _timestamps(db) == [START + timedelta(minutes=minute) for minute in (0, 1, 2, 10)]
+
+
+def test_sample_stored_again_after_archiving_is_read_once(db_engine, db, users):
+    _ingest(db, range(3))
+    _archive(db_engine)
+    _ingest(db, range(3))
+
+    assert _count(db, HealthData) == 3
+    assert _timestamps(db) == [START + timedelta(minutes=minute) for minute in range(3)]
+    with db_engine.connect() as connection:
+        timestamps, _ = HealthArchive().columns(connection, 1, "heart_rate", MONTH, NEXT_MONTH)
+    assert timestamps.size == 0
+
+    # Archiving the month again keeps one copy of each
+    assert _archive(db_engine)["rows"] == 3
+    assert _timestamps(db) == [START + timedelta(minutes=minute) for minute in range(3)]
+
+
+def test_sample_deleted_after_archiving_stays_deleted(db_engine, db, users):
+    _ingest(db, range(3))
+    _archive(db_engine)
+
+    service = HealthKitSyncService(healthkit=object(), ingestion=_ingestion())
+    changes = {"heart_rate": MetricChanges(
+        samples=[], deleted=[{"timestamp": (START + timedelta(minutes=1)).isoformat()}], anchor="a2"
+    )}
+    result = service.apply(db, 1, "watch", changes, {})
+
+    assert result["deleted"] == 1
+    assert _count(db, HealthDataArchiveDeletion) == 1
+    assert _timestamps(db) == [START, START + timedelta(minutes=2)]
+
+    # A late sample gets the month archived again, without the deleted one
+    _ingest(db, [10])
+    assert _archive(db_engine)["rows"] == 1
+    assert _count(db, HealthDataArchiveDeletion) == 0
+    assert _timestamps(db) == [START, START + timedelta(minutes=2), START + timedelta(minutes=10)]
@@ -0,0 +1,108 @@
+import sys
+import types
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import func, select
+
+# The HealthKit bridge only exists on devices; the sync never calls it here
+sys.modules.setdefault("healthkit", types.SimpleNamespace(HealthKit=lambda: None))
+
+from app.models.health_data import HealthData  # noqa: E402
+from app.models.sync_anchors import HealthKitSyncAnchor  # noqa: E402
+from app.services.executors import BoundedExecutor  # noqa: E402
+from app.services.healthkit_service import MetricChanges  # noqa: E402
+from app.services.healthkit_sync import HealthKitSyncService  # noqa: E402
+from app.services.ingestion_service import IngestionService  # noqa: E402
+from app.services.live_channel import LiveBroker  # noqa: E402
+from app.services.recent_metrics import RecentMetricsCache  # noqa: E402
+
+START = datetime(2024, 3, 1, 8, 0)
+
+
+def _service():
+    ingestion = IngestionService(recent=RecentMetricsCache(), live=LiveBroker(redis_url=None))
+    return HealthKitSyncService(healthkit=object(), ingestion=ingestion)
+
+
+def _heart_rate(count, anchor="a1", start=START):
+    return MetricChanges(
+        samples=[
+            {"type": "heart_rate", "value": 60 + index, "timestamp": start + timedelta(minutes=index)}
+            for index in range(count)
+        ],
+        deleted=[],
+        anchor=anchor
+    )
+
+
+def _count(db, model):
+    return db.execute(select(func.count()).select_from(model.__table__)).scalar()
+
+
+def test_malformed_samples_are_rejected_individually(db, users):
+    changes = {"heart_rate": _heart_rate(3)}
+    changes["heart_rate"].samples[1]["value"] = "not a number"
+
+    result = _service().apply(db, 1, "watch", changes, {})
+
+    assert result["received"] == 3
+    assert result["inserted"] == 2
+    assert result["rejected"] == [{"index": 1, "reason": "invalid value"}]
+    assert _count(db, HealthData) == 2
+    assert _count(db, HealthKitSyncAnchor) == 1
+
+
+def test_samples_and_anchors_commit_together(db, users, monkeypatch):
+    service = _service()
+
+    def fail(connection, rows):
+        raise RuntimeError("anchor write failed")
+
+    monkeypatch.setattr(service, "_save_anchors", fail)
+    with pytest.raises(RuntimeError):
+        service.apply(db, 1, "watch", {"heart_rate": _heart_rate(3)}, {})
+    db.rollback()
+
+    # Nothing was stored, so the next sync replays the same changes from the old anchors
+    assert _count(db, HealthData) == 0
+    assert _count(db, HealthKitSyncAnchor) == 0
+
+
+def test_resynced_samples_are_not_stored_twice(db, users):
+    service = _service()
+    service.apply(db, 1, "watch", {"heart_rate": _heart_rate(3)}, {})
+    result = service.apply(db, 1, "watch", {"heart_rate": _heart_rate(3, anchor="a2")}, {})
+
+    assert result["inserted"] == 0
+    assert result["duplicates"] == 3
+    assert _count(db, HealthData) == 3
+
+
+class _Device:
+    """HealthKitService stand-in returning queued changes and recording the anchors it was given"""
+
+    def __init__(self, *changes):
+        self.changes = list(changes)
+        self.anchors = []
+
+    async def fetch_changes(self, user_id, anchors):
+        self.anchors.append(dict(anchors))
+        return self.changes.pop(0)
+
+
+@pytest.mark.asyncio
+async def test_sync_resumes_from_the_stored_anchors(db, users):
+    device = _Device({"heart_rate": _heart_rate(3)}, {"heart_rate": _heart_rate(0, anchor="a2")})
+    executor = BoundedExecutor("test", ThreadPoolExecutor, 1, 4)
+    ingestion = IngestionService(recent=RecentMetricsCache(), live=LiveBroker(redis_url=None))
+    service = HealthKitSyncService(healthkit=device, ingestion=ingestion, executor=executor)
+    try:
+        first = await service.sync(db, 1, "watch")
+        second = await service.sync(db, 1, "watch")
+    finally:
+        executor.shutdown()
+
+    assert (first["inserted"], second["inserted"]) == (3, 0)
+    assert device.anchors[0] == {}
+    assert device.anchors[1]["heart_rate"].anchor == "a1"
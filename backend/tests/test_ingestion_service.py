@@ -0,0 +1,79 @@
+import os
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine, func, select
+
+from app.models.health_data import HealthData
+from app.models.user import Base, User
+from app.schemas.health_data import HealthSyncPayload
+from app.services.ingestion_service import IngestionService
+from app.services.live_channel import LiveBroker
+from app.services.recent_metrics import RecentMetricsCache
+
+# The COPY path only runs against Postgres, e.g. postgresql://localhost/health_test
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+START = datetime(2024, 3, 1, 8, 0)
+
+
+def _service(chunk_size=500):
+    return IngestionService(chunk_size=chunk_size, recent=RecentMetricsCache(), live=LiveBroker(redis_url=None))
+
+
+def _payload(minutes, device_id="watch"):
+    return HealthSyncPayload(user_id=1, device_id=device_id, samples=[
+        {"type": "heart_rate", "value": 60 + minute, "timestamp": START + timedelta(minutes=minute)}
+        for minute in minutes
+    ])
+
+
+def _count(db):
+    return db.execute(select(func.count()).select_from(HealthData.__table__)).scalar()
+
+
+def test_repeated_samples_in_a_payload_are_stored_once(db, users):
+    result = _service().ingest(db, _payload([0, 1, 1, 2]))
+
+    assert result["received"] == 4
+    assert result["inserted"] == 3
+    assert _count(db) == 3
+
+
+def test_resent_samples_are_counted_as_duplicates_across_chunks(db, users):
+    service = _service(chunk_size=2)
+    service.ingest(db, _payload(range(3)))
+    result = service.ingest(db, _payload(range(5)))
+
+    assert result["inserted"] == 2
+    assert result["duplicates"] == 3
+    assert _count(db) == 5
+
+
+def test_same_timestamp_from_another_device_is_a_new_sample(db, users):
+    service = _service()
+    service.ingest(db, _payload(range(3)))
+    result = service.ingest(db, _payload(range(3), device_id="phone"))
+
+    assert result["inserted"] == 3
+    assert _count(db) == 6
+
+
+@pytest.mark.skipif(TEST_POSTGRES_URL is None, reason="TEST_POSTGRES_URL is not set")
+def test_copy_merges_without_duplicates_on_postgres():
+    engine = create_engine(TEST_POSTGRES_URL)
+    tables = [User.__table__, HealthData.__table__]
+    Base.metadata.drop_all(engine, tables=tables)
+    Base.metadata.create_all(engine, tables=tables)
+    try:
+        service = _service()
+        with engine.begin() as connection:
+            connection.execute(User.__table__.insert(), {"id": 1, "email": "user1@example.com"})
+            first, _ = service.validate_batch(_payload(range(3)))
+            assert service._copy_rows(connection, first) == 3
+        with engine.begin() as connection:
+            second, _ = service.validate_batch(_payload(range(5)))
+            assert service._copy_rows(connection, second) == 2
+            assert connection.execute(select(func.count()).select_from(HealthData.__table__)).scalar() == 5
+    finally:
+        Base.metadata.drop_all(engine, tables=tables)
+        engine.dispose()
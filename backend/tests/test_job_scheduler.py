@@ -0,0 +1,96 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from app.models.health_data import HealthData
+from app.models.jobs import JobRun
+from app.models.rollups import HealthDataHourRollup
+from app.services.job_scheduler import JobScheduler
+from app.services.jobs import JobSpec, refresh_rollups
+
+NOW = datetime(2024, 5, 1, 12, 0)
+
+
+def _noop(user_range, dry_run=False):
+    return {"users": 0}
+
+
+def _scheduler(engine, jobs, owner, **options):
+    return JobScheduler(
+        jobs, engine=engine, workers=1, lease=60,
+        pool_factory=lambda workers: ThreadPoolExecutor(max_workers=workers), owner=owner, **options
+    )
+
+
+def _runs(engine):
+    with engine.connect() as connection:
+        return connection.execute(select(JobRun.__table__).order_by(JobRun.__table__.c.id)).all()
+
+
+def test_expired_lease_is_taken_over_by_another_scheduler(db_engine, users):
+    jobs = {"noop": JobSpec("noop", _noop, interval=3600, shard_size=None)}
+    first, second = _scheduler(db_engine, jobs, "first"), _scheduler(db_engine, jobs, "second")
+    first.schedule(NOW)
+
+    claim = first.claim(NOW)
+    assert claim is not None and claim.attempts == 1
+    # Renewed leases keep the shard with its owner
+    assert second.claim(NOW + timedelta(seconds=59)) is None
+
+    # The first scheduler died: its lease runs out and the shard is run again
+    takeover = second.claim(NOW + timedelta(seconds=61))
+    assert takeover is not None and takeover.id == claim.id and takeover.attempts == 2
+    assert _runs(db_engine)[0].owner == "second"
+
+    # The first scheduler cannot record a shard it lost
+    first.complete(claim, {"users": 0}, None, 1.0)
+    assert _runs(db_engine)[0].status == "running"
+    second.complete(takeover, {"users": 0}, None, 1.0)
+    assert _runs(db_engine)[0].status == "succeeded"
+
+
+def test_lease_expiring_on_the_last_attempt_fails_the_shard(db_engine, users):
+    jobs = {"noop": JobSpec("noop", _noop, interval=3600, shard_size=None, max_attempts=1)}
+    first, second = _scheduler(db_engine, jobs, "first"), _scheduler(db_engine, jobs, "second")
+    first.schedule(NOW)
+    assert first.claim(NOW) is not None
+
+    assert second.claim(NOW + timedelta(seconds=61)) is None
+    run = _runs(db_engine)[0]
+    assert run.status == "failed" and run.error == "Lease expired on the last attempt"
+
+
+def test_leases_are_renewed_while_draining_on_shutdown(db_engine, users):
+    stop = threading.Event()
+
+    def slow(user_range, dry_run=False):
+        stop.set()
+        time.sleep(1.5)
+        return {"users": 0}
+
+    jobs = {"slow": JobSpec("slow", slow, interval=3600, shard_size=None)}
+    scheduler = _scheduler(db_engine, jobs, "only", poll_interval=0.1)
+    scheduler.lease = timedelta(seconds=1)
+    renewals = []
+    renew = scheduler.renew
+    scheduler.renew = lambda claims, now: (renewals.append(now), renew(claims, now))
+
+    scheduler.run(stop)
+
+    assert renewals
+    assert _runs(db_engine)[0].status == "succeeded"
+
+
+def test_refresh_rollups_repairs_backfilled_history(db_engine, users):
+    old = datetime.utcnow() - timedelta(days=90)
+    with db_engine.begin() as connection:
+        # Ingested just now, without rollups, with timestamps months back
+        connection.execute(HealthData.__table__.insert(), [
+            {"user_id": 1, "data_type": "steps", "value": 100.0, "timestamp": old, "device_id": "phone"}
+        ])
+
+    assert refresh_rollups((1, 2)) == {"users": 1, "series": 1}
+    with db_engine.connect() as connection:
+        hours = connection.execute(select(HealthDataHourRollup.__table__)).all()
+    assert [(row.count, row.sum) for row in hours] == [(1, 100.0)]
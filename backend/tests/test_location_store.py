@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+
+from app.models.locations import EnvironmentalReading, LocationCell, LocationTrack
+from app.schemas.health_data import HealthSyncPayload
+from app.schemas.location import LocationBatch
+from app.services.ingestion_service import IngestionService
+from app.services.live_channel import LiveBroker
+from app.services.location_store import LocationStore
+from app.services.recent_metrics import RecentMetricsCache
+
+START = datetime(2024, 3, 1, 8, 0)
+
+
+def _fixes(first, count):
+    return [
+        {"latitude": 37.7749 + index * 1e-4, "longitude": -122.4194, "timestamp": START + timedelta(minutes=index)}
+        for index in range(first, first + count)
+    ]
+
+
+def _batch(fixes, user_id=1):
+    return LocationBatch(user_id=user_id, device_id="phone", fixes=fixes)
+
+
+def _ingestion():
+    return IngestionService(recent=RecentMetricsCache(), live=LiveBroker(redis_url=None))
+
+
+def _air_quality(user_id, value):
+    return HealthSyncPayload(user_id=user_id, device_id="phone", samples=[
+        {"type": "air_quality", "value": value, "timestamp": START + timedelta(minutes=30)}
+    ])
+
+
+def test_resent_batch_with_newer_fixes_is_merged(db, users):
+    store = LocationStore()
+    first = store.ingest(db, _batch(_fixes(0, 10)))
+    # The app resends a failed batch together with the fixes queued since
+    resent = store.ingest(db, _batch(_fixes(0, 15)))
+
+    assert first["stored"] == 10
+    assert resent["stored"] == 5
+    assert not resent["duplicate"]
+    tracks = db.execute(select(LocationTrack.count, LocationTrack.end)).all()
+    assert tracks == [(15, START + timedelta(minutes=14))]
+    assert db.execute(select(func.sum(LocationCell.fixes))).scalar() == 15
+
+    history = store.history(db.connection(), 1, START, START + timedelta(hours=1))
+    assert len(history["timestamp"]) == len(set(history["timestamp"].tolist())) == 15
+
+
+def test_batch_stored_already_is_a_duplicate(db, users):
+    store = LocationStore()
+    store.ingest(db, _batch(_fixes(0, 10)))
+    result = store.ingest(db, _batch(_fixes(0, 10)))
+
+    assert result["duplicate"]
+    assert result["stored"] == 0
+    assert db.execute(select(func.sum(LocationCell.fixes))).scalar() == 10
+
+
+def test_readings_pool_users_in_an_area_across_refreshes(db, users):
+    store, ingestion = LocationStore(), _ingestion()
+    store.ingest(db, _batch(_fixes(0, 60), user_id=1))
+    store.ingest(db, _batch(_fixes(0, 60), user_id=2))
+    ingestion.ingest(db, _air_quality(1, 40))
+    # Rewrites the area's reading in place instead of inserting it again
+    ingestion.ingest(db, _air_quality(2, 60))
+
+    readings = db.execute(
+        select(EnvironmentalReading.data_type, EnvironmentalReading.count,
+               EnvironmentalReading.sum, EnvironmentalReading.users)
+    ).all()
+    assert readings == [("air_quality", 2, 100.0, 2)]
+
+
+def test_readings_follow_fixes_uploaded_after_the_samples(db, users):
+    store, ingestion = LocationStore(), _ingestion()
+    ingestion.ingest(db, _air_quality(1, 40))
+    assert db.execute(select(func.count()).select_from(EnvironmentalReading)).scalar() == 0
+
+    store.ingest(db, _batch(_fixes(0, 60), user_id=1))
+
+    assert db.execute(select(EnvironmentalReading.users)).scalars().all() == [1]
@@ -0,0 +1,59 @@
+import fakeredis.aioredis
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+from app.services.recommendation_cache import RecommendationCache
+
+USER_DATA = {"lifestyle_data": {"sleep_hours": 6}}
+
+
+class _DownRedis:
+    """A Redis client whose server is unreachable"""
+
+    async def get(self, *args, **kwargs):
+        raise RedisConnectionError("Connection refused")
+
+    set = incr = get
+
+
+def _counting(value):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return value
+
+    return compute, calls
+
+
+@pytest.mark.asyncio
+async def test_shared_entries_are_served_across_workers():
+    redis = fakeredis.aioredis.FakeRedis()
+    first, second = RecommendationCache(redis_client=redis), RecommendationCache(redis_client=redis)
+    compute, calls = _counting({"critical": []})
+
+    await first.get_or_compute(1, USER_DATA, compute)
+    assert await second.get_or_compute(1, USER_DATA, compute) == {"critical": []}
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_redis_outage_falls_back_to_the_local_tier():
+    cache = RecommendationCache(redis_client=_DownRedis())
+    compute, calls = _counting({"critical": []})
+
+    assert await cache.get_or_compute(1, USER_DATA, compute) == {"critical": []}
+    assert await cache.get_or_compute(1, USER_DATA, compute) == {"critical": []}
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.redis_errors > 0
+
+
+@pytest.mark.asyncio
+async def test_invalidation_without_redis_still_marks_the_local_entry_stale():
+    cache = RecommendationCache(redis_client=_DownRedis())
+    compute, calls = _counting({"critical": []})
+
+    await cache.get_or_compute(1, USER_DATA, compute)
+    await cache.invalidate(1)
+    await cache.get_or_compute(1, USER_DATA, compute)
+    assert cache.stats()["stale_hits"] == 1
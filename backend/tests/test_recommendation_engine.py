@@ -0,0 +1,23 @@
+import pandas as pd
+from app.services.recommendation_engine import RecommendationEngine
+
+# Rows with different keys: the frame holds NaN where a row has none
+USERS = [
+    {
+        "lifestyle_data": {"daily_steps": 3000, "sleep_hours": 6, "smoker": True},
+        "medical_history": {"chronic_conditions": ["hypertension"], "family_history": ["heart_disease"]}
+    },
+    {
+        "environmental_data": {"air_quality_index": 150, "uv_index": 8}
+    },
+    {}
+]
+
+
+def test_batch_matches_single_user_results_on_sparse_rows():
+    engine = RecommendationEngine()
+    batch = engine.generate_recommendations_batch(pd.DataFrame(USERS))
+
+    assert batch == [engine.generate_recommendations(user_data) for user_data in USERS]
+    assert batch[0]["lifestyle"]
+    assert batch[1]["preventive"]
@@ -0,0 +1,49 @@
+import asyncio
+import pytest
+from app.services.recommendation_cache import RecommendationCache
+from app.services.recommendation_service import RecommendationService
+
+
+class _Session:
+    """Stands in for an AsyncSession, recording whether it was closed"""
+
+    def __init__(self, opened):
+        self.closed = False
+        opened.append(self)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.closed = True
+
+
+class _Executor:
+    async def run(self, fn, user_data):
+        return {"inputs": user_data}
+
+
+@pytest.mark.asyncio
+async def test_coalesced_requests_share_a_session_owned_by_the_computation():
+    opened = []
+    release = asyncio.Event()
+    service = RecommendationService(
+        executor=_Executor(), cache=RecommendationCache(redis_url=None),
+        session_factory=lambda: _Session(opened)
+    )
+
+    async def load_inputs(db, user_id, now=None):
+        await release.wait()
+        # The session is still open however the first caller fared
+        assert not db.closed
+        return {"lifestyle_data": {"user": user_id}}
+
+    service.load_inputs = load_inputs
+    first = asyncio.ensure_future(service.get_recommendations(1))
+    second = asyncio.ensure_future(service.get_recommendations(1))
+    await asyncio.sleep(0)
+    first.cancel()
+    release.set()
+
+    assert await second == {"inputs": {"lifestyle_data": {"user": 1}}}
+    assert len(opened) == 1 and opened[0].closed
@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from sqlalchemy import select
+from app.models.health_data import HealthData
+from app.models.rollups import HealthDataHourRollup, HealthDataMinuteRollup
+from app.services.jobs import JOBS
+from app.services.timeseries_store import PARTITION_MONTHS_AHEAD, TimeSeriesStore
+
+START = datetime(2024, 3, 1, 8, 0)
+
+
+def _samples(user_id, values, start=START):
+    return [
+        {
+            "user_id": user_id, "data_type": "heart_rate", "value": value,
+            "timestamp": start + timedelta(seconds=20 * index), "device_id": "watch"
+        }
+        for index, value in enumerate(values)
+    ]
+
+
+def _rollup_rows(connection, model):
+    table = model.__table__
+    return connection.execute(select(table).order_by(table.c.bucket)).all()
+
+
+def test_refresh_rollups_is_idempotent(db_engine, users):
+    store = TimeSeriesStore()
+    spans = {"heart_rate": (START, START + timedelta(seconds=100))}
+    with db_engine.begin() as connection:
+        connection.execute(HealthData.__table__.insert(), _samples(1, [60, 62, 64, 66, 68, 70]))
+        store.refresh_rollups(connection, 1, spans)
+        first = _rollup_rows(connection, HealthDataMinuteRollup), _rollup_rows(connection, HealthDataHourRollup)
+        store.refresh_rollups(connection, 1, spans)
+        second = _rollup_rows(connection, HealthDataMinuteRollup), _rollup_rows(connection, HealthDataHourRollup)
+
+    assert first == second
+    minutes, hours = first
+    assert [(row.count, row.sum) for row in minutes] == [(3, 186.0), (3, 204.0)]
+    assert [(row.count, row.sum, row.min, row.max) for row in hours] == [(6, 390.0, 60.0, 70.0)]
+
+
+def test_refresh_rollups_replaces_buckets_of_new_samples(db_engine, users):
+    store = TimeSeriesStore()
+    with db_engine.begin() as connection:
+        connection.execute(HealthData.__table__.insert(), _samples(1, [60, 62]))
+        store.refresh_rollups(connection, 1, {"heart_rate": (START, START + timedelta(seconds=20))})
+        late = _samples(1, [90], start=START + timedelta(seconds=40))
+        connection.execute(HealthData.__table__.insert(), late)
+        store.refresh_rollups(connection, 1, {"heart_rate": (late[0]["timestamp"], late[0]["timestamp"])})
+        hours = _rollup_rows(connection, HealthDataHourRollup)
+
+    assert [(row.count, row.sum, row.max) for row in hours] == [(3, 212.0, 90.0)]
+
+
+class _PostgresConnection:
+    """Records the statements ensure_partitions issues"""
+
+    dialect = SimpleNamespace(name="postgresql")
+
+    def __init__(self, existing=(), stranded=()):
+        self.existing = list(existing)
+        self.stranded = set(stranded)
+        self.created = []
+
+    def execute(self, statement, parameters=None):
+        sql = str(statement)
+        if "pg_inherits" in sql:
+            return SimpleNamespace(scalars=lambda: iter(self.existing))
+        if "health_data_default" in sql:
+            row = (1,) if parameters["month"] in self.stranded else None
+            return SimpleNamespace(first=lambda: row)
+        self.created.append(sql)
+        return None
+
+
+def test_ensure_partitions_creates_missing_months_ahead():
+    connection = _PostgresConnection(existing=["health_data_default", "health_data_y2024m11"])
+    created = TimeSeriesStore().ensure_partitions(connection, now=datetime(2024, 11, 20))
+
+    assert created == ["health_data_y2024m12", "health_data_y2025m01", "health_data_y2025m02"]
+    assert len(created) == PARTITION_MONTHS_AHEAD
+    assert "FROM ('2024-12-01') TO ('2025-01-01')" in connection.created[0]
+
+
+def test_ensure_partitions_skips_months_already_in_the_default_partition():
+    connection = _PostgresConnection(stranded=[datetime(2024, 11, 1)])
+    created = TimeSeriesStore().ensure_partitions(connection, now=datetime(2024, 11, 20))
+
+    assert "health_data_y2024m11" not in created
+    assert created[0] == "health_data_y2024m12"
+
+
+def test_ensure_partitions_is_a_no_op_outside_postgres(db_engine):
+    with db_engine.connect() as connection:
+        assert TimeSeriesStore().ensure_partitions(connection) == []
+
+
+def test_partitions_are_maintained_before_the_default_fills():
+    spec = JOBS["maintain_partitions"]
+    # Partitions exist PARTITION_MONTHS_AHEAD months out; the job runs well within that lead
+    assert spec.shard_size is None
+    assert spec.interval * spec.max_attempts < PARTITION_MONTHS_AHEAD * 28 * 24 * 3600
+    assert spec.run(None, dry_run=True) == {"partitions": []}
+
+
+def test_downsample_buckets_hold_whole_rollup_rows(db_engine, users):
+    store = TimeSeriesStore()
+    # A sample every 20 s for 12 hours
+    samples = _samples(1, [60.0] * (12 * 180))
+    with db_engine.begin() as connection:
+        connection.execute(HealthData.__table__.insert(), samples)
+        store.refresh_rollups(connection, 1, {"heart_rate": (START, samples[-1]["timestamp"])})
+        # A range off the minute: buckets still start on one and span whole minutes
+        width, buckets = store.downsample_columns(
+            connection, 1, "heart_rate", START + timedelta(seconds=30), START + timedelta(hours=12, seconds=30), 300
+        )
+
+    assert width == 180
+    assert len(buckets["count"]) <= 300
+    assert set(buckets["count"].tolist()) == {9.0}
+    assert buckets["bucket"][0] == int((START - datetime(1970, 1, 1)).total_seconds())
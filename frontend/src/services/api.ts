@@ -19,7 +19,21 @@ const api = axios.create({
 
 // Enhanced Health Data
 export const syncHealthKit = (data: any) => api.post('/health-data/sync', data);
-export const getHealthData = (type?: string) => api.get(`/health-data${type ? `/${type}` : ''}`);
+// Server-side pull of one device's HealthKit changes since its last sync
+export const syncHealthKitDevice = (userId: number, deviceId: string, full = false) =>
+    api.post(`/health-data/healthkit/sync/${userId}`, null, { params: { device_id: deviceId, full } });
+// Query of GET /health-data/{type}: at most max_points buckets over [start, end) (ISO 8601);
+// end defaults to now and start to 30 days before end
+export interface HealthSeriesParams {
+    user_id: number;
+    start?: string;
+    end?: string;
+    max_points?: number;
+    format?: 'points' | 'columnar';
+}
+
+export const getHealthData = (type?: string, params?: HealthSeriesParams) =>
+    api.get(`/health-data${type ? `/${type}` : ''}`, { params });
 export const getEnvironmentalData = () => api.get('/health-data/environmental');
 export const getMentalHealthData = () => api.get('/health-data/mental');
 export const getSleepAnalysis = () => api.get('/health-data/sleep');
@@ -28,8 +42,79 @@ export const getHealthInsights = () => api.get('/health-insights');
 export const getRecommendations = () => api.get('/recommendations');
 
 // Background Location
-export const updateLocation = (location: any) => api.post('/location/update', location);
-export const getLocationHistory = () => api.get('/location/history');
+export interface LocationFix {
+    latitude: number;
+    longitude: number;
+    timestamp: string;
+    accuracy?: number;
+}
+
+// Fixes are uploaded in batches of at most LOCATION_BATCH_SIZE (the server takes up to 10000),
+// once that many are queued or LOCATION_FLUSH_MS after the first one
+const LOCATION_BATCH_SIZE = 500;
+const LOCATION_FLUSH_MS = 5 * 60 * 1000;
+// A failed upload is retried after LOCATION_RETRY_MS, doubling on each failure up to LOCATION_FLUSH_MS
+const LOCATION_RETRY_MS = 15 * 1000;
+let pendingFixes: LocationFix[] = [];
+let flushTimer: ReturnType<typeof setTimeout> | undefined;
+let flushing = false;
+let retryDelay = 0;
+let retryAt = 0;
+
+export const updateLocation = (batch: { user_id: number; device_id: string; fixes: LocationFix[] }) =>
+    api.post('/location/update', batch);
+export const getLocationHistory = (userId: number, params?: { start?: string; end?: string; format?: string }) =>
+    api.get('/location/history', { params: { user_id: userId, ...params } });
+export const getLocationEnvironment = (userId: number) =>
+    api.get('/location/environment', { params: { user_id: userId } });
+
+const scheduleFlush = (userId: number, deviceId: string, delay: number) => {
+    if (!flushTimer) {
+        flushTimer = setTimeout(() => { flushLocations(userId, deviceId).catch(() => undefined); }, delay);
+    }
+};
+
+export const flushLocations = async (userId: number, deviceId: string) => {
+    if (flushTimer) {
+        clearTimeout(flushTimer);
+        flushTimer = undefined;
+    }
+    if (flushing) {
+        return;
+    }
+    flushing = true;
+    try {
+        while (pendingFixes.length) {
+            // Oldest first: a batch resent after a failure keeps its first fix,
+            // and the server adds to the stored batch only the fixes it lacks
+            const fixes = pendingFixes.slice(0, LOCATION_BATCH_SIZE);
+            try {
+                await updateLocation({ user_id: userId, device_id: deviceId, fixes });
+            } catch (error) {
+                retryDelay = Math.min(retryDelay ? retryDelay * 2 : LOCATION_RETRY_MS, LOCATION_FLUSH_MS);
+                retryAt = Date.now() + retryDelay;
+                scheduleFlush(userId, deviceId, retryDelay);
+                throw error;
+            }
+            // Fixes queued during the upload were appended after these
+            pendingFixes = pendingFixes.slice(fixes.length);
+            retryDelay = 0;
+            retryAt = 0;
+        }
+    } finally {
+        flushing = false;
+    }
+};
+
+export const queueLocation = (userId: number, deviceId: string, fix: LocationFix) => {
+    pendingFixes.push(fix);
+    // While backing off, the scheduled retry uploads the queue
+    if (pendingFixes.length >= LOCATION_BATCH_SIZE && !flushing && Date.now() >= retryAt) {
+        return flushLocations(userId, deviceId);
+    }
+    scheduleFlush(userId, deviceId, LOCATION_FLUSH_MS);
+    return Promise.resolve();
+};
 
 // Device Data
 export const updateDeviceMetrics = (metrics: any) => api.post('/device-metrics', metrics);